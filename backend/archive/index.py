@@ -0,0 +1,323 @@
+'''
+Business: Перенос старых месяцев инвентаризации из Postgres в холодный архив — сжатые колоночные файлы с помесячными итогами в БД (POST или таймер; заодно заводятся месячные секции inventory_entries на 24 месяца вперёд) и каталог архива (GET)
+Args: event - dict с httpMethod, queryStringParameters (before=YYYY-MM — архивировать месяцы раньше этого,
+      limit — не больше стольких месяцев за вызов), headers (X-Admin-Token — для POST);
+      у вызова по триггеру-таймеру httpMethod нет
+      context - объект с атрибутами request_id, function_name
+Returns: HTTP response с перенесёнными месяцами или каталогом архива
+'''
+
+import hashlib
+import json
+import os
+import traceback
+from datetime import date
+from itertools import groupby
+from typing import Dict, Any, List, Optional, Tuple
+import psycopg2
+import psycopg2.extras
+
+from inventory_common import (
+    COUNTER_COLUMNS, COUNTERS_AT, ArchiveStorage, RequestTimer, encode_segment, is_admin, log_event,
+    read_segment, request_state as _current, timed,
+)
+
+# Хранилище архива: каталог (/path или file:///path) или бакет Object Storage (s3://bucket/prefix)
+ARCHIVE_URL = os.environ.get('ARCHIVE_URL')
+# В Postgres остаются текущий месяц и столько полных месяцев перед ним
+ARCHIVE_AFTER_MONTHS = int(os.environ.get('ARCHIVE_AFTER_MONTHS', '24'))
+# Месяц переносится одной транзакцией; за вызов — не больше стольких, чтобы уложиться в таймаут функции
+ARCHIVE_MAX_MONTHS = int(os.environ.get('ARCHIVE_MAX_MONTHS', '6'))
+# Месячные секции inventory_entries заводятся заранее на столько месяцев вперёд (как в V0008)
+PARTITION_AHEAD_MONTHS = 24
+# Инкрементальный бэкап выбирает изменения из горячей таблицы: запись, изменённая после горизонта
+# последнего бэкапа, остаётся в Postgres, пока её не выгрузит следующий (без бэкапов — переносится)
+BACKED_UP_SQL = '''NOT EXISTS (
+    SELECT 1 FROM t_p23128842_inventory_cutlery_tr.inventory_changes c
+    WHERE c.entry_id = e.id AND NOT c.deleted
+      AND c.xid >= (SELECT horizon FROM t_p23128842_inventory_cutlery_tr.backup_manifests ORDER BY id DESC LIMIT 1)
+)'''
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', '5000'))
+
+# Первый вызов в контейнере — холодный старт
+_cold_start = True
+
+def get_db_connection():
+    return psycopg2.connect(os.environ['DATABASE_URL'])
+
+def month_start(value: date, shift: int = 0) -> date:
+    months = value.year * 12 + value.month - 1 + shift
+    return date(months // 12, months % 12 + 1, 1)
+
+def archive_horizon(before: Optional[str]) -> date:
+    """Первый месяц, который остаётся в Postgres; текущий месяц не архивируется никогда"""
+    current = month_start(date.today())
+    if not before:
+        return month_start(current, -ARCHIVE_AFTER_MONTHS)
+    try:
+        horizon = date.fromisoformat(f'{before}-01')
+    except ValueError:
+        raise ValueError('Invalid before: expected YYYY-MM')
+    if horizon > current:
+        raise ValueError('before must not be later than the current month')
+    return horizon
+
+def month_rollups(month: date, rows: List[Tuple[Any, ...]]) -> List[Tuple[Any, ...]]:
+    """Итоги месяца по заведению и предмету; loss — уменьшения между записями внутри месяца"""
+    result = []
+    for venue, venue_rows in groupby(rows, key=lambda row: row[2]):
+        venue_rows = list(venue_rows)
+        for i, item in enumerate(COUNTER_COLUMNS):
+            counts = [row[COUNTERS_AT + i] for row in venue_rows]
+            loss = sum(max(previous - count, 0) for previous, count in zip(counts, counts[1:]))
+            result.append((venue, month, item, len(counts), counts[0], counts[-1], min(counts), max(counts),
+                           round(sum(counts) / len(counts), 2), loss))
+    return result
+
+def ensure_partitions(conn) -> int:
+    """Секции inventory_entries на PARTITION_AHEAD_MONTHS вперёд; иначе новые месяцы попадут в DEFAULT.
+    Уже созданные секции пропускаются, так что обычный вызов ничего не меняет"""
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext('inventory_archive'))")
+        cur.execute('''
+            SELECT t_p23128842_inventory_cutlery_tr.ensure_inventory_partitions(
+                CURRENT_DATE, (CURRENT_DATE + make_interval(months => %s))::date)
+        ''', (PARTITION_AHEAD_MONTHS,))
+        created = cur.fetchone()[0]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return created
+
+def pending_months(conn, horizon: date) -> List[date]:
+    cur = conn.cursor()
+    cur.execute(f'''
+        SELECT DISTINCT date_trunc('month', e.entry_date)::date
+        FROM t_p23128842_inventory_cutlery_tr.inventory_entries e
+        WHERE e.entry_date < %s AND {BACKED_UP_SQL}
+        ORDER BY 1
+    ''', (horizon,))
+    months = [row[0] for row in cur.fetchall()]
+    cur.close()
+    conn.commit()
+    return months
+
+def archive_month(conn, storage: ArchiveStorage, month: date) -> Optional[Dict[str, Any]]:
+    """Месяц целиком одной транзакцией: прежний файл месяца + строки из Postgres (они новее —
+    записаны уже после прошлого переноса) -> новый файл, каталог, итоги; затем строки удаляются"""
+    schema = 't_p23128842_inventory_cutlery_tr'
+    next_month = month_start(month, 1)
+    cur = conn.cursor()
+    try:
+        # Два одновременных запуска не должны переписывать один месяц
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext('inventory_archive'))")
+        cur.execute(f'SELECT storage_key, sha256 FROM {schema}.archive_segments WHERE month = %s', (month,))
+        previous = cur.fetchone()
+        merged: Dict[Tuple[int, date], Tuple[Any, ...]] = {}
+        if previous:
+            with timed('read'):
+                for row in read_segment(storage, *previous).iter_rows():
+                    merged[(row[1], row[3])] = row
+
+        # FOR UPDATE: запись, изменённая после выборки, дождётся коммита и не потеряется при удалении
+        with timed('query'):
+            cur.execute(f'''
+                SELECT e.id, e.venue_id, v.name, e.entry_date,
+                       {', '.join(f'e.{column}' for column in COUNTER_COLUMNS)},
+                       e.responsible_name, e.responsible_date::text, e.created_at::text, e.updated_at::text,
+                       e.tableoid::regclass::text
+                FROM {schema}.inventory_entries e
+                JOIN {schema}.venues v ON v.id = e.venue_id
+                WHERE e.entry_date >= %s AND e.entry_date < %s AND {BACKED_UP_SQL}
+                FOR UPDATE OF e
+            ''', (month, next_month))
+            hot = cur.fetchall()
+        if not hot:
+            # Строки месяца удалили или изменили после выборки pending_months — переносить нечего
+            conn.rollback()
+            return None
+        partitions: Dict[str, List[int]] = {}
+        for row in hot:
+            partitions.setdefault(row[-1], []).append(row[0])
+            merged[(row[1], row[3])] = row[:-1]
+        rows = sorted(merged.values(), key=lambda row: (row[2], row[3]))
+
+        with timed('write'):
+            data = encode_segment(month, rows)
+            digest = hashlib.sha256(data).hexdigest()
+            key = f'inventory/{month:%Y/%m}/{digest[:16]}.iva'
+            storage.write(key, data)
+
+        cur.execute(f'''
+            INSERT INTO {schema}.archive_segments
+                (month, storage_key, sha256, entries, bytes, venue_ids, first_date, last_date)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (month) DO UPDATE
+            SET storage_key = EXCLUDED.storage_key, sha256 = EXCLUDED.sha256, entries = EXCLUDED.entries,
+                bytes = EXCLUDED.bytes, venue_ids = EXCLUDED.venue_ids, first_date = EXCLUDED.first_date,
+                last_date = EXCLUDED.last_date, archived_at = CURRENT_TIMESTAMP
+        ''', (month, key, digest, len(rows), len(data), sorted({row[1] for row in rows}),
+              min(row[3] for row in rows), max(row[3] for row in rows)))
+
+        cur.execute(f'DELETE FROM {schema}.inventory_monthly_rollups WHERE month = %s', (month,))
+        psycopg2.extras.execute_values(cur, f'''
+            INSERT INTO {schema}.inventory_monthly_rollups
+                (venue, month, item, days, first_count, last_count, min_count, max_count, avg_count, loss)
+            VALUES %s
+        ''', month_rollups(month, rows))
+        cur.execute(f'''
+            DELETE FROM {schema}.inventory_daily_stats WHERE entry_date >= %s AND entry_date < %s
+        ''', (month, next_month))
+
+        # Удаление прямо из секций, а не через inventory_entries: триггеры родительской таблицы
+        # не срабатывают — запись не исчезла для клиентов, а переехала, поэтому ни надгробий
+        # синхронизации, ни новых версий заведений, ни пересчёта сводки
+        for partition, ids in partitions.items():
+            cur.execute(f'''
+                DELETE FROM {partition} WHERE entry_date >= %s AND entry_date < %s AND id = ANY(%s)
+            ''', (month, next_month, ids))
+        # Журнал синхронизации ведёт только горячие записи: без строки в inventory_entries
+        # list_changes счёл бы перенесённую запись удалённой. Изменения перенесённых записей
+        # уже попали в последний бэкап (BACKED_UP_SQL), инкременту они не нужны
+        cur.execute(f'''
+            DELETE FROM {schema}.inventory_changes WHERE entry_id = ANY(%s) AND NOT deleted
+        ''', ([row[0] for row in hot],))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+    if previous and previous[0] != key:
+        try:
+            storage.delete(previous[0])
+        except Exception as e:
+            log_event({'type': 'warning', 'message': f'Could not delete archive segment {previous[0]}: {e}'})
+    return {'month': month.isoformat()[:7], 'entries': len(rows), 'moved': len(hot), 'bytes': len(data),
+            'storage_key': key}
+
+def run_archive(before: Optional[str], limit: int) -> Dict[str, Any]:
+    horizon = archive_horizon(before)
+    if not ARCHIVE_URL:
+        raise RuntimeError('ARCHIVE_URL is not configured')
+    storage = ArchiveStorage(ARCHIVE_URL)
+    with timed('connect'):
+        conn = get_db_connection()
+    try:
+        partitions = ensure_partitions(conn)
+        if partitions:
+            log_event({'type': 'partitions', 'request_id': _current.timer.request_id, 'created': partitions})
+        months = pending_months(conn, horizon)
+        archived = []
+        for month in months[:limit]:
+            result = archive_month(conn, storage, month)
+            if result is None:
+                continue
+            log_event({'type': 'archive', 'request_id': _current.timer.request_id, **result})
+            archived.append(result)
+            _current.timer.rows += result['moved']
+            _current.timer.bytes += result['bytes']
+    finally:
+        conn.close()
+    return {'horizon': horizon.isoformat()[:7], 'archived': archived, 'remaining': max(len(months) - limit, 0),
+            'partitions_created': partitions}
+
+def list_segments() -> Dict[str, Any]:
+    with timed('connect'):
+        conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute('''
+            SELECT to_char(month, 'YYYY-MM'), entries, bytes, cardinality(venue_ids),
+                   first_date::text, last_date::text, archived_at::text, storage_key
+            FROM t_p23128842_inventory_cutlery_tr.archive_segments
+            ORDER BY month
+        ''')
+        keys = ('month', 'entries', 'bytes', 'venues', 'first_date', 'last_date', 'archived_at', 'storage_key')
+        segments = [dict(zip(keys, row)) for row in cur.fetchall()]
+        cur.close()
+    finally:
+        conn.close()
+    return {
+        'horizon': archive_horizon(None).isoformat()[:7],
+        'segments': segments,
+        'total_entries': sum(segment['entries'] for segment in segments),
+        'total_bytes': sum(segment['bytes'] for segment in segments),
+    }
+
+def parse_limit(value: Optional[str]) -> int:
+    if not value:
+        return ARCHIVE_MAX_MONTHS
+    if not value.isdigit() or not 1 <= int(value) <= 120:
+        raise ValueError('Invalid limit: expected 1..120 months')
+    return int(value)
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    global _cold_start
+    # Триггер-таймер присылает messages без httpMethod — это плановый запуск переноса
+    method: str = event.get('httpMethod') or 'TIMER'
+    timer = RequestTimer('archive', getattr(context, 'request_id', None), _cold_start, slow_ms=SLOW_REQUEST_MS)
+    _cold_start = False
+    _current.timer = timer
+    error = None
+    response: Dict[str, Any] = {'statusCode': 500}
+    try:
+        response = route(event, method)
+        return response
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+        log_event({'type': 'error', 'request_id': timer.request_id, 'traceback': traceback.format_exc()})
+        response = json_response(500, {'error': 'Internal server error', 'request_id': timer.request_id})
+        return response
+    finally:
+        _current.timer = None
+        timer.finish(method, response['statusCode'], error)
+
+def json_response(status_code: int, payload: Any) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps(payload, ensure_ascii=False),
+        'isBase64Encoded': False
+    }
+
+def route(event: Dict[str, Any], method: str) -> Dict[str, Any]:
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Admin-Token',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    try:
+        if method == 'GET':
+            return json_response(200, list_segments())
+
+        # Ручной перенос — только с X-Admin-Token; таймер вызывает приватную функцию от имени
+        # сервисного аккаунта и токен не передаёт
+        if method == 'POST' and not is_admin(event):
+            return json_response(401, {'error': 'Archiving requires a valid X-Admin-Token'})
+
+        if method in ('POST', 'TIMER'):
+            params = event.get('queryStringParameters') or {}
+            result = run_archive(params.get('before'), parse_limit(params.get('limit')))
+            return json_response(200, result)
+
+    except ValueError as e:
+        return json_response(400, {'error': str(e)})
+
+    return json_response(405, {'error': 'Method not allowed'})
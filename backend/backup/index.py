@@ -1,21 +1,508 @@
 '''
-Business: Экспорт полного бэкапа базы данных в JSON формате
-Args: event - dict с httpMethod
+Business: Экспорт полного или инкрементального бэкапа базы данных в JSON/NDJSON формате (GET) и восстановление из него (POST)
+Args: event - dict с httpMethod, queryStringParameters (format=json|ndjson, compress=gzip,
+      mode=full|incremental, since=id манифеста|latest), body, headers (X-Admin-Token — для восстановления,
+      инкрементальной выгрузки и записи манифеста цепочки бэкапов)
       context - объект с атрибутами request_id, function_name
-Returns: HTTP response с данными всех записей в JSON
+Returns: HTTP response с данными всех записей или итогами восстановления
 '''
 
+import base64
+import csv
+import gzip
 import json
 import os
-from typing import Dict, Any
+import traceback
+from datetime import date, datetime
+from itertools import islice
+from io import BytesIO, StringIO
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from datetime import datetime
+
+from inventory_common import (
+    COUNTER_COLUMNS, ArchiveStorage, RequestTimer, RowCodec, is_admin, log_event, read_segment,
+    request_state as _current, timed,
+)
+
+BACKUP_VERSION = '1.1'
+BACKUP_ITERSIZE = int(os.environ.get('BACKUP_ITERSIZE', '2000'))
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', '5000'))
+BACKUP_FORMATS = ('json', 'ndjson')
+BACKUP_MODES = ('full', 'incremental')
+RESTORE_VERSIONS = ('1.0', '1.1')
+MAX_SERIAL_ID = 2 ** 31 - 1
+# Колонки счётчиков — INTEGER; лимит API (MAX_COUNTER_VALUE в inventory) появился позже старых записей
+MAX_COUNTER_VALUE = 2 ** 31 - 1
+MAX_RESPONSIBLE_NAME = 255
+# Холодный архив старых месяцев (backend/archive): полный бэкап включает и его записи
+ARCHIVE_URL = os.environ.get('ARCHIVE_URL')
+
+RESTORE_COLUMNS = (
+    'id', 'venue', 'entry_date') + COUNTER_COLUMNS + (
+    'responsible_name', 'responsible_date', 'created_at', 'updated_at'
+)
+
+# Схема строки записи в бэкапе: ключ JSON и тип значения (для RowCodec)
+ENTRY_SCHEMA = (
+    (('id', 'int'), ('venue', 'str'), ('date', 'date'))
+    + tuple((column, 'int') for column in COUNTER_COLUMNS)
+    + (('responsible_name', 'str'), ('responsible_date', 'date'), ('created_at', 'str'), ('updated_at', 'str'))
+)
+
+# Первый вызов в контейнере — холодный старт
+_cold_start = True
 
 def get_db_connection():
     return psycopg2.connect(os.environ['DATABASE_URL'])
 
+ENTRY_CODEC = RowCodec(ENTRY_SCHEMA, ensure_ascii=False)
+
+def archive_catalog(conn) -> List[Tuple[str, str, str]]:
+    """Сегменты архива в снимке выгрузки: перенос месяца коммитится вместе с удалением его строк,
+    поэтому каждая запись попадает в бэкап ровно из одного места"""
+    cur = conn.cursor()
+    cur.execute('''
+        SELECT storage_key, sha256, last_date::text
+        FROM t_p23128842_inventory_cutlery_tr.archive_segments
+        ORDER BY month
+    ''')
+    segments = cur.fetchall()
+    cur.close()
+    if segments and not ARCHIVE_URL:
+        raise RuntimeError('Archived months exist, but ARCHIVE_URL is not configured')
+    return segments
+
+def iter_archived_rows(conn, segments: List[Tuple[str, str, str]]) -> Iterator[Tuple[Any, ...]]:
+    """Записи архивных месяцев, кроме дней, записанных в Postgres уже после переноса (они выгружены выше)"""
+    cur = conn.cursor()
+    cur.execute('''
+        SELECT v.name, e.entry_date::text
+        FROM t_p23128842_inventory_cutlery_tr.inventory_entries e
+        JOIN t_p23128842_inventory_cutlery_tr.venues v ON v.id = e.venue_id
+        WHERE e.entry_date <= %s
+    ''', (max(last_date for _, _, last_date in segments),))
+    shadowed = set(cur.fetchall())
+    cur.close()
+    storage = ArchiveStorage(ARCHIVE_URL)
+    for key, digest, _ in segments:
+        with timed('archive'):
+            segment = read_segment(storage, key, digest)
+        for row in segment.export_rows():
+            if (row[1], row[2]) not in shadowed:
+                yield row
+
+def open_export(conn, fmt: str, mode: str, since: Optional[str]) -> Dict[str, Any]:
+    """Начать транзакцию выгрузки и записать в ней манифест: горизонт берётся из того же
+    снимка, что и данные, а при сбое выгрузки манифест откатывается вместе с ней"""
+    conn.set_session(isolation_level='REPEATABLE READ', readonly=False)
+    cur = conn.cursor()
+    try:
+        # Первый запрос транзакции фиксирует её снимок
+        cur.execute('SELECT pg_snapshot_xmin(pg_current_snapshot())::text')
+        horizon = cur.fetchone()[0]
+        parent_id, parent_horizon = None, None
+        if mode == 'incremental':
+            if since in (None, '', 'latest'):
+                cur.execute('''
+                    SELECT id, horizon::text FROM t_p23128842_inventory_cutlery_tr.backup_manifests
+                    ORDER BY id DESC LIMIT 1
+                ''')
+            elif since.isdigit() and int(since) <= MAX_SERIAL_ID:
+                cur.execute('''
+                    SELECT id, horizon::text FROM t_p23128842_inventory_cutlery_tr.backup_manifests
+                    WHERE id = %s
+                ''', (int(since),))
+            else:
+                raise ValueError('since must be a backup manifest id or latest')
+            parent = cur.fetchone()
+            if parent is None:
+                raise ValueError('No previous backup to continue from: make a full backup first')
+            parent_id, parent_horizon = parent
+        cur.execute('''
+            INSERT INTO t_p23128842_inventory_cutlery_tr.backup_manifests (kind, parent_id, since, horizon, format)
+            VALUES (%s, %s, %s, %s, %s)
+            RETURNING id
+        ''', (mode, parent_id, parent_horizon, horizon, fmt))
+        manifest_id = cur.fetchone()[0]
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return {'id': manifest_id, 'kind': mode, 'parent_id': parent_id, 'since': parent_horizon, 'horizon': horizon}
+
+def iter_backup_chunks(conn, fmt: str, backup_date: str, manifest: Optional[Dict[str, Any]],
+                       stats: Optional[Dict[str, int]] = None) -> Iterator[str]:
+    """Построчная сериализация через серверный курсор: в памяти не больше itersize строк.
+    Инкремент — записи, изменённые с горизонта родительского бэкапа, и надгробия удалённых;
+    без манифеста — полная выгрузка вне цепочки бэкапов"""
+    incremental = manifest is not None and manifest['kind'] == 'incremental'
+    cur = conn.cursor(name='backup_export')
+    cur.itersize = BACKUP_ITERSIZE
+    
+    columns = '''e.id, v.name AS venue, e.entry_date::text as date, 
+               e.forks, e.knives, e.steak_knives, e.spoons, e.dessert_spoons,
+               e.ice_cooler, e.plates, e.sugar_tongs, e.ice_tongs, e.ashtrays,
+               e.responsible_name, e.responsible_date::text,
+               e.created_at::text, COALESCE(e.updated_at, e.created_at)::text'''
+    if incremental:
+        cur.execute(f'''
+            SELECT {columns}
+            FROM t_p23128842_inventory_cutlery_tr.inventory_changes c
+            JOIN t_p23128842_inventory_cutlery_tr.inventory_entries e ON e.id = c.entry_id
+            JOIN t_p23128842_inventory_cutlery_tr.venues v ON v.id = e.venue_id
+            WHERE c.xid >= %s::xid8 AND NOT c.deleted
+            ORDER BY v.name, e.entry_date DESC
+        ''', (manifest['since'],))
+    else:
+        cur.execute(f'''
+            SELECT {columns}
+            FROM t_p23128842_inventory_cutlery_tr.inventory_entries e
+            JOIN t_p23128842_inventory_cutlery_tr.venues v ON v.id = e.venue_id
+            ORDER BY v.name, e.entry_date DESC
+        ''')
+    
+    # Инкремент архив не читает: перенос в архив не порождает изменений
+    segments = [] if incremental else archive_catalog(conn)
+    
+    header: Dict[str, Any] = {'backup_date': backup_date, 'version': BACKUP_VERSION}
+    if manifest is not None:
+        header['manifest'] = manifest
+    if fmt == 'ndjson':
+        yield json.dumps(header, ensure_ascii=False) + '\n'
+    else:
+        # Документ совместим с форматом 1.0; total_records известен только в конце
+        yield json.dumps(header, ensure_ascii=False)[:-1] + ', "entries": ['
+    
+    total = 0
+    separator = '\n' if fmt == 'ndjson' else ', '
+    while True:
+        rows = cur.fetchmany(BACKUP_ITERSIZE)
+        if not rows:
+            break
+        chunk = ENTRY_CODEC.join_rows(rows, separator)
+        if fmt == 'ndjson':
+            yield chunk + separator
+        else:
+            yield (separator if total else '') + chunk
+        total += len(rows)
+    cur.close()
+    
+    archived = 0
+    if segments:
+        archived_rows = iter_archived_rows(conn, segments)
+        while True:
+            rows = list(islice(archived_rows, BACKUP_ITERSIZE))
+            if not rows:
+                break
+            chunk = ENTRY_CODEC.join_rows(rows, separator)
+            if fmt == 'ndjson':
+                yield chunk + separator
+            else:
+                yield (separator if total else '') + chunk
+            total += len(rows)
+            archived += len(rows)
+    
+    deleted = 0
+    if incremental:
+        cur = conn.cursor(name='backup_tombstones')
+        cur.itersize = BACKUP_ITERSIZE
+        cur.execute('''
+            SELECT entry_id, venue FROM t_p23128842_inventory_cutlery_tr.inventory_changes
+            WHERE xid >= %s::xid8 AND deleted
+            ORDER BY entry_id
+        ''', (manifest['since'],))
+        if fmt != 'ndjson':
+            yield '], "deleted": ['
+        while True:
+            rows = cur.fetchmany(BACKUP_ITERSIZE)
+            if not rows:
+                break
+            if fmt == 'ndjson':
+                yield ''.join(json.dumps({'deleted': {'id': entry_id, 'venue': venue}}, ensure_ascii=False) + '\n'
+                              for entry_id, venue in rows)
+            else:
+                yield (', ' if deleted else '') + ', '.join(
+                    json.dumps({'id': entry_id, 'venue': venue}, ensure_ascii=False) for entry_id, venue in rows)
+            deleted += len(rows)
+        cur.close()
+    
+    if manifest is not None:
+        cur = conn.cursor()
+        cur.execute('''
+            UPDATE t_p23128842_inventory_cutlery_tr.backup_manifests SET entries = %s, deleted = %s WHERE id = %s
+        ''', (total, deleted if incremental else None, manifest['id']))
+        cur.close()
+    conn.commit()
+    if stats is not None:
+        stats['rows'] = total
+        stats['archived'] = archived
+        stats['deleted'] = deleted
+    
+    footer = {'total_records': total}
+    if segments:
+        footer['total_archived'] = archived
+    if incremental:
+        footer['total_deleted'] = deleted
+    if fmt == 'ndjson':
+        yield json.dumps(footer) + '\n'
+    else:
+        yield '], ' + json.dumps(footer)[1:]
+
+def render_body(chunks: Iterator[str], compress: bool) -> Tuple[str, bool]:
+    """Собрать тело ответа; при сжатии в памяти держится только gzip-поток"""
+    if not compress:
+        return ''.join(chunks), False
+    
+    buffer = BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=6) as gz:
+        for chunk in chunks:
+            gz.write(chunk.encode('utf-8'))
+    return base64.b64encode(buffer.getvalue()).decode('ascii'), True
+
+def decode_request_body(event: Dict[str, Any]) -> str:
+    raw = event.get('body') or ''
+    if not event.get('isBase64Encoded'):
+        return raw
+    data = base64.b64decode(raw)
+    if data[:2] == b'\x1f\x8b':
+        data = gzip.decompress(data)
+    return data.decode('utf-8')
+
+def parse_backup_entries(body: str, content_type: str) -> Tuple[List[Dict[str, Any]], List[Any]]:
+    """Записи и надгробия удалённых из документа версии 1.0/1.1 или NDJSON
+    (строки без venue — служебные, {"deleted": {...}} — надгробие инкремента)"""
+    if 'ndjson' not in content_type:
+        try:
+            document = json.loads(body)
+        except json.JSONDecodeError as e:
+            # «Extra data» после первого объекта — значит это NDJSON
+            if not body.lstrip().startswith('{') or 'Extra data' not in e.msg:
+                raise ValueError(f'Invalid backup JSON: {e.msg}')
+            document = None
+        if isinstance(document, dict) and 'entries' in document:
+            if str(document.get('version')) not in RESTORE_VERSIONS:
+                raise ValueError(f"Unsupported backup version: {document.get('version')}")
+            if not isinstance(document['entries'], list):
+                raise ValueError('Backup entries must be an array')
+            deleted = document.get('deleted') or []
+            if not isinstance(deleted, list):
+                raise ValueError('Backup deleted must be an array')
+            return document['entries'], deleted
+    
+    entries, deleted = [], []
+    for line_no, line in enumerate(body.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f'Invalid NDJSON at line {line_no}: {e.msg}')
+        if not isinstance(item, dict):
+            raise ValueError(f'Invalid NDJSON at line {line_no}: expected an object')
+        if 'version' in item and str(item['version']) not in RESTORE_VERSIONS:
+            raise ValueError(f"Unsupported backup version: {item['version']}")
+        if 'venue' in item:
+            entries.append(item)
+        elif 'deleted' in item:
+            deleted.append(item['deleted'])
+    return entries, deleted
+
+def validate_deleted_ids(deleted: List[Any]) -> List[int]:
+    ids = []
+    for index, item in enumerate(deleted, start=1):
+        entry_id = item.get('id') if isinstance(item, dict) else None
+        if isinstance(entry_id, bool) or not isinstance(entry_id, int) or not 0 < entry_id <= MAX_SERIAL_ID:
+            raise ValueError(f'Deleted #{index}: invalid id')
+        ids.append(entry_id)
+    return ids
+
+def _date_or_none(value: Any, field: str, index: int) -> Optional[str]:
+    if value in (None, ''):
+        return None
+    try:
+        return date.fromisoformat(str(value)[:10]).isoformat()
+    except ValueError:
+        raise ValueError(f'Entry #{index}: invalid {field}')
+
+def _timestamp_or_none(value: Any, field: str, index: int) -> Optional[str]:
+    if value in (None, ''):
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f'Entry #{index}: invalid {field}')
+    try:
+        datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'Entry #{index}: invalid {field}')
+    return value
+
+def validate_backup_entry(entry: Dict[str, Any], index: int) -> Tuple[Any, ...]:
+    """Строка для COPY в порядке RESTORE_COLUMNS; id вне диапазона SERIAL (локальный режим) выдаётся заново"""
+    if not isinstance(entry, dict):
+        raise ValueError(f'Entry #{index}: expected an object')
+    
+    entry_id = entry.get('id')
+    if isinstance(entry_id, bool) or not isinstance(entry_id, int) or not 0 < entry_id <= MAX_SERIAL_ID:
+        entry_id = None
+    
+    venue = entry.get('venue')
+    if not isinstance(venue, str) or not venue.strip() or len(venue) > 50:
+        raise ValueError(f'Entry #{index}: invalid venue')
+    
+    entry_date = _date_or_none(entry.get('date'), 'date', index)
+    if entry_date is None:
+        raise ValueError(f'Entry #{index}: date is required')
+    
+    counters = []
+    for column in COUNTER_COLUMNS:
+        value = entry.get(column, 0)
+        if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= MAX_COUNTER_VALUE:
+            raise ValueError(f'Entry #{index}: {column} must be an integer from 0 to {MAX_COUNTER_VALUE}')
+        counters.append(value)
+    
+    responsible_name = entry.get('responsible_name')
+    if responsible_name is not None and (not isinstance(responsible_name, str)
+                                         or len(responsible_name) > MAX_RESPONSIBLE_NAME):
+        raise ValueError(f'Entry #{index}: invalid responsible_name')
+    
+    return (
+        entry_id, venue, entry_date, *counters,
+        responsible_name,
+        _date_or_none(entry.get('responsible_date'), 'responsible_date', index),
+        _timestamp_or_none(entry.get('created_at'), 'created_at', index),
+        _timestamp_or_none(entry.get('updated_at'), 'updated_at', index),
+    )
+
+class CopySource:
+    """Файлоподобный источник для COPY FROM STDIN: CSV генерируется по мере чтения"""
+    
+    def __init__(self, rows: List[Tuple[Any, ...]]):
+        self._rows = iter(rows)
+        self._buffer = StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator='\n')
+        self._pending = ''
+    
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._pending) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._writer.writerow(['\\N' if value is None else value for value in row])
+            self._pending += self._buffer.getvalue()
+            self._buffer.seek(0)
+            self._buffer.truncate()
+        if size < 0:
+            size = len(self._pending)
+        chunk, self._pending = self._pending[:size], self._pending[size:]
+        return chunk
+
+def restore_entries(conn, rows: List[Tuple[Any, ...]], deleted_ids: List[int] = ()) -> Dict[str, int]:
+    """Надгробия инкремента, затем COPY во временную таблицу и upsert по (заведение, дата) —
+    одной транзакцией. Из повторов одного дня в бэкапе остаётся запись с большим id
+    (старые бэкапы их допускали)"""
+    schema = 't_p23128842_inventory_cutlery_tr'
+    table = f'{schema}.inventory_entries'
+    columns = ', '.join(RESTORE_COLUMNS)
+    data_columns = RESTORE_COLUMNS[3:-2]
+    
+    cur = conn.cursor()
+    try:
+        cur.execute(f'DELETE FROM {table} WHERE id = ANY(%s)', (list(deleted_ids),))
+        deleted = cur.rowcount
+        cur.execute(f'''
+            CREATE TEMP TABLE inventory_restore (
+                id INTEGER, venue VARCHAR(50), entry_date DATE,
+                {', '.join(f'{column} INTEGER' for column in COUNTER_COLUMNS)},
+                responsible_name VARCHAR(255), responsible_date DATE,
+                created_at TIMESTAMP, updated_at TIMESTAMP
+            ) ON COMMIT DROP
+        ''')
+        cur.copy_expert(
+            f"COPY inventory_restore ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            CopySource(rows)
+        )
+        cur.execute('''
+            DELETE FROM inventory_restore
+            WHERE ctid NOT IN (
+                SELECT DISTINCT ON (venue, entry_date) ctid FROM inventory_restore
+                ORDER BY venue, entry_date, id DESC NULLS LAST
+            )
+        ''')
+        duplicates = cur.rowcount
+        cur.execute(f'''
+            INSERT INTO {schema}.venues (name)
+            SELECT DISTINCT venue FROM inventory_restore
+            ON CONFLICT (name) DO NOTHING
+        ''')
+        # Первичный ключ секционированной таблицы — (id, entry_date): запись с тем же id
+        # на другой дате уникальность не поймает, её убираем явно
+        cur.execute(f'''
+            DELETE FROM {table} e
+            USING inventory_restore r
+            JOIN {schema}.venues v ON v.name = r.venue
+            WHERE e.id = r.id AND (e.venue_id, e.entry_date) <> (v.id, r.entry_date)
+        ''')
+        cur.execute(f'''
+            WITH upserted AS (
+                INSERT INTO {table} (id, venue_id, entry_date, {', '.join(data_columns)}, created_at, updated_at)
+                SELECT COALESCE(r.id, e.id, nextval(pg_get_serial_sequence('{table}', 'id'))),
+                       v.id, r.entry_date, {', '.join(f'r.{column}' for column in data_columns)},
+                       COALESCE(r.created_at, e.created_at, CURRENT_TIMESTAMP),
+                       COALESCE(r.updated_at, CURRENT_TIMESTAMP)
+                FROM inventory_restore r
+                JOIN {schema}.venues v ON v.name = r.venue
+                LEFT JOIN {table} e ON e.venue_id = v.id AND e.entry_date = r.entry_date
+                ON CONFLICT (venue_id, entry_date) DO UPDATE
+                SET {', '.join(f'{column} = EXCLUDED.{column}' for column in ('id',) + data_columns + ('created_at', 'updated_at'))}
+                RETURNING (xmax = 0) AS inserted
+            )
+            SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted)
+            FROM upserted
+        ''')
+        inserted, updated = cur.fetchone()
+        # Восстановленные id не должны столкнуться с будущими INSERT
+        cur.execute(f'''
+            SELECT setval(pg_get_serial_sequence('{table}', 'id'),
+                          GREATEST((SELECT max(id) FROM {table}), 1))
+        ''')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    
+    return {'inserted': inserted, 'updated': updated, 'duplicates': duplicates, 'deleted': deleted}
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    global _cold_start
+    method: str = event.get('httpMethod', 'GET')
+    timer = RequestTimer('backup', getattr(context, 'request_id', None), _cold_start, slow_ms=SLOW_REQUEST_MS)
+    _cold_start = False
+    _current.timer = timer
+    error = None
+    response: Dict[str, Any] = {'statusCode': 500}
+    try:
+        response = route(event)
+        return response
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+        log_event({'type': 'error', 'request_id': timer.request_id, 'traceback': traceback.format_exc()})
+        response = {
+            'statusCode': 500,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'Internal server error', 'request_id': timer.request_id}),
+            'isBase64Encoded': False
+        }
+        return response
+    finally:
+        _current.timer = None
+        timer.finish(method, response['statusCode'], error)
+
+def route(event: Dict[str, Any]) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
@@ -23,8 +510,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Admin-Token',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -32,46 +519,136 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     if method == 'GET':
+        params = event.get('queryStringParameters') or {}
+        fmt = params.get('format', 'json')
+        compress = params.get('compress') == 'gzip'
+        mode = params.get('mode', 'full')
+        # Манифест (и с ним новый latest для инкрементов) пишется только для выгрузок администратора:
+        # анонимная выгрузка не сохраняется оператором и не должна становиться звеном цепочки
+        record = is_admin(event)
+        
+        if mode == 'incremental' and not record:
+            return {
+                'statusCode': 401,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': 'Incremental backups require a valid X-Admin-Token'}),
+                'isBase64Encoded': False
+            }
+        
+        error = None
+        if fmt not in BACKUP_FORMATS:
+            error = f'Unsupported format: {fmt}'
+        elif mode not in BACKUP_MODES:
+            error = f'Unsupported mode: {mode}'
+        
+        now = datetime.now()
+        if error is None:
+            with timed('connect'):
+                conn = get_db_connection()
+            try:
+                if record:
+                    manifest = open_export(conn, fmt, mode, params.get('since'))
+                else:
+                    conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+                    manifest = None
+                stats: Dict[str, int] = {}
+                with timed('export'):
+                    chunks = iter_backup_chunks(conn, fmt, now.isoformat(), manifest, stats)
+                    body, is_base64 = render_body(chunks, compress)
+                _current.timer.rows = stats.get('rows', 0)
+                _current.timer.bytes = len(body)
+            except ValueError as e:
+                error = str(e)
+            finally:
+                conn.close()
+        
+        if error is not None:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': error}),
+                'isBase64Encoded': False
+            }
+        
+        suffix = '_incremental' if mode == 'incremental' else ''
+        filename = f'inventory_backup_{now.strftime("%Y%m%d_%H%M%S")}{suffix}.{fmt}'
+        content_type = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+        if compress:
+            filename += '.gz'
+            content_type = 'application/gzip'
+        
+        headers = {
+            'Content-Type': content_type,
+            'Access-Control-Allow-Origin': '*',
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'Access-Control-Expose-Headers': 'Content-Disposition, X-Backup-Manifest'
+        }
+        if manifest is not None:
+            headers['X-Backup-Manifest'] = str(manifest['id'])
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': body,
+            'isBase64Encoded': is_base64
+        }
+    
+    # Восстановление перезаписывает и удаляет записи — только с заголовком X-Admin-Token
+    if method == 'POST' and not is_admin(event):
+        return {
+            'statusCode': 401,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'Restore requires a valid X-Admin-Token'}),
+            'isBase64Encoded': False
+        }
+    
+    if method == 'POST':
         try:
-            conn = get_db_connection()
-            cur = conn.cursor(cursor_factory=RealDictCursor)
+            headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+            with timed('parse'):
+                entries, deleted = parse_backup_entries(decode_request_body(event), headers.get('content-type', ''))
+                rows = [validate_backup_entry(entry, index) for index, entry in enumerate(entries, start=1)]
+                deleted_ids = validate_deleted_ids(deleted)
+            _current.timer.rows = len(rows)
             
-            query = '''
-                SELECT id, venue, entry_date::text as date, 
-                       forks, knives, steak_knives, spoons, dessert_spoons,
-                       ice_cooler, plates, sugar_tongs, ice_tongs, ashtrays,
-                       responsible_name, responsible_date::text,
-                       created_at::text
-                FROM t_p23128842_inventory_cutlery_tr.inventory_entries
-                ORDER BY venue, entry_date DESC
-            '''
+            seen_ids = set()
+            for index, row in enumerate(rows, start=1):
+                if row[0] is not None:
+                    if row[0] in seen_ids:
+                        raise ValueError(f'Entry #{index}: duplicate id {row[0]}')
+                    seen_ids.add(row[0])
             
-            cur.execute(query)
-            all_entries = cur.fetchall()
-            cur.close()
-            conn.close()
-            
-            backup_data = {
-                'backup_date': datetime.now().isoformat(),
-                'total_records': len(all_entries),
-                'version': '1.0',
-                'entries': [dict(row) for row in all_entries]
-            }
+            result = {'inserted': 0, 'updated': 0, 'duplicates': 0, 'deleted': 0}
+            if rows or deleted_ids:
+                with timed('connect'):
+                    conn = get_db_connection()
+                try:
+                    with timed('query'):
+                        result = restore_entries(conn, rows, deleted_ids)
+                finally:
+                    conn.close()
             
             return {
                 'statusCode': 200,
                 'headers': {
                     'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Content-Disposition': f'attachment; filename="inventory_backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json"'
+                    'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps(backup_data, ensure_ascii=False, indent=2),
+                'body': json.dumps({'total_records': len(rows), **result}),
                 'isBase64Encoded': False
             }
-            
-        except Exception as e:
+        
+        except ValueError as e:
             return {
-                'statusCode': 500,
+                'statusCode': 400,
                 'headers': {
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
@@ -5,23 +5,1973 @@ Args: event - dict с httpMethod, body, queryStringParameters
 Returns: HTTP response dict с данными инвентаризации
 '''
 
+from __future__ import annotations
+
+import hashlib
+import io
 import json
+import math
 import os
-from typing import Dict, Any, List
-import psycopg2
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, timedelta
+from json.encoder import encode_basestring_ascii
+
+from inventory_common import (
+    ArchiveSegment, ArchiveStorage, RawJSON, RequestTimer, RowCodec, log_event, read_segment,
+    request_state as _current, timed,
+)
+
+# Холодный старт: typing нужен только для аннотаций, а psycopg2 и traceback
+# грузятся при первом использовании (pg(), обработка ошибок)
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict, Any, List, Optional, Tuple
+
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '4'))
+DB_POOL_TIMEOUT_SEC = float(os.environ.get('DB_POOL_TIMEOUT_SEC', '5'))
+DB_POOL_PING_AFTER_SEC = float(os.environ.get('DB_POOL_PING_AFTER_SEC', '30'))
+DB_POOL_MAX_LIFETIME_SEC = float(os.environ.get('DB_POOL_MAX_LIFETIME_SEC', '1800'))
+# Сколько вызовов может ждать соединение пула; следующие сразу получают 503
+DB_POOL_MAX_WAITING = int(os.environ.get('DB_POOL_MAX_WAITING', str(2 * DB_POOL_SIZE)))
+# Параллельные запросы по заведениям через asyncpg (если он установлен в окружении функции)
+DB_ASYNC = os.environ.get('DB_ASYNC') == '1'
+DB_ASYNC_POOL_SIZE = int(os.environ.get('DB_ASYNC_POOL_SIZE', '4'))
+DB_ASYNC_TIMEOUT_SEC = float(os.environ.get('DB_ASYNC_TIMEOUT_SEC', '30'))
+# Кеш ответов GET со списками записей; CACHE_TTL_SEC=0 выключает его
+CACHE_TTL_SEC = float(os.environ.get('CACHE_TTL_SEC', '5'))
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '256'))
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+CACHE_SHARED_RETRY_SEC = float(os.environ.get('CACHE_SHARED_RETRY_SEC', '30'))
+# Лимиты запросов (token bucket): на клиента по IP и на заведение из venue=...; RPS=0 выключает.
+# С CACHE_REDIS_URL те же лимиты действуют и на все контейнеры вместе
+RATE_LIMIT_CLIENT_RPS = float(os.environ.get('RATE_LIMIT_CLIENT_RPS', '10'))
+RATE_LIMIT_CLIENT_BURST = float(os.environ.get('RATE_LIMIT_CLIENT_BURST', '40'))
+RATE_LIMIT_VENUE_RPS = float(os.environ.get('RATE_LIMIT_VENUE_RPS', '50'))
+RATE_LIMIT_VENUE_BURST = float(os.environ.get('RATE_LIMIT_VENUE_BURST', '200'))
+RATE_LIMIT_MAX_BUCKETS = int(os.environ.get('RATE_LIMIT_MAX_BUCKETS', '4096'))
+MAX_LIMITED_VENUES = 16
+# Холодный архив старых месяцев (backend/archive); без ARCHIVE_URL читается только inventory_entries
+ARCHIVE_URL = os.environ.get('ARCHIVE_URL')
+ARCHIVE_CACHE_SEGMENTS = int(os.environ.get('ARCHIVE_CACHE_SEGMENTS', '16'))
+
+ANALYTICS_DEFAULT_DAYS = 365
+ANALYTICS_MAX_DAYS = 3660
+# Сколько дней до начала окна ищется предыдущая запись для первой дельты периода
+ANALYTICS_LOOKBACK_DAYS = 31
+
+MAX_PAGE_LIMIT = 500
+MAX_BATCH_SIZE = 500
+MAX_COUNTER_VALUE = 100000
+MAX_SERIAL_ID = 2 ** 31 - 1
+
+SYNC_OPS = ('create', 'update', 'delete')
+SYNC_ATTEMPTS = 3
+
+RESPONSE_FORMATS = ('objects', 'columnar')
+COMPRESS_ENCODINGS = ('gzip', 'br', 'auto')
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', '1024'))
+
+# Колонка таблицы -> поле тела запроса (фронтенд присылает camelCase)
+COUNTER_FIELDS = (
+    ('forks', 'forks'),
+    ('knives', 'knives'),
+    ('steak_knives', 'steakKnives'),
+    ('spoons', 'spoons'),
+    ('dessert_spoons', 'dessertSpoons'),
+    ('ice_cooler', 'iceCooler'),
+    ('plates', 'plates'),
+    ('sugar_tongs', 'sugarTongs'),
+    ('ice_tongs', 'iceTongs'),
+    ('ashtrays', 'ashtrays'),
+)
+OPTIONAL_COUNTERS = ('ashtrays',)
+ENTRY_WRITE_COLUMNS = (
+    ('venue_id', 'entry_date')
+    + tuple(column for column, _ in COUNTER_FIELDS)
+    + ('responsible_name', 'responsible_date')
+)
+
+# Схема строки записи в ответах: ключ JSON и тип значения (для RowCodec)
+ENTRY_SCHEMA = (
+    (('id', 'int'), ('venue', 'str'), ('date', 'date'))
+    + tuple((column, 'int') for column, _ in COUNTER_FIELDS)
+    + (('responsible_name', 'str'), ('responsible_date', 'date'), ('created_at', 'str'))
+)
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '250'))
+# Фазы, которые попадают в лог и Server-Timing каждого вызова
+TIMER_PHASES = ('import', 'admit', 'connect', 'cache', 'query', 'archive', 'map', 'serialize', 'compress')
+
+# Первый вызов в контейнере — холодный старт
+_cold_start = True
+
+
+_pg = None
+_pg_lock = threading.Lock()
+
+
+def pg():
+    """Модуль psycopg2; импортируется при первом обращении к БД, а не при загрузке функции"""
+    global _pg
+    if _pg is None:
+        with _pg_lock:
+            if _pg is None:
+                with timed('import'):
+                    import psycopg2
+                    import psycopg2.errors
+                    import psycopg2.extensions
+                _pg = psycopg2
+    return _pg
+
+
+def retryable_errors() -> Tuple[type, ...]:
+    """Ошибки обрыва соединения, после которых его нельзя вернуть в пул"""
+    psycopg2 = pg()
+    return (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+class PoolTimeout(Exception):
+    """Все соединения пула заняты дольше DB_POOL_TIMEOUT_SEC или их уже ждут DB_POOL_MAX_WAITING вызовов"""
+
+
+class EntryConflict(Exception):
+    """У заведения уже есть запись за эту дату (уникальность venue_id, entry_date)"""
+
+
+class ConnectionPool:
+    """Пул соединений, который переживает тёплые вызовы handler. Он же ограничивает работу с БД:
+    не больше max_size запросов одновременно и не больше max_waiting в очереди — остальным
+    сразу отказ, а не ожидание таймаута, пока Postgres и так не успевает"""
+
+    def __init__(self, dsn: str, max_size: int, timeout: float,
+                 ping_after: float, max_lifetime: float, max_waiting: int):
+        self._dsn = dsn
+        self._timeout = timeout
+        self._max_waiting = max_waiting
+        self._waiting = 0
+        self._ping_after = ping_after
+        self._max_lifetime = max_lifetime
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        # (conn, created_at, last_used_at); берём с конца — самое «тёплое» соединение
+        self._idle: List[Tuple[Any, float, float]] = []
+        self._born: Dict[int, float] = {}
+        # Имена PREPARE, уже выполненных на каждом соединении
+        self._prepared: Dict[int, set] = {}
+        self.max_size = max_size
+        self.counters = {'hits': 0, 'misses': 0, 'reconnects': 0, 'discarded': 0, 'timeouts': 0, 'shed': 0}
+
+    def _connect(self):
+        conn = pg().connect(self._dsn)
+        conn.autocommit = True
+        self._born[id(conn)] = time.monotonic()
+        self._prepared[id(conn)] = set()
+        return conn
+
+    def _close(self, conn) -> None:
+        self._born.pop(id(conn), None)
+        self._prepared.pop(id(conn), None)
+        try:
+            conn.close()
+        except pg().Error:
+            pass
+
+    def _is_healthy(self, conn, created_at: float, last_used: float) -> bool:
+        now = time.monotonic()
+        if conn.closed or now - created_at > self._max_lifetime:
+            return False
+        if conn.get_transaction_status() != pg().extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if now - last_used < self._ping_after:
+            return True
+        # Соединение долго простаивало: NAT или pgbouncer могли его оборвать
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            return True
+        except pg().Error:
+            return False
+
+    def _wait_slot(self) -> None:
+        if self._slots.acquire(blocking=False):
+            return
+        with self._lock:
+            if self._waiting >= self._max_waiting:
+                self.counters['shed'] += 1
+                raise PoolTimeout('Database is busy')
+            self._waiting += 1
+        try:
+            acquired = self._slots.acquire(timeout=self._timeout)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        if not acquired:
+            with self._lock:
+                self.counters['timeouts'] += 1
+            raise PoolTimeout('Database connection pool exhausted')
+
+    def acquire(self):
+        self._wait_slot()
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        self.counters['misses'] += 1
+                        break
+                    conn, created_at, last_used = self._idle.pop()
+                if self._is_healthy(conn, created_at, last_used):
+                    with self._lock:
+                        self.counters['hits'] += 1
+                    return conn
+                with self._lock:
+                    self.counters['reconnects'] += 1
+                self._close(conn)
+            return self._connect()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn, discard: bool = False) -> None:
+        try:
+            healthy = (not discard and not conn.closed
+                       and conn.get_transaction_status() == pg().extensions.TRANSACTION_STATUS_IDLE)
+            if healthy:
+                created_at = self._born.get(id(conn), time.monotonic())
+                with self._lock:
+                    self._idle.append((conn, created_at, time.monotonic()))
+            else:
+                with self._lock:
+                    self.counters['discarded'] += 1
+                self._close(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        with timed('connect'):
+            conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except retryable_errors():
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def run(self, fn, retry: bool = False):
+        """Выполнить fn(conn); для идемпотентных операций — повтор на новом соединении после обрыва"""
+        try:
+            with self.connection() as conn:
+                return fn(conn)
+        except retryable_errors():
+            if not retry:
+                raise
+            with self._lock:
+                self.counters['reconnects'] += 1
+            with self.connection() as conn:
+                return fn(conn)
+
+    def prepared_statements(self, conn) -> set:
+        return self._prepared.setdefault(id(conn), set())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            idle = len(self._idle)
+            waiting = self._waiting
+        served = counters['hits'] + counters['misses']
+        counters.update({
+            'idle': idle,
+            'waiting': waiting,
+            'max_size': self.max_size,
+            'max_waiting': self._max_waiting,
+            'reuse_rate': round(counters['hits'] / served, 4) if served else None,
+        })
+        return counters
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    os.environ['DATABASE_URL'],
+                    max_size=DB_POOL_SIZE,
+                    timeout=DB_POOL_TIMEOUT_SEC,
+                    ping_after=DB_POOL_PING_AFTER_SEC,
+                    max_lifetime=DB_POOL_MAX_LIFETIME_SEC,
+                    max_waiting=DB_POOL_MAX_WAITING,
+                )
+    return _pool
+
+
+class AsyncDatabase:
+    """asyncpg-пул на собственном потоке с event loop: переживает тёплые вызовы, а синхронный
+    handler отдаёт ему пачку независимых запросов и ждёт все результаты разом"""
+
+    def __init__(self, asyncpg, dsn: str, max_size: int, timeout: float):
+        import asyncio
+        self._asyncio = asyncio
+        self._asyncpg = asyncpg
+        self._dsn = dsn
+        self._max_size = max_size
+        self._timeout = timeout
+        self._pool = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='inventory-asyncpg', daemon=True)
+        self._thread.start()
+        self.counters = {'batches': 0, 'queries': 0}
+
+    async def _get_pool(self):
+        if self._pool is None:
+            self._pool = await self._asyncpg.create_pool(self._dsn, min_size=1, max_size=self._max_size)
+        return self._pool
+
+    async def _fetch_all(self, queries: List[Tuple[str, Tuple[Any, ...]]]) -> List[List[Any]]:
+        pool = await self._get_pool()
+
+        async def fetch(sql: str, args: Tuple[Any, ...]) -> List[Any]:
+            async with pool.acquire() as conn:
+                return await conn.fetch(sql, *args)
+
+        return await self._asyncio.gather(*(fetch(sql, args) for sql, args in queries))
+
+    def fetch_all(self, queries: List[Tuple[str, Tuple[Any, ...]]]) -> List[List[Any]]:
+        """Выполнить запросы параллельно (не больше max_size одновременно); строки в порядке запросов"""
+        with timed('query'):
+            future = self._asyncio.run_coroutine_threadsafe(self._fetch_all(queries), self._loop)
+            results = future.result(self._timeout)
+        self.counters['batches'] += 1
+        self.counters['queries'] += len(queries)
+        timer = getattr(_current, 'timer', None)
+        if timer is not None:
+            timer.queries += len(queries)
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, 'max_size': self._max_size}
+
+
+_async_db = None
+
+
+def get_async_db() -> Optional[AsyncDatabase]:
+    """None — асинхронный режим выключен или asyncpg недоступен: тогда работает обычный путь"""
+    global _async_db
+    if not DB_ASYNC:
+        return None
+    if _async_db is None:
+        with _pool_lock:
+            if _async_db is None:
+                try:
+                    import asyncpg
+                except ImportError:
+                    log_event({'type': 'warning', 'message': 'DB_ASYNC=1, but asyncpg is not installed'})
+                    _async_db = False
+                else:
+                    _async_db = AsyncDatabase(asyncpg, os.environ['DATABASE_URL'],
+                                              DB_ASYNC_POOL_SIZE, DB_ASYNC_TIMEOUT_SEC)
+    return _async_db or None
+
+
+# Области поколений кеша: '*' — списки всех заведений, '' — всё сразу (входит в каждый ключ)
+ALL_VENUES_SCOPE = '*'
+GLOBAL_SCOPE = ''
+
+
+class RedisTier:
+    """Общий уровень кеша для всех контейнеров функции: Redis или совместимый сервер"""
+
+    PREFIX = 'inventory:cache:'
+
+    def __init__(self, client, ttl: float):
+        self._client = client
+        self._ttl_ms = max(1, int(ttl * 1000))
+
+    def generations(self, scopes: List[str]) -> List[int]:
+        values = self._client.mget([f'{self.PREFIX}gen:{scope}' for scope in scopes])
+        return [int(value or 0) for value in values]
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._client.get(self.PREFIX + key)
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key: str, value: str) -> None:
+        self._client.set(self.PREFIX + key, value.encode('utf-8'), px=self._ttl_ms)
+
+    def bump(self, scopes: List[str]) -> None:
+        pipeline = self._client.pipeline(transaction=False)
+        for scope in scopes:
+            pipeline.incr(f'{self.PREFIX}gen:{scope}')
+        pipeline.execute()
+
+
+class _Flight:
+    """Загрузка, которую ждут все одновременные промахи по одному ключу"""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._value: Optional[str] = None
+        self._error: Optional[BaseException] = None
+
+    def resolve(self, value: Optional[str], error: Optional[BaseException] = None) -> None:
+        self._value, self._error = value, error
+        self._done.set()
+
+    def wait(self) -> str:
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+class ResponseCache:
+    """Read-through кеш готовых ответов: TTL + LRU в памяти тёплого контейнера и необязательный
+    общий уровень. В ключ входят поколения заведений: запись увеличивает поколение, и прежние
+    ключи просто перестают находиться — их вытеснит LRU или TTL. Одновременные промахи по
+    одному ключу ждут один запрос к БД"""
+
+    def __init__(self, ttl: float, max_entries: int, shared: Optional[RedisTier] = None):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._shared = shared
+        self._shared_down_until = 0.0
+        self._entries: 'OrderedDict[str, Tuple[float, str]]' = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'shared_hits': 0, 'misses': 0, 'coalesced': 0,
+                         'invalidations': 0, 'evictions': 0, 'shared_errors': 0}
+
+    def _shared_call(self, fn, *args: Any) -> Any:
+        """Недоступный общий уровень не роняет запрос: CACHE_SHARED_RETRY_SEC работаем только с локальным"""
+        if time.monotonic() < self._shared_down_until:
+            return None
+        try:
+            with timed('cache'):
+                return fn(*args)
+        except Exception as e:
+            with self._lock:
+                self.counters['shared_errors'] += 1
+                self._shared_down_until = time.monotonic() + CACHE_SHARED_RETRY_SEC
+            log_event({'type': 'warning', 'message': f'cache shared tier failed: {e}'})
+            return None
+
+    def _key(self, scopes: List[str], fingerprint: Tuple[Any, ...]) -> str:
+        scopes = [GLOBAL_SCOPE, *scopes]
+        # Поколения общего уровня одинаковы во всех контейнерах — ключ тоже; локальные нужны,
+        # только пока общий уровень недоступен
+        generations = self._shared_call(self._shared.generations, scopes) if self._shared is not None else None
+        tier = 'shared'
+        if generations is None:
+            with self._lock:
+                generations = [self._generations.get(scope, 0) for scope in scopes]
+            tier = 'local'
+        return hashlib.sha1(repr((tier, fingerprint, generations)).encode('utf-8')).hexdigest()
+
+    def _store(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self._ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def get_or_load(self, scopes: List[str], fingerprint: Tuple[Any, ...], load) -> Tuple[str, str]:
+        """Значение и откуда оно: hit, shared, coalesced или miss (загружено load())"""
+        key = self._key(scopes, fingerprint)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.counters['hits'] += 1
+                return cached[1], 'hit'
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.counters['coalesced'] += 1
+        if not leader:
+            return flight.wait(), 'coalesced'
+        
+        try:
+            value = self._shared_call(self._shared.get, key) if self._shared is not None else None
+            source = 'shared'
+            if value is None:
+                value, source = load(), 'miss'
+                if self._shared is not None:
+                    self._shared_call(self._shared.set, key, value)
+            self._store(key, value)
+        except BaseException as e:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.resolve(None, e)
+            raise
+        with self._lock:
+            self._flights.pop(key, None)
+            self.counters['shared_hits' if source == 'shared' else 'misses'] += 1
+        flight.resolve(value)
+        return value, source
+
+    def invalidate(self, venues: Optional[List[str]]) -> None:
+        """Записи заведений изменились (None — неизвестно какие): их ключи и списки всех заведений устаревают"""
+        scopes = [GLOBAL_SCOPE] if venues is None else [*dict.fromkeys(venues), ALL_VENUES_SCOPE]
+        with self._lock:
+            for scope in scopes:
+                self._generations[scope] = self._generations.get(scope, 0) + 1
+            self.counters['invalidations'] += 1
+        if self._shared is not None:
+            self._shared_call(self._shared.bump, scopes)
 
-def get_db_connection():
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
-    conn.autocommit = True
-    return conn
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.counters, 'entries': len(self._entries), 'max_entries': self._max_entries,
+                    'ttl_sec': self._ttl, 'shared': self._shared is not None}
 
-def escape_sql_string(value):
-    """Экранирование строк для SQL"""
-    if value is None:
-        return 'NULL'
-    return "'" + str(value).replace("'", "''") + "'"
+
+_redis = None
+_redis_lock = threading.Lock()
+
+
+def redis_client():
+    """Клиент CACHE_REDIS_URL, общий для кеша и лимитов; None — адрес не задан или нет модуля redis"""
+    global _redis
+    if not CACHE_REDIS_URL:
+        return None
+    if _redis is None:
+        with _redis_lock:
+            if _redis is None:
+                try:
+                    import redis
+                except ImportError:
+                    log_event({'type': 'warning', 'message': 'CACHE_REDIS_URL is set, but redis is not installed'})
+                    _redis = False
+                else:
+                    _redis = redis.Redis.from_url(CACHE_REDIS_URL, socket_timeout=0.2, socket_connect_timeout=0.2)
+    return _redis or None
+
+
+_cache = None
+
+
+def get_cache() -> Optional[ResponseCache]:
+    """None — кеш выключен (CACHE_TTL_SEC=0); общий уровень подключается, если задан CACHE_REDIS_URL"""
+    global _cache
+    if CACHE_TTL_SEC <= 0:
+        return None
+    if _cache is None:
+        with _pool_lock:
+            if _cache is None:
+                client = redis_client()
+                shared = RedisTier(client, CACHE_TTL_SEC) if client is not None else None
+                _cache = ResponseCache(CACHE_TTL_SEC, CACHE_MAX_ENTRIES, shared)
+    return _cache
+
+
+def invalidate_cache(venues: Optional[List[str]]) -> None:
+    cache = get_cache()
+    if cache is not None:
+        cache.invalidate(venues)
+
+
+class TokenBuckets:
+    """Ведро на ключ: rate токенов в секунду, не больше burst. Ключей не больше max_keys —
+    давно не приходивший клиент вытесняется и возвращается с полным ведром"""
+
+    def __init__(self, rate: float, burst: float, max_keys: int):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self._max_keys = max_keys
+        self._buckets: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+
+    def tokens(self, key: str, now: float) -> float:
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - updated) * self.rate)
+
+    def take(self, key: str, tokens: float, now: float) -> None:
+        self._buckets[key] = (tokens - 1, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self._max_keys:
+            self._buckets.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SharedWindow:
+    """Тот же лимит для всех контейнеров: скользящее окно в Redis из счётчиков двух соседних
+    фиксированных окон (INCR + EXPIRE, без Lua). Окно — burst / rate секунд, в нём не больше burst
+    запросов; отклонённые запросы тоже считаются, так что клиент, не выжидающий Retry-After,
+    остаётся ограничен"""
+
+    PREFIX = 'inventory:rate:'
+
+    def __init__(self, client, rate: float, burst: float):
+        self._client = client
+        self.window = max(1, math.ceil(burst / rate))
+        self.limit = rate * self.window
+
+    def hit(self, keys: List[str], now: float) -> float:
+        """0 — все ключи в пределах лимита; иначе секунды до конца текущего окна"""
+        slot, offset = divmod(now, self.window)
+        pipeline = self._client.pipeline(transaction=False)
+        for key in keys:
+            current = f'{self.PREFIX}{key}:{int(slot)}'
+            pipeline.incr(current)
+            pipeline.expire(current, 2 * self.window)
+            pipeline.get(f'{self.PREFIX}{key}:{int(slot) - 1}')
+        replies = pipeline.execute()
+        weight = 1 - offset / self.window
+        for i in range(0, len(replies), 3):
+            if int(replies[i + 2] or 0) * weight + replies[i] > self.limit:
+                return self.window - offset
+        return 0.0
+
+
+class RateLimiter:
+    """Допуск запроса по ведрам клиента и заведений. Сначала локальные ведра контейнера — бесплатно
+    и без сети; прошедший их запрос проверяется общим окном в Redis. Недоступный Redis не роняет
+    запрос: CACHE_SHARED_RETRY_SEC действуют только локальные ведра"""
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]], max_keys: int, client=None):
+        self._local = {kind: TokenBuckets(rate, burst, max_keys) for kind, (rate, burst) in limits.items()}
+        self._shared = ({kind: SharedWindow(client, rate, burst) for kind, (rate, burst) in limits.items()}
+                        if client is not None else {})
+        self._shared_down_until = 0.0
+        self._lock = threading.Lock()
+        self.counters = {'admitted': 0, 'limited_shared': 0, 'shared_errors': 0,
+                         **{f'limited_{kind}': 0 for kind in limits}}
+
+    def admit(self, keys: Dict[str, List[str]]) -> float:
+        """0 — запрос допущен; иначе через сколько секунд повторить. Токены списываются, только
+        если допускают все ведра: отказ по заведению не тратит лимит клиента"""
+        now = time.monotonic()
+        keys = {kind: values for kind, values in keys.items() if kind in self._local and values}
+        with self._lock:
+            balances = [(kind, key, self._local[kind].tokens(key, now)) for kind, values in keys.items()
+                        for key in values]
+            short = [(kind, (1 - tokens) / self._local[kind].rate) for kind, _, tokens in balances if tokens < 1]
+            if short:
+                kind, wait = max(short, key=lambda item: item[1])
+                self.counters[f'limited_{kind}'] += 1
+                return wait
+            for kind, key, tokens in balances:
+                self._local[kind].take(key, tokens, now)
+        
+        wait = self._shared_wait(keys)
+        with self._lock:
+            self.counters['limited_shared' if wait else 'admitted'] += 1
+        return wait
+
+    def _shared_wait(self, keys: Dict[str, List[str]]) -> float:
+        if not self._shared or time.monotonic() < self._shared_down_until:
+            return 0.0
+        try:
+            now = time.time()
+            return max(self._shared[kind].hit(values, now) for kind, values in keys.items())
+        except Exception as e:
+            with self._lock:
+                self.counters['shared_errors'] += 1
+                self._shared_down_until = time.monotonic() + CACHE_SHARED_RETRY_SEC
+            log_event({'type': 'warning', 'message': f'rate limit shared tier failed: {e}'})
+            return 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.counters, 'buckets': {kind: len(buckets) for kind, buckets in self._local.items()},
+                    'limits': {kind: {'rps': buckets.rate, 'burst': buckets.burst}
+                               for kind, buckets in self._local.items()},
+                    'shared': bool(self._shared)}
+
+
+_limiter = None
+
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """None — все лимиты выключены (RPS=0)"""
+    global _limiter
+    limits = {kind: (rate, burst) for kind, rate, burst in (
+        ('client', RATE_LIMIT_CLIENT_RPS, RATE_LIMIT_CLIENT_BURST),
+        ('venue', RATE_LIMIT_VENUE_RPS, RATE_LIMIT_VENUE_BURST),
+    ) if rate > 0}
+    if not limits:
+        return None
+    if _limiter is None:
+        with _pool_lock:
+            if _limiter is None:
+                _limiter = RateLimiter(limits, RATE_LIMIT_MAX_BUCKETS, redis_client())
+    return _limiter
+
+
+def rate_limit_keys(event: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Клиент — адрес из requestContext (его ставит платформа, заголовки клиента не учитываются);
+    заведения — из venue=... строки запроса, venue=* — отдельное ведро списков всех заведений"""
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    params = event.get('queryStringParameters') or {}
+    raw = (event.get('multiValueQueryStringParameters') or {}).get('venue') or [params.get('venue') or '']
+    venues = [name.strip() for value in raw for name in str(value).split(',') if name.strip()]
+    # Длинный список в одном запросе не должен раздувать ведра и конвейер Redis
+    return {'client': [identity.get('sourceIp') or 'unknown'], 'venue': list(dict.fromkeys(venues))[:MAX_LIMITED_VENUES]}
+
+def execute_prepared(cur, name: str, sql: str, args: Tuple[Any, ...]) -> None:
+    """PREPARE один раз на соединение пула, дальше только EXECUTE без повторного планирования"""
+    prepared = get_pool().prepared_statements(cur.connection)
+    placeholders = ', '.join(['%s'] * len(args))
+    execute = f'EXECUTE {name} ({placeholders})' if args else f'EXECUTE {name}'
+    started = time.perf_counter()
+    with timed('query'):
+        if name not in prepared:
+            cur.execute(f'PREPARE {name} {sql}')
+            prepared.add(name)
+        try:
+            cur.execute(execute, args)
+        except pg().errors.InvalidSqlStatementName:
+            # Сервер мог потерять подготовленный запрос (DISCARD ALL, переключение пулера)
+            prepared.clear()
+            conn = cur.connection
+            if not conn.autocommit or conn.get_transaction_status() != pg().extensions.TRANSACTION_STATUS_IDLE:
+                # Внутри транзакции она уже прервана: повторяет её целиком вызывающий (push_mutations)
+                raise
+            cur.execute(f'PREPARE {name} {sql}')
+            prepared.add(name)
+            cur.execute(execute, args)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    
+    timer = getattr(_current, 'timer', None)
+    if timer is not None:
+        timer.queries += 1
+    if elapsed_ms >= SLOW_QUERY_MS:
+        log_slow_query(cur.connection, name, execute, args, elapsed_ms)
+
+def log_slow_query(conn, name: str, execute: str, args: Tuple[Any, ...], elapsed_ms: float) -> None:
+    """План медленного запроса: EXPLAIN без ANALYZE ничего не выполняет повторно"""
+    plan = None
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f'EXPLAIN (FORMAT JSON) {execute}', args)
+            plan = cur.fetchone()[0]
+    except pg().Error as e:
+        plan = f'EXPLAIN failed: {e}'
+    timer = getattr(_current, 'timer', None)
+    log_event({
+        'type': 'slow_query',
+        'request_id': timer.request_id if timer else None,
+        'statement': name,
+        'params': len(args),
+        'duration_ms': round(elapsed_ms, 2),
+        'threshold_ms': SLOW_QUERY_MS,
+        'plan': plan,
+    })
+
+ENTRY_COUNTER_TYPES = ', '.join(['integer'] * len(COUNTER_FIELDS))
+ENTRY_WRITE_TYPES = f'varchar, date, {ENTRY_COUNTER_TYPES}, varchar, date'
+# Запись хранит venue_id; имя — через venue_name(): в RETURNING нет JOIN, а подзапрос
+# не увидел бы заведение, только что заведённое ensure_venue в этом же операторе
+ENTRY_RETURNING = '''id, t_p23128842_inventory_cutlery_tr.venue_name(venue_id) AS venue,
+                  entry_date::text as date, 
+                  forks, knives, steak_knives, spoons, dessert_spoons,
+                  ice_cooler, plates, sugar_tongs, ice_tongs, ashtrays,
+                  responsible_name, responsible_date::text,
+                  created_at::text'''
+
+# Одна запись на заведение в день: повторный POST за ту же дату обновляет её, id сохраняется
+ENTRY_UPSERT = f'''ON CONFLICT (venue_id, entry_date) DO UPDATE
+        SET {', '.join(f'{column} = EXCLUDED.{column}' for column in ENTRY_WRITE_COLUMNS[2:])}'''
+
+INSERT_ENTRY_SQL = f'''({ENTRY_WRITE_TYPES}) AS
+        INSERT INTO t_p23128842_inventory_cutlery_tr.inventory_entries
+        ({', '.join(ENTRY_WRITE_COLUMNS)})
+        VALUES (t_p23128842_inventory_cutlery_tr.ensure_venue($1),
+                {', '.join(f'${n}' for n in range(2, len(ENTRY_WRITE_COLUMNS) + 1))})
+        {ENTRY_UPSERT}
+        RETURNING {ENTRY_RETURNING}
+'''
+
+# Пакет любого размера — один подготовленный запрос: колонки приходят массивами.
+# Даты передаются text[]: psycopg2 присылает ARRAY['...'], а text[] -> date[]
+# приводится только явно
+INSERT_ENTRIES_SQL = f'''(varchar[], text[], {', '.join(['integer[]'] * len(COUNTER_FIELDS))}, varchar[], text[]) AS
+        INSERT INTO t_p23128842_inventory_cutlery_tr.inventory_entries
+        ({', '.join(ENTRY_WRITE_COLUMNS)})
+        SELECT t_p23128842_inventory_cutlery_tr.ensure_venue(r.venue), r.entry_date,
+               {', '.join(f'r.{column}' for column in ENTRY_WRITE_COLUMNS[2:])}
+        FROM unnest($1, $2::date[], {', '.join(f'${n}' for n in range(3, len(COUNTER_FIELDS) + 3))},
+                    ${len(COUNTER_FIELDS) + 3}, ${len(COUNTER_FIELDS) + 4}::date[])
+             AS r(venue, {', '.join(ENTRY_WRITE_COLUMNS[1:])})
+        {ENTRY_UPSERT}
+        RETURNING {ENTRY_RETURNING}
+'''
+
+UPDATE_ENTRY_SQL = f'''(integer, {ENTRY_WRITE_TYPES}) AS
+        UPDATE t_p23128842_inventory_cutlery_tr.inventory_entries
+        SET venue_id = t_p23128842_inventory_cutlery_tr.ensure_venue($2),
+            {', '.join(f'{column} = ${n}' for n, column in enumerate(ENTRY_WRITE_COLUMNS[1:], start=3))}
+        WHERE id = $1
+        RETURNING {ENTRY_RETURNING}
+'''
+
+DELETE_ENTRY_SQL = '''(integer) AS
+        DELETE FROM t_p23128842_inventory_cutlery_tr.inventory_entries
+        WHERE id = $1
+        RETURNING t_p23128842_inventory_cutlery_tr.venue_name(venue_id)
+'''
+
+ENTRY_VENUE_SQL = '''(integer) AS
+        SELECT t_p23128842_inventory_cutlery_tr.venue_name(venue_id)
+        FROM t_p23128842_inventory_cutlery_tr.inventory_entries
+        WHERE id = $1
+'''
+
+SELECT_ENTRY_SQL = f'''(integer) AS
+        SELECT {ENTRY_RETURNING}
+        FROM t_p23128842_inventory_cutlery_tr.inventory_entries
+        WHERE id = $1
+'''
+
+# Горизонт синхронизации: все транзакции с xid ниже него уже завершены и видны
+SYNC_HORIZON_SQL = '''AS
+        SELECT pg_snapshot_xmin(pg_current_snapshot())::text
+'''
+
+SYNC_ENTRY_STATE_SQL = '''(integer, xid8) AS
+        SELECT deleted, xid >= $2
+        FROM t_p23128842_inventory_cutlery_tr.inventory_changes
+        WHERE entry_id = $1
+'''
+
+
+ENTRY_CODEC = RowCodec(ENTRY_SCHEMA)
+
+
+def encode_payload(payload: Any) -> str:
+    """json.dumps для ответа, в котором списки записей уже закодированы RowCodec"""
+    if isinstance(payload, RawJSON):
+        return payload
+    if isinstance(payload, dict):
+        return '{' + ', '.join(f'{encode_basestring_ascii(str(key))}: {encode_payload(value)}'
+                               for key, value in payload.items()) + '}'
+    if isinstance(payload, list):
+        return '[' + ', '.join(encode_payload(value) for value in payload) + ']'
+    return json.dumps(payload)
+
+def json_response(status_code: int, payload: Any, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    response_headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*'
+    }
+    if headers:
+        response_headers.update(headers)
+    with timed('serialize'):
+        body = encode_payload(payload)
+    return {
+        'statusCode': status_code,
+        'headers': response_headers,
+        'body': body,
+        'isBase64Encoded': False
+    }
+
+def parse_choice_param(value: Optional[str], name: str, choices: Tuple[str, ...],
+                       default: Optional[str] = None) -> Optional[str]:
+    if not value:
+        return default
+    if value not in choices:
+        raise ValueError(f"Invalid {name}: expected one of {', '.join(choices)}")
+    return value
+
+def parse_date_param(value: Optional[str], name: str) -> Optional[str]:
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ValueError(f'Invalid {name}: expected YYYY-MM-DD')
+
+def parse_limit_param(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    if not value.isdigit() or int(value) < 1:
+        raise ValueError('Invalid limit: expected a positive integer')
+    return min(int(value), MAX_PAGE_LIMIT)
+
+def encode_cursor(entry_date: str, entry_id: int) -> str:
+    return f'{entry_date}_{entry_id}'
+
+def decode_cursor(value: Optional[str]) -> Optional[Tuple[str, int]]:
+    """Курсор keyset-пагинации: дата и id последней отданной записи"""
+    if not value:
+        return None
+    entry_date, _, entry_id = value.partition('_')
+    if not entry_id.isdigit():
+        raise ValueError('Invalid cursor')
+    return parse_date_param(entry_date, 'cursor'), int(entry_id)
+
+def _rows_to_entries(rows: List[Tuple[Any, ...]], columnar: bool = False) -> RawJSON:
+    timer = getattr(_current, 'timer', None)
+    if timer is not None:
+        timer.rows += len(rows)
+    with timed('map'):
+        if columnar:
+            return ENTRY_CODEC.encode_columns(rows)
+        return ENTRY_CODEC.encode_rows(rows)
+
+def _row_to_entry(row: Tuple[Any, ...]) -> RawJSON:
+    timer = getattr(_current, 'timer', None)
+    if timer is not None:
+        timer.rows += 1
+    with timed('map'):
+        return ENTRY_CODEC.encode_row(row)
+
+def _page(rows: List[Tuple[Any, ...]], limit: Optional[int],
+          columnar: bool = False) -> Tuple[RawJSON, Optional[str]]:
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][2], rows[-1][0])
+    return _rows_to_entries(rows, columnar), next_cursor
+
+class _Binder:
+    """Накопитель параметров подготовленного запроса: $n, типы и «форма» для имени.
+    cast=True — типы пишутся в сам текст ($1::date): для asyncpg, где нет PREPARE ... (types)"""
+    
+    def __init__(self, cast: bool = False):
+        self.args: List[Any] = []
+        self.types: List[str] = []
+        self.shape = ''
+        self._cast = cast
+    
+    def __call__(self, value: Any, type_name: str) -> str:
+        self.args.append(value)
+        self.types.append(type_name)
+        return f'${len(self.args)}::{type_name}' if self._cast else f'${len(self.args)}'
+    
+    def declaration(self) -> str:
+        return f"({', '.join(self.types)}) AS" if self.types else 'AS'
+    
+    def native_args(self) -> Tuple[Any, ...]:
+        """Аргументы для asyncpg: даты объектами date, а не строками"""
+        return tuple(date.fromisoformat(value) if kind == 'date' and value is not None else value
+                     for value, kind in zip(self.args, self.types))
+    
+    def filters(self, date_from: Optional[str], date_to: Optional[str],
+                cursor: Optional[Tuple[str, int]], limit: Optional[int]) -> Tuple[List[str], str]:
+        """Условия по датам/курсору и LIMIT (с лишней строкой для признака следующей страницы)"""
+        conditions = []
+        if date_from:
+            conditions.append(f"entry_date >= {self(date_from, 'date')}")
+            self.shape += 'f'
+        if date_to:
+            conditions.append(f"entry_date <= {self(date_to, 'date')}")
+            self.shape += 't'
+        if cursor:
+            # (venue_id, entry_date) уникален — дата однозначно задаёт позицию; id в курсоре
+            # остаётся ради совместимости со ссылками, выданными до V0008
+            conditions.append(f"entry_date < {self(cursor[0], 'date')}")
+            self.shape += 'c'
+        limit_clause = ''
+        if limit:
+            limit_clause = f"LIMIT {self(limit + 1, 'integer')}"
+            self.shape += 'l'
+        return conditions, limit_clause
+
+def get_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    name = name.lower()
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+VENUE_VERSIONS_SQL = '''(varchar[]) AS
+        SELECT venue, version
+        FROM t_p23128842_inventory_cutlery_tr.inventory_venue_versions
+        WHERE venue = ANY($1)
+'''
+
+ALL_VENUE_VERSIONS_SQL = '''AS
+        SELECT venue, version
+        FROM t_p23128842_inventory_cutlery_tr.inventory_venue_versions
+'''
+
+def venue_etag(conn, venues: Optional[List[str]], fingerprint: Tuple[Any, ...]) -> str:
+    """ETag из версий заведений (их поднимают триггеры на inventory_entries) и параметров запроса"""
+    cur = conn.cursor()
+    if venues is None:
+        execute_prepared(cur, 'inv_versions_all', ALL_VENUE_VERSIONS_SQL, ())
+    else:
+        execute_prepared(cur, 'inv_versions', VENUE_VERSIONS_SQL, (venues,))
+    versions = sorted(cur.fetchall())
+    cur.close()
+    digest = hashlib.sha1(json.dumps([versions, fingerprint], ensure_ascii=False).encode('utf-8'))
+    return f'W/"{digest.hexdigest()[:20]}"'
+
+def accepted_encodings(accept_encoding: Optional[str]) -> List[str]:
+    """Кодировки из Accept-Encoding без отключённых через q=0"""
+    accepted = []
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.partition(';')
+        quality = params.strip().replace(' ', '')
+        try:
+            disabled = quality.startswith('q=') and float(quality[2:]) == 0
+        except ValueError:
+            disabled = False
+        if name.strip() and not disabled:
+            accepted.append(name.strip().lower())
+    return accepted
+
+def choose_encoding(compress: Optional[str], accept_encoding: Optional[str]) -> Optional[str]:
+    """compress=gzip|br — явный выбор клиента, auto — лучшее из Accept-Encoding; br только при модуле brotli"""
+    if not compress:
+        return None
+    candidates = [compress] if compress != 'auto' else [
+        name for name in ('br', 'gzip') if name in accepted_encodings(accept_encoding)]
+    for name in candidates:
+        if name == 'br':
+            try:
+                import brotli  # noqa: F401
+            except ImportError:
+                continue
+        return name
+    return 'gzip' if compress == 'br' else None
+
+def compress_response(response: Dict[str, Any], encoding: Optional[str]) -> Dict[str, Any]:
+    """Сжатое тело уходит base64 с isBase64Encoded: шлюз отдаёт клиенту байты и Content-Encoding"""
+    body = response['body']
+    if not encoding or response['isBase64Encoded'] or len(body) < COMPRESS_MIN_BYTES:
+        return response
+    import base64
+    with timed('compress'):
+        raw = body.encode('utf-8')
+        if encoding == 'br':
+            import brotli
+            data = brotli.compress(raw, quality=5)
+        else:
+            import gzip
+            data = gzip.compress(raw, compresslevel=6)
+        response['body'] = base64.b64encode(data).decode('ascii')
+    response['isBase64Encoded'] = True
+    response['headers']['Content-Encoding'] = encoding
+    return response
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Слабое сравнение по RFC 9110: префикс W/ не учитывается"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return '*' in candidates or etag.removeprefix('W/') in (c.removeprefix('W/') for c in candidates)
+
+
+_archive_storage: Optional[ArchiveStorage] = None
+_archive_segments: OrderedDict = OrderedDict()
+_archive_lock = threading.Lock()
+
+
+def load_segment(key: str, digest: str) -> ArchiveSegment:
+    """Сегмент по ключу из каталога; ключ меняется при каждой перезаписи месяца, поэтому
+    прочитанные сегменты живут в LRU контейнера без сроков и инвалидации"""
+    global _archive_storage
+    with _archive_lock:
+        segment = _archive_segments.get(key)
+        if segment is not None:
+            _archive_segments.move_to_end(key)
+            return segment
+        if _archive_storage is None:
+            _archive_storage = ArchiveStorage(ARCHIVE_URL)
+    with timed('archive'):
+        segment = read_segment(_archive_storage, key, digest)
+    with _archive_lock:
+        _archive_segments[key] = segment
+        while len(_archive_segments) > ARCHIVE_CACHE_SEGMENTS:
+            _archive_segments.popitem(last=False)
+    return segment
+
+
+def _archive_segments_sql(bind: _Binder, venues: Optional[List[str]], lower: Optional[str],
+                          upper: Optional[str]) -> str:
+    """Сегменты каталога, пересекающие [lower, upper], с заведениями из venues (None — все), от новых к старым"""
+    conditions = [f"s.last_date >= COALESCE({bind(lower, 'date')}, '-infinity'::date)",
+                  f"s.first_date <= COALESCE({bind(upper, 'date')}, 'infinity'::date)"]
+    bind.shape = 'any'
+    if venues is not None:
+        conditions.append(f"v.name = ANY({bind(venues, 'varchar[]')})")
+        bind.shape = 'in'
+    return f'''
+        SELECT s.storage_key, s.sha256, s.last_date::text, array_agg(v.name::text)
+        FROM t_p23128842_inventory_cutlery_tr.archive_segments s
+        JOIN t_p23128842_inventory_cutlery_tr.venues v ON v.id = ANY(s.venue_ids)
+        WHERE {' AND '.join(conditions)}
+        GROUP BY s.month
+        ORDER BY s.month DESC
+    '''
+
+
+def archive_segments(conn, venues: Optional[List[str]], lower: Optional[str],
+                     upper: Optional[str]) -> List[Tuple[str, str, str, List[str]]]:
+    """conn=None — асинхронный путь: каталог читается через asyncpg-пул"""
+    if conn is None:
+        bind = _Binder(cast=True)
+        query = _archive_segments_sql(bind, venues, lower, upper)
+        return [tuple(row) for row in get_async_db().fetch_all([(query, bind.native_args())])[0]]
+    bind = _Binder()
+    query = _archive_segments_sql(bind, venues, lower, upper)
+    cur = conn.cursor()
+    execute_prepared(cur, f'inv_archive_segments_{bind.shape}', f'{bind.declaration()}{query}', tuple(bind.args))
+    segments = cur.fetchall()
+    cur.close()
+    return segments
+
+
+def read_through(conn, grouped: Dict[str, List[Tuple[Any, ...]]], all_venues: bool, date_from: Optional[str],
+                 date_to: Optional[str], cursor: Optional[Tuple[str, int]],
+                 limit: Optional[int]) -> Dict[str, List[Tuple[Any, ...]]]:
+    """Дополнить страницы заведений (строки из Postgres, LIMIT + 1) записями архива. Файлы
+    читаются, только если страница не заполнена или архивный месяц новее её последней строки;
+    строка из Postgres за архивный день (дописана после переноса) важнее архивной"""
+    if not ARCHIVE_URL:
+        return grouped
+    upper = date_to
+    if cursor:
+        before_cursor = (date.fromisoformat(cursor[0]) - timedelta(days=1)).isoformat()
+        upper = min(upper, before_cursor) if upper else before_cursor
+    # Полная страница из Postgres уже содержит всё, что новее её последней строки
+    lower = {name: rows[limit][2] if limit and len(rows) > limit else date_from for name, rows in grouped.items()}
+    
+    for key, digest, last_date, names in archive_segments(conn, None if all_venues else list(grouped),
+                                                          date_from, upper):
+        for name in names:
+            if name not in grouped:
+                if not all_venues:
+                    continue
+                grouped[name], lower[name] = [], date_from
+            rows = grouped[name]
+            if limit and len(rows) > limit and rows[limit][2] > last_date:
+                continue
+            known = {row[2] for row in rows}
+            extra = [row for row in load_segment(key, digest).venue_rows(name, lower[name], upper)
+                     if row[2] not in known]
+            if extra:
+                rows = sorted(rows + extra, key=lambda row: row[2], reverse=True)
+                grouped[name] = rows[:limit + 1] if limit else rows
+    return grouped
+
+
+def _venue_entries_sql(bind: _Binder, venue: str, date_from: Optional[str], date_to: Optional[str],
+                       cursor: Optional[Tuple[str, int]], limit: Optional[int]) -> str:
+    """SELECT страницы одного заведения без объявления типов — общий для PREPARE и asyncpg"""
+    venue_param = bind(venue, 'varchar')
+    conditions = [f'venue_id = (SELECT id FROM t_p23128842_inventory_cutlery_tr.venues WHERE name = {venue_param})']
+    filters, limit_clause = bind.filters(date_from, date_to, cursor, limit)
+    return f'''
+        SELECT id, {venue_param} AS venue, entry_date::text as date, 
+               forks, knives, steak_knives, spoons, dessert_spoons,
+               ice_cooler, plates, sugar_tongs, ice_tongs, ashtrays,
+               responsible_name, responsible_date::text,
+               created_at::text
+        FROM t_p23128842_inventory_cutlery_tr.inventory_entries
+        WHERE {' AND '.join(conditions + filters)}
+        ORDER BY entry_date DESC
+        {limit_clause}
+    '''
+
+def list_entries(conn, venue: str, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                 cursor: Optional[Tuple[str, int]] = None, limit: Optional[int] = None,
+                 columnar: bool = False) -> Tuple[RawJSON, Optional[str]]:
+    """Записи заведения от новых к старым; страница читается index-only scan по покрывающему
+    inventory_entries_venue_date_key, секции вне диапазона дат отсекаются планировщиком"""
+    cur = conn.cursor()
+    
+    # Для каждого набора фильтров — свой подготовленный запрос: общий план
+    # с «$n IS NULL OR ...» не смог бы использовать индекс по диапазону дат
+    bind = _Binder()
+    query = _venue_entries_sql(bind, venue, date_from, date_to, cursor, limit)
+    
+    execute_prepared(cur, f'inv_list_{bind.shape or "all"}', f'{bind.declaration()}{query}', tuple(bind.args))
+    rows = cur.fetchall()
+    cur.close()
+    # Каталог архива читается после страницы: месяц, перенесённый между запросами, попадёт
+    # в ответ дважды (и схлопнется по дате), но не пропадёт
+    rows = read_through(conn, {venue: rows}, False, date_from, date_to, cursor, limit)[venue]
+    return _page(rows, limit, columnar)
+
+def list_venues_entries(conn, venues: Optional[List[str]], date_from: Optional[str] = None,
+                        date_to: Optional[str] = None, limit: Optional[int] = None,
+                        columnar: bool = False) -> Dict[str, Dict[str, Any]]:
+    """Записи нескольких заведений (None — всех) одним запросом: LATERAL-подзапрос на каждое заведение
+    идёт по inventory_entries_venue_date_key, поэтому LIMIT применяется к каждому заведению отдельно"""
+    db = get_async_db()
+    if db is not None:
+        return _list_venues_entries_async(db, venues, date_from, date_to, limit, columnar)
+    cur = conn.cursor()
+    
+    bind = _Binder()
+    if venues is None:
+        # Справочник заведений вместо обхода индекса; заведения без записей LATERAL не даст
+        venue_source = 't_p23128842_inventory_cutlery_tr.venues'
+        bind.shape = 'any_'
+    else:
+        venue_source = f'''(SELECT id, name FROM t_p23128842_inventory_cutlery_tr.venues
+                          WHERE name = ANY({bind(venues, 'varchar[]')}))'''
+        bind.shape = 'in_'
+    filters, limit_clause = bind.filters(date_from, date_to, None, limit)
+    
+    query = f'''{bind.declaration()}
+        SELECT e.* FROM {venue_source} AS v
+        CROSS JOIN LATERAL (
+            SELECT id, v.name AS venue, entry_date::text as date, 
+                   forks, knives, steak_knives, spoons, dessert_spoons,
+                   ice_cooler, plates, sugar_tongs, ice_tongs, ashtrays,
+                   responsible_name, responsible_date::text,
+                   created_at::text
+            FROM t_p23128842_inventory_cutlery_tr.inventory_entries
+            WHERE {' AND '.join(['venue_id = v.id'] + filters)}
+            ORDER BY entry_date DESC
+            {limit_clause}
+        ) e
+    '''
+    
+    execute_prepared(cur, f'inv_list_venues_{bind.shape}'.rstrip('_'), query, tuple(bind.args))
+    grouped: Dict[str, List[Tuple[Any, ...]]] = {name: [] for name in venues or []}
+    for row in cur.fetchall():
+        grouped.setdefault(row[1], []).append(row)
+    cur.close()
+    read_through(conn, grouped, venues is None, date_from, date_to, None, limit)
+    
+    result = {}
+    for name, rows in grouped.items():
+        entries, next_cursor = _page(rows, limit, columnar)
+        result[name] = {'entries': entries, 'next_cursor': next_cursor}
+    return result
+
+VENUE_NAMES_SQL = 'SELECT name FROM t_p23128842_inventory_cutlery_tr.venues ORDER BY name'
+STATS_VENUE_NAMES_SQL = 'SELECT venue FROM t_p23128842_inventory_cutlery_tr.inventory_venue_versions ORDER BY venue'
+
+def _list_venues_entries_async(db: AsyncDatabase, venues: Optional[List[str]], date_from: Optional[str],
+                               date_to: Optional[str], limit: Optional[int],
+                               columnar: bool) -> Dict[str, Dict[str, Any]]:
+    """По запросу на заведение, параллельно на asyncpg-пуле: при десятках заведений каждое
+    читается своим соединением, а не последовательно внутри одного LATERAL"""
+    names = venues
+    if names is None:
+        names = [row[0] for row in db.fetch_all([(VENUE_NAMES_SQL, ())])[0]]
+    queries = []
+    for name in names:
+        bind = _Binder(cast=True)
+        queries.append((_venue_entries_sql(bind, name, date_from, date_to, None, limit), bind.native_args()))
+    
+    grouped = {}
+    for name, rows in zip(names, db.fetch_all(queries)):
+        if not rows and venues is None:
+            # Как и LATERAL в обычном пути: для venue=* заведения без записей не попадают в ответ
+            continue
+        grouped[name] = rows
+    read_through(None, grouped, venues is None, date_from, date_to, None, limit)
+    
+    result = {}
+    for name, rows in grouped.items():
+        entries, next_cursor = _page(rows, limit, columnar)
+        result[name] = {'entries': entries, 'next_cursor': next_cursor}
+    return result
+
+def _fold_daily_stats(result: Dict[str, List[Dict[str, Any]]], rows: List[Tuple[Any, ...]]) -> None:
+    for venue, day, item, count, delta, loss, loss_7d, loss_30d in rows:
+        days = result.setdefault(venue, [])
+        if not days or days[-1]['date'] != day:
+            days.append({'date': day, 'items': {}})
+        days[-1]['items'][item] = {
+            'count': count,
+            'delta': delta,
+            'loss': loss,
+            'loss_7d': loss_7d,
+            'loss_30d': loss_30d
+        }
+
+def _list_daily_stats_async(db: AsyncDatabase, venues: Optional[List[str]], date_from: Optional[str],
+                            date_to: Optional[str]) -> Dict[str, List[Dict[str, Any]]]:
+    names = venues
+    if names is None:
+        names = [row[0] for row in db.fetch_all([(STATS_VENUE_NAMES_SQL, ())])[0]]
+    queries = []
+    for name in names:
+        bind = _Binder(cast=True)
+        venue_param = bind(name, 'varchar')
+        if date_from:
+            lower = bind(date_from, 'date')
+        else:
+            lower = f'''(SELECT max(entry_date) - 29
+                       FROM t_p23128842_inventory_cutlery_tr.inventory_daily_stats
+                       WHERE venue = {venue_param})'''
+        conditions = [f's.venue = {venue_param}', f's.entry_date >= {lower}']
+        if date_to:
+            conditions.append(f"s.entry_date <= {bind(date_to, 'date')}")
+        queries.append((f'''
+            SELECT s.venue, s.entry_date::text, s.item, s.item_count, s.delta, s.loss, s.loss_7d, s.loss_30d
+            FROM t_p23128842_inventory_cutlery_tr.inventory_daily_stats s
+            WHERE {' AND '.join(conditions)}
+            ORDER BY s.entry_date DESC
+        ''', bind.native_args()))
+    
+    result: Dict[str, List[Dict[str, Any]]] = {name: [] for name in venues or []}
+    for rows in db.fetch_all(queries):
+        _fold_daily_stats(result, rows)
+    return result
+
+def list_daily_stats(conn, venues: Optional[List[str]], date_from: Optional[str],
+                     date_to: Optional[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Готовая сводка из inventory_daily_stats; без from — последние 30 дней с данными по каждому заведению"""
+    if date_to and not date_from:
+        date_from = (date.fromisoformat(date_to) - timedelta(days=29)).isoformat()
+    db = get_async_db()
+    if db is not None:
+        return _list_daily_stats_async(db, venues, date_from, date_to)
+    cur = conn.cursor()
+    
+    bind = _Binder()
+    if venues is None:
+        venue_source = '''(SELECT venue FROM t_p23128842_inventory_cutlery_tr.inventory_venue_versions)'''
+        bind.shape = 'any'
+    else:
+        venue_source = f"unnest({bind(venues, 'varchar[]')})"
+        bind.shape = 'in'
+    if date_from:
+        lower = bind(date_from, 'date')
+    else:
+        lower = '''(SELECT max(entry_date) - 29
+                   FROM t_p23128842_inventory_cutlery_tr.inventory_daily_stats
+                   WHERE venue = v.name)'''
+        bind.shape += '_recent'
+    conditions = ['s.venue = v.name', f's.entry_date >= {lower}']
+    if date_to:
+        conditions.append(f"s.entry_date <= {bind(date_to, 'date')}")
+        bind.shape += '_to'
+    
+    query = f'''{bind.declaration()}
+        SELECT s.venue, s.entry_date::text, s.item, s.item_count, s.delta, s.loss, s.loss_7d, s.loss_30d
+        FROM {venue_source} AS v(name)
+        CROSS JOIN LATERAL (
+            SELECT * FROM t_p23128842_inventory_cutlery_tr.inventory_daily_stats s
+            WHERE {' AND '.join(conditions)}
+        ) s
+        ORDER BY s.venue, s.entry_date DESC
+    '''
+    
+    execute_prepared(cur, f'inv_daily_stats_{bind.shape}', query, tuple(bind.args))
+    
+    result: Dict[str, List[Dict[str, Any]]] = {name: [] for name in venues or []}
+    _fold_daily_stats(result, cur.fetchall())
+    cur.close()
+    return result
+
+def list_monthly_rollups(conn, venues: Optional[List[str]], date_from: Optional[str],
+                         date_to: Optional[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Итоги архивных месяцев (их пишет backend/archive вместо дневной сводки), от новых к старым"""
+    cur = conn.cursor()
+    bind = _Binder()
+    conditions = []
+    if venues is not None:
+        conditions.append(f"venue = ANY({bind(venues, 'varchar[]')})")
+        bind.shape += 'in'
+    if date_from:
+        conditions.append(f"month >= date_trunc('month', {bind(date_from, 'date')})")
+        bind.shape += 'f'
+    if date_to:
+        conditions.append(f"month <= {bind(date_to, 'date')}")
+        bind.shape += 't'
+    query = f'''{bind.declaration()}
+        SELECT venue, to_char(month, 'YYYY-MM'), item, days, first_count, last_count,
+               min_count, max_count, avg_count::float8, loss
+        FROM t_p23128842_inventory_cutlery_tr.inventory_monthly_rollups
+        {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+        ORDER BY venue, month DESC
+    '''
+    execute_prepared(cur, f'inv_monthly_rollups_{bind.shape or "all"}', query, tuple(bind.args))
+    
+    result: Dict[str, List[Dict[str, Any]]] = {name: [] for name in venues or []}
+    for venue, month, item, days, first, last, smallest, largest, average, loss in cur.fetchall():
+        months = result.setdefault(venue, [])
+        if not months or months[-1]['month'] != month:
+            months.append({'month': month, 'items': {}})
+        months[-1]['items'][item] = {
+            'days': days,
+            'first': first,
+            'last': last,
+            'min': smallest,
+            'max': largest,
+            'avg': average,
+            'loss': loss
+        }
+    cur.close()
+    return result
+
+ANALYTICS_ITEMS = tuple(column for column, _ in COUNTER_FIELDS)
+
+_np = None
+
+
+def np_module():
+    """numpy; импортируется только запросами аналитики, остальные вызовы не платят за него при старте"""
+    global _np
+    if _np is None:
+        with timed('import'):
+            import numpy
+        _np = numpy
+    return _np
+
+
+def load_history(conn, venues: Optional[List[str]], lower: date, upper: date) -> Tuple[List[str], Any]:
+    """История заведений за [lower, upper] матрицей int64: индекс заведения, день от lower и счётчики
+    (-1 — значения нет). COPY в текстовом виде разбирается numpy целиком, без объекта на каждую ячейку"""
+    np = np_module()
+    cur = conn.cursor()
+    if venues is None:
+        cur.execute('SELECT id, name FROM t_p23128842_inventory_cutlery_tr.venues ORDER BY name')
+    else:
+        cur.execute('''SELECT id, name FROM t_p23128842_inventory_cutlery_tr.venues
+                       WHERE name = ANY(%s) ORDER BY array_position(%s, name::text)''', (venues, venues))
+    known = cur.fetchall()
+    names = [name for _, name in known]
+    if not known:
+        cur.close()
+        return names, np.empty((0, 2 + len(ANALYTICS_ITEMS)), dtype=np.int64)
+    
+    # venue_id -> позиция в names прямо в SQL: дальше индексы сразу годятся для numpy
+    positions = ' '.join(f'WHEN {venue_id} THEN {n}' for n, (venue_id, _) in enumerate(known))
+    query = cur.mogrify(f'''
+        COPY (
+            SELECT CASE venue_id {positions} END, entry_date - %s::date,
+                   {', '.join(f'COALESCE({column}, -1)' for column in ANALYTICS_ITEMS)}
+            FROM t_p23128842_inventory_cutlery_tr.inventory_entries
+            WHERE venue_id = ANY(%s) AND entry_date BETWEEN %s AND %s
+        ) TO STDOUT
+    ''', (lower, [venue_id for venue_id, _ in known], lower, upper)).decode('utf-8')
+    buffer = io.StringIO()
+    with timed('query'):
+        cur.copy_expert(query, buffer)
+    cur.close()
+    timer = getattr(_current, 'timer', None)
+    if timer is not None:
+        timer.queries += 2
+    with timed('map'):
+        history = np.fromstring(buffer.getvalue(), dtype=np.int64, sep=' ')
+    history = history.reshape(-1, 2 + len(ANALYTICS_ITEMS))
+    if ARCHIVE_URL:
+        history = _archived_history(conn, names, lower, upper, history)
+    return names, history
+
+
+def _archived_history(conn, names: List[str], lower: date, upper: date, history):
+    """Строки архива за [lower, upper] в той же матрице; день, уже найденный в Postgres, не дублируется"""
+    np = np_module()
+    span = (upper - lower).days + 1
+    positions = {name: n for n, name in enumerate(names)}
+    hot_keys = history[:, 0] * span + history[:, 1]
+    parts = [history]
+    for key, digest, _, segment_venues in archive_segments(conn, names, lower.isoformat(), upper.isoformat()):
+        segment = load_segment(key, digest)
+        offset = (segment.month - lower).days - 1
+        with timed('map'):
+            for name in segment_venues:
+                _, start, stop = segment.venues[name]
+                days = np.asarray(segment.column('day')[start:stop], dtype=np.int64) + offset
+                block = np.column_stack(
+                    [np.full(len(days), positions[name], dtype=np.int64), days]
+                    + [np.asarray(segment.column(item)[start:stop], dtype=np.int64) for item in ANALYTICS_ITEMS])
+                keep = (days >= 0) & (days < span) & ~np.isin(positions[name] * span + days, hot_keys)
+                parts.append(block[keep])
+    return np.concatenate(parts)
+
+
+def _rolling_sum(np, values, window: int):
+    """Сумма за окно из window календарных дней, заканчивающееся текущим (как RANGE в inventory_daily_stats)"""
+    cumulative = np.cumsum(values, axis=1, dtype=np.float64)
+    cumulative[:, window:] -= cumulative[:, :-window].copy()
+    return cumulative
+
+
+def analyze_history(history, venue_count: int, days: int, report_from: int, window: int,
+                    threshold: float) -> Dict[str, Any]:
+    """Векторный расчёт по кубу заведения × дни × предметы; дни до report_from только прогревают
+    дельты и скользящие окна. Возвращает массивы numpy (float, nan — нет данных)"""
+    np = np_module()
+    items = len(ANALYTICS_ITEMS)
+    counts = np.full((venue_count, days, items), np.nan, dtype=np.float32)
+    values = history[:, 2:].astype(np.float32)
+    values[history[:, 2:] < 0] = np.nan
+    counts[history[:, 0], history[:, 1]] = values
+    
+    # Дельта считается к последней предыдущей записи, даже если между ними пропущены дни
+    recorded = ~np.isnan(counts)
+    last = np.where(recorded, np.arange(days, dtype=np.int32)[None, :, None], -1)
+    np.maximum.accumulate(last, axis=1, out=last)
+    filled = np.take_along_axis(counts, np.maximum(last, 0), axis=1)
+    filled[last < 0] = np.nan
+    delta = np.full_like(counts, np.nan)
+    delta[:, 1:] = counts[:, 1:] - filled[:, :-1]
+    loss = np.clip(-np.nan_to_num(delta), 0, None)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rolling_loss = _rolling_sum(np, loss, window)
+        known = ~np.isnan(filled)
+        mean_stock = _rolling_sum(np, np.nan_to_num(filled), window) / _rolling_sum(np, known, window)
+        rolling_rate = np.where(mean_stock > 0, rolling_loss / mean_stock, np.nan)
+        
+        # z-оценка дневной потери относительно своей же истории (заведение, предмет) за период отчёта
+        period = slice(report_from, days)
+        observed = ~np.isnan(delta[:, period])
+        observations = observed.sum(axis=1)
+        sample = np.where(observed, loss[:, period], 0.0)
+        mean = sample.sum(axis=1) / observations
+        spread = np.sqrt(np.where(observed, (sample - mean[:, None]) ** 2, 0.0).sum(axis=1) / observations)
+        z = np.where(observed, (sample - mean[:, None]) / spread[:, None], np.nan)
+        anomalies = observed & (sample > 0) & (z >= threshold)
+        
+        # Сравнение заведений: доля потерь от среднего запаса за период, z и место среди заведений
+        loss_total = sample.sum(axis=1)
+        period_known = known[:, period]
+        stock = np.where(period_known, filled[:, period], 0.0).sum(axis=1) / period_known.sum(axis=1)
+        rate = np.where(stock > 0, loss_total / stock, np.nan)
+        rated = ~np.isnan(rate)
+        peers = rated.sum(axis=0)
+        peer_mean = np.where(rated, rate, 0.0).sum(axis=0) / peers
+        peer_spread = np.sqrt(np.where(rated, (rate - peer_mean) ** 2, 0.0).sum(axis=0) / peers)
+        peer_z = np.where(rated & (peer_spread > 0), (rate - peer_mean) / peer_spread, np.nan)
+    order = np.argsort(np.where(rated, -rate, np.inf), axis=0, kind='stable')
+    rank = np.empty_like(order)
+    np.put_along_axis(rank, order, np.arange(1, venue_count + 1)[:, None], axis=0)
+    
+    return {
+        'counts': counts[:, period], 'delta': delta[:, period], 'loss': loss[:, period],
+        'rolling_loss': rolling_loss[:, period], 'rolling_rate': rolling_rate[:, period],
+        'z': z, 'anomalies': anomalies, 'observations': observations, 'mean_loss': mean,
+        'loss_total': loss_total, 'mean_stock': stock, 'rate': rate,
+        'peer_mean': peer_mean, 'peer_z': peer_z, 'rank': np.where(rated, rank, 0),
+    }
+
+
+def _number(value: Any, digits: int) -> Optional[float]:
+    value = float(value)
+    return None if value != value else round(value, digits)
+
+
+def analytics_lower_bound(date_from: str, window: int) -> date:
+    """Запас до начала периода: предыдущая запись для первой дельты и полное окно для скользящих сумм"""
+    return date.fromisoformat(date_from) - timedelta(days=window + ANALYTICS_LOOKBACK_DAYS)
+
+
+def build_analytics(names: List[str], history, lower: date, date_from: str, date_to: str, window: int,
+                    threshold: float, series: bool = False) -> Dict[str, Any]:
+    """Потери по предметам: дельты к предыдущей записи, скользящие потери и их доля от запаса,
+    аномальные дни по z-оценке и сравнение заведений между собой"""
+    np = np_module()
+    report_from = date.fromisoformat(date_from)
+    days = (date.fromisoformat(date_to) - lower).days + 1
+    offset = (report_from - lower).days
+    
+    with timed('map'):
+        result = analyze_history(history, len(names), days, offset, window, threshold)
+        day_dates = [(report_from + timedelta(days=n)).isoformat() for n in range(days - offset)]
+        
+        # Аномалии собираются одним проходом по ненулевым ячейкам, а не поиском в каждом ряду
+        flagged: Dict[Tuple[int, int], List[Dict[str, Any]]] = {}
+        cells = np.nonzero(result['anomalies'])
+        for v, d, i, count, delta, z in zip(*(axis.tolist() for axis in cells),
+                                            result['counts'][cells].tolist(), result['delta'][cells].tolist(),
+                                            result['z'][cells].tolist()):
+            flagged.setdefault((v, i), []).append({
+                'date': day_dates[d], 'count': _number(count, 0), 'delta': _number(delta, 0), 'z': _number(z, 2),
+            })
+        observations = result['observations'].tolist()
+        loss_total = result['loss_total'].tolist()
+        mean_loss = result['mean_loss'].tolist()
+        mean_stock = result['mean_stock'].tolist()
+        rate = result['rate'].tolist()
+        rolling_loss = result['rolling_loss'][:, -1].tolist()
+        rolling_rate = result['rolling_rate'][:, -1].tolist()
+        
+        report: Dict[str, Any] = {}
+        for v, name in enumerate(names):
+            venue_items: Dict[str, Any] = {}
+            for i, item in enumerate(ANALYTICS_ITEMS):
+                venue_items[item] = {
+                    'days_observed': observations[v][i],
+                    'loss_total': _number(loss_total[v][i], 0),
+                    'mean_daily_loss': _number(mean_loss[v][i], 3),
+                    'mean_stock': _number(mean_stock[v][i], 1),
+                    'loss_rate': _number(rate[v][i], 4),
+                    f'loss_{window}d': _number(rolling_loss[v][i], 0),
+                    f'loss_rate_{window}d': _number(rolling_rate[v][i], 4),
+                    'anomalies': flagged.get((v, i), []),
+                }
+            report[name] = {'items': venue_items}
+            if series:
+                recorded = np.nonzero((~np.isnan(result['counts'][v])).any(axis=1))[0]
+                report[name]['series'] = {
+                    'dates': [day_dates[d] for d in recorded.tolist()],
+                    'items': {item: {
+                        key: [None if x != x else round(x, 4) for x in result[key][v, recorded, i].tolist()]
+                        for key in ('counts', 'delta', 'rolling_loss', 'rolling_rate')
+                    } for i, item in enumerate(ANALYTICS_ITEMS)},
+                }
+        
+        peer_mean = result['peer_mean'].tolist()
+        peer_z = result['peer_z'].tolist()
+        rank = result['rank'].tolist()
+        comparison = {
+            item: {
+                'mean_loss_rate': _number(peer_mean[i], 4),
+                'venues': {name: {'loss_rate': _number(rate[v][i], 4),
+                                  'z': _number(peer_z[v][i], 2),
+                                  'rank': rank[v][i] or None}
+                           for v, name in enumerate(names)},
+            }
+            for i, item in enumerate(ANALYTICS_ITEMS)
+        }
+    return {'from': date_from, 'to': date_to, 'window': window, 'threshold': threshold,
+            'venues': report, 'comparison': comparison}
+
+
+def venue_analytics(conn, venues: Optional[List[str]], date_from: str, date_to: str, window: int,
+                    threshold: float, series: bool = False) -> Dict[str, Any]:
+    lower = analytics_lower_bound(date_from, window)
+    names, history = load_history(conn, venues, lower, date.fromisoformat(date_to))
+    return build_analytics(names, history, lower, date_from, date_to, window, threshold, series)
+
+
+def parse_analytics_params(params: Dict[str, Any]) -> Tuple[str, str, int, float, bool]:
+    date_to = parse_date_param(params.get('to'), 'to') or date.today().isoformat()
+    date_from = parse_date_param(params.get('from'), 'from') or \
+        (date.fromisoformat(date_to) - timedelta(days=ANALYTICS_DEFAULT_DAYS - 1)).isoformat()
+    span = (date.fromisoformat(date_to) - date.fromisoformat(date_from)).days
+    if span < 0:
+        raise ValueError('from must not be after to')
+    if span >= ANALYTICS_MAX_DAYS:
+        raise ValueError(f'Analytics period is limited to {ANALYTICS_MAX_DAYS} days')
+    window = params.get('window') or '7'
+    if not window.isdigit() or not 2 <= int(window) <= 90:
+        raise ValueError('Invalid window: expected 2..90 days')
+    try:
+        threshold = float(params.get('z') or '3')
+    except ValueError:
+        raise ValueError('Invalid z: expected a number')
+    if not 0.5 <= threshold <= 10:
+        raise ValueError('Invalid z: expected 0.5..10')
+    return date_from, date_to, int(window), threshold, params.get('series') in ('1', 'true')
+
+def parse_venues_param(params: Dict[str, Any], multi_params: Dict[str, Any]) -> Optional[List[str]]:
+    """venue=PORT, venue=PORT,Диккенс, повторяющийся venue=... или venue=* (None — все заведения)"""
+    raw = multi_params.get('venue') or [params.get('venue', 'PORT')]
+    names: List[str] = []
+    for value in raw:
+        for name in str(value).split(','):
+            name = name.strip()
+            if name == '*':
+                return None
+            if name and name not in names:
+                names.append(name)
+    if not names:
+        raise ValueError('venue is required')
+    return names
+
+def _entry_date(value: Any, field: str, prefix: str, required: bool) -> Optional[str]:
+    if value in (None, ''):
+        if required:
+            raise ValueError(f'{prefix}{field} is required')
+        return None
+    try:
+        return date.fromisoformat(str(value)).isoformat()
+    except ValueError:
+        raise ValueError(f'{prefix}invalid {field}: expected YYYY-MM-DD')
+
+def parse_entry_payload(data: Any, index: Optional[int] = None) -> Tuple[Any, ...]:
+    """Проверенные значения записи в порядке ENTRY_WRITE_COLUMNS"""
+    prefix = f'Entry #{index}: ' if index is not None else ''
+    if not isinstance(data, dict):
+        raise ValueError(f'{prefix}expected an object')
+    
+    venue = data.get('venue')
+    if not isinstance(venue, str) or not venue.strip() or len(venue) > 50:
+        raise ValueError(f'{prefix}invalid venue')
+    
+    values: List[Any] = [venue, _entry_date(data.get('date'), 'date', prefix, required=True)]
+    for column, field in COUNTER_FIELDS:
+        value = data.get(field, data.get(column))
+        if value is None and column in OPTIONAL_COUNTERS:
+            value = 0
+        if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= MAX_COUNTER_VALUE:
+            raise ValueError(f'{prefix}{field} must be an integer between 0 and {MAX_COUNTER_VALUE}')
+        values.append(value)
+    
+    responsible_name = data.get('responsible_name')
+    if responsible_name is not None and (not isinstance(responsible_name, str) or len(responsible_name) > 255):
+        raise ValueError(f'{prefix}invalid responsible_name')
+    values.append(responsible_name)
+    values.append(_entry_date(data.get('responsible_date'), 'responsible_date', prefix, required=False))
+    return tuple(values)
+
+def parse_entry_id(value: Any) -> int:
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 < value <= MAX_SERIAL_ID:
+        raise ValueError('Invalid ID')
+    return value
+
+def parse_batch_payload(body_data: Any) -> List[Tuple[Any, ...]]:
+    items = body_data if isinstance(body_data, list) else body_data.get('entries')
+    if not isinstance(items, list) or not items:
+        raise ValueError('entries must be a non-empty array')
+    if len(items) > MAX_BATCH_SIZE:
+        raise ValueError(f'Batch is limited to {MAX_BATCH_SIZE} entries')
+    rows = [parse_entry_payload(item, index) for index, item in enumerate(items, start=1)]
+    # ON CONFLICT DO UPDATE не может задеть одну строку дважды за оператор
+    seen: Dict[Tuple[str, str], int] = {}
+    for index, row in enumerate(rows, start=1):
+        if seen.setdefault((row[0], row[1]), index) != index:
+            raise ValueError(f'Entry #{index}: duplicates entry #{seen[(row[0], row[1])]} (same venue and date)')
+    return rows
+
+def create_entry(conn, values: Tuple[Any, ...]) -> RawJSON:
+    cur = conn.cursor()
+    execute_prepared(cur, 'inv_insert', INSERT_ENTRY_SQL, values)
+    row = cur.fetchone()
+    cur.close()
+    return _row_to_entry(row)
+
+def create_entries(conn, rows: List[Tuple[Any, ...]]) -> RawJSON:
+    """Весь пакет одним INSERT ... SELECT FROM unnest: в autocommit он атомарен сам по себе"""
+    cur = conn.cursor()
+    columns = tuple(list(column) for column in zip(*rows))
+    execute_prepared(cur, 'inv_insert_batch', INSERT_ENTRIES_SQL, columns)
+    result = cur.fetchall()
+    cur.close()
+    return _rows_to_entries(result)
+
+def update_entry(conn, entry_id: int, values: Tuple[Any, ...]) -> Optional[RawJSON]:
+    cur = conn.cursor()
+    try:
+        execute_prepared(cur, 'inv_update', UPDATE_ENTRY_SQL, (entry_id, *values))
+        row = cur.fetchone()
+    except pg().errors.UniqueViolation:
+        raise EntryConflict(f'{values[0]} already has an entry for {values[1]}')
+    finally:
+        cur.close()
+    return _row_to_entry(row) if row else None
+
+def entry_venue(conn, entry_id: int) -> Optional[str]:
+    cur = conn.cursor()
+    execute_prepared(cur, 'inv_entry_venue', ENTRY_VENUE_SQL, (entry_id,))
+    row = cur.fetchone()
+    cur.close()
+    return row[0] if row else None
+
+def delete_entry(conn, entry_id: int) -> Optional[str]:
+    """Заведение удалённой записи (None — записи не было)"""
+    cur = conn.cursor()
+    execute_prepared(cur, 'inv_delete', DELETE_ENTRY_SQL, (entry_id,))
+    row = cur.fetchone()
+    cur.close()
+    return row[0] if row else None
+
+def encode_sync_cursor(floor: int, horizon: Optional[int] = None,
+                       position: Optional[Tuple[int, int]] = None) -> str:
+    if position is None:
+        return str(floor)
+    return f'{floor}.{horizon}.{position[0]}.{position[1]}'
+
+def decode_sync_cursor(value: Optional[str]) -> Tuple[int, Optional[int], Optional[Tuple[int, int]]]:
+    """Курсор синхронизации: xid-горизонт прошлой синхронизации, а посреди постраничной
+    выдачи ещё горизонт текущей и позиция (xid, entry_id) последней отданной строки"""
+    if not value:
+        return 0, None, None
+    parts = value.split('.')
+    if len(parts) not in (1, 4) or not all(part.isdigit() and len(part) <= 20 for part in parts):
+        raise ValueError('Invalid since cursor')
+    numbers = [int(part) for part in parts]
+    if len(numbers) == 1:
+        return numbers[0], None, None
+    return numbers[0], numbers[1], (numbers[2], numbers[3])
+
+def list_changes(conn, venues: Optional[List[str]], since: Optional[str],
+                 limit: Optional[int]) -> Dict[str, Any]:
+    """Записи, изменённые после курсора since, и надгробия удалённых.
+    Строки транзакций, которые могли быть не завершены при прошлой синхронизации,
+    приходят повторно — клиент применяет изменения идемпотентно. Строка журнала без записи
+    и без надгробия — запись, перенесённая в архив: она не изменилась и не удалена"""
+    floor, horizon, position = decode_sync_cursor(since)
+    limit = limit or MAX_PAGE_LIMIT
+    cur = conn.cursor()
+    if horizon is None:
+        execute_prepared(cur, 'inv_sync_horizon', SYNC_HORIZON_SQL, ())
+        horizon = int(cur.fetchone()[0])
+    
+    bind = _Binder()
+    conditions = [f"c.xid >= {bind(str(floor), 'xid8')}"]
+    if position is not None:
+        conditions.append(f"(c.xid, c.entry_id) > ({bind(str(position[0]), 'xid8')}, {bind(position[1], 'integer')})")
+        bind.shape += 'after_'
+    if venues is not None:
+        conditions.append(f"c.venue = ANY({bind(venues, 'varchar[]')})")
+        bind.shape += 'venues_'
+    query = f'''{bind.declaration()}
+        SELECT c.xid::text, c.entry_id, c.venue, c.deleted,
+               e.id, c.venue, e.entry_date::text,
+               e.forks, e.knives, e.steak_knives, e.spoons, e.dessert_spoons,
+               e.ice_cooler, e.plates, e.sugar_tongs, e.ice_tongs, e.ashtrays,
+               e.responsible_name, e.responsible_date::text,
+               e.created_at::text
+        FROM t_p23128842_inventory_cutlery_tr.inventory_changes c
+        LEFT JOIN t_p23128842_inventory_cutlery_tr.inventory_entries e
+               ON e.id = c.entry_id AND NOT c.deleted
+        WHERE {' AND '.join(conditions)} AND (c.deleted OR e.id IS NOT NULL)
+        ORDER BY c.xid, c.entry_id
+        LIMIT {bind(limit + 1, 'integer')}
+    '''
+    execute_prepared(cur, f'inv_sync_{bind.shape}'.rstrip('_'), query, tuple(bind.args))
+    rows = cur.fetchall()
+    cur.close()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    entries, deleted = [], []
+    for row in rows:
+        if row[3]:
+            deleted.append({'id': row[1], 'venue': row[2]})
+        else:
+            entries.append(row[4:])
+    if has_more:
+        cursor = encode_sync_cursor(floor, horizon, (int(rows[-1][0]), rows[-1][1]))
+    else:
+        cursor = encode_sync_cursor(horizon)
+    return {'entries': _rows_to_entries(entries), 'deleted': deleted, 'cursor': cursor, 'has_more': has_more}
+
+def parse_sync_push(body_data: Any) -> Tuple[Optional[int], List[Dict[str, Any]]]:
+    """Очередь офлайн-изменений: {"base": курсор последней синхронизации, "mutations": [...]}"""
+    if not isinstance(body_data, dict):
+        raise ValueError('expected an object with mutations')
+    base = body_data.get('base')
+    if base is not None:
+        floor, horizon, _ = decode_sync_cursor(str(base))
+        if horizon is not None:
+            raise ValueError('base must be a completed sync cursor')
+        base = floor
+    items = body_data.get('mutations')
+    if not isinstance(items, list) or not items:
+        raise ValueError('mutations must be a non-empty array')
+    if len(items) > MAX_BATCH_SIZE:
+        raise ValueError(f'Batch is limited to {MAX_BATCH_SIZE} mutations')
+    
+    mutations = []
+    for index, item in enumerate(items, start=1):
+        if not isinstance(item, dict) or item.get('op') not in SYNC_OPS:
+            raise ValueError(f"Mutation #{index}: op must be one of {', '.join(SYNC_OPS)}")
+        op = item['op']
+        mutations.append({
+            'op': op,
+            'ref': item.get('ref'),
+            'id': parse_entry_id(item.get('id')) if op != 'create' else None,
+            'values': parse_entry_payload(item.get('entry'), index) if op != 'delete' else None,
+            'force': item.get('force') is True,
+        })
+    return base, mutations
+
+def _apply_mutation(cur, base: Optional[int], mutation: Dict[str, Any]) -> Dict[str, Any]:
+    op, entry_id = mutation['op'], mutation['id']
+    result: Dict[str, Any] = {'ref': mutation['ref'], 'op': op, 'id': entry_id}
+    if op == 'create':
+        execute_prepared(cur, 'inv_insert', INSERT_ENTRY_SQL, mutation['values'])
+        row = cur.fetchone()
+        result.update({'id': row[0], 'status': 'applied', 'entry': _row_to_entry(row)})
+        return result
+    
+    # Без base изменение считается конфликтным: клиент не знает, какую версию правил
+    execute_prepared(cur, 'inv_sync_state', SYNC_ENTRY_STATE_SQL,
+                     (entry_id, str(base) if base is not None else None))
+    state = cur.fetchone()
+    if state is None or state[0]:
+        if op == 'delete':
+            result['status'] = 'applied'
+        else:
+            result.update({'status': 'conflict', 'reason': 'deleted' if state else 'missing', 'entry': None})
+        return result
+    if state[1] is not False and not mutation['force']:
+        execute_prepared(cur, 'inv_select', SELECT_ENTRY_SQL, (entry_id,))
+        result.update({'status': 'conflict', 'reason': 'changed', 'entry': _row_to_entry(cur.fetchone())})
+        return result
+    
+    if op == 'update':
+        # Перенос на занятую дату — конфликт этой правки, а не всей очереди
+        cur.execute('SAVEPOINT sync_update')
+        try:
+            execute_prepared(cur, 'inv_update', UPDATE_ENTRY_SQL, (entry_id, *mutation['values']))
+        except pg().errors.UniqueViolation:
+            cur.execute('ROLLBACK TO SAVEPOINT sync_update')
+            execute_prepared(cur, 'inv_select', SELECT_ENTRY_SQL, (entry_id,))
+            result.update({'status': 'conflict', 'reason': 'duplicate', 'entry': _row_to_entry(cur.fetchone())})
+            return result
+        result.update({'status': 'applied', 'entry': _row_to_entry(cur.fetchone())})
+    else:
+        execute_prepared(cur, 'inv_delete', DELETE_ENTRY_SQL, (entry_id,))
+        result['status'] = 'applied'
+    return result
+
+def push_mutations(conn, base: Optional[int], mutations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Вся очередь — одна транзакция REPEATABLE READ: проверка версии и запись не разъезжаются.
+    Если запись изменили параллельно, транзакция повторяется и видит конфликт"""
+    psycopg2 = pg()
+    cur = conn.cursor()
+    try:
+        for attempt in range(1, SYNC_ATTEMPTS + 1):
+            cur.execute('BEGIN ISOLATION LEVEL REPEATABLE READ')
+            try:
+                results = [_apply_mutation(cur, base, mutation) for mutation in mutations]
+                cur.execute('COMMIT')
+                return results
+            except (psycopg2.errors.SerializationFailure, psycopg2.errors.DeadlockDetected,
+                    psycopg2.errors.InvalidSqlStatementName):
+                # Потерянный подготовленный запрос execute_prepared заново готовит уже в новой попытке
+                cur.execute('ROLLBACK')
+                if attempt == SYNC_ATTEMPTS:
+                    raise
+            except Exception:
+                if not conn.closed:
+                    cur.execute('ROLLBACK')
+                raise
+    finally:
+        cur.close()
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    global _cold_start
+    method: str = event.get('httpMethod', 'GET')
+    action = (event.get('queryStringParameters') or {}).get('action')
+    timer = RequestTimer('inventory', getattr(context, 'request_id', None), _cold_start, phases=TIMER_PHASES)
+    _cold_start = False
+    _current.timer = timer
+    error = None
+    response: Dict[str, Any] = {'statusCode': 500}
+    try:
+        response = route(event)
+        return response
+    except Exception as e:
+        import traceback
+        error = f'{type(e).__name__}: {e}'
+        log_event({'type': 'error', 'request_id': timer.request_id, 'traceback': traceback.format_exc()})
+        response = json_response(500, {'error': 'Internal server error', 'request_id': timer.request_id})
+        return response
+    finally:
+        _current.timer = None
+        server_timing = timer.server_timing()
+        if server_timing and response.get('headers') is not None:
+            response['headers']['Server-Timing'] = server_timing
+            response['headers']['Timing-Allow-Origin'] = '*'
+        timer.finish(method, response['statusCode'], error, action=action)
+
+def route(event: Dict[str, Any]) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
@@ -30,263 +1980,190 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Headers': 'Content-Type, If-None-Match',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
             'isBase64Encoded': False
         }
     
+    params = event.get('queryStringParameters') or {}
+    limiter = get_rate_limiter()
+    # Метрики не ограничиваются: по ним и смотрят, сколько запросов отклонено
+    if limiter is not None and params.get('action') != 'metrics':
+        with timed('admit'):
+            wait = limiter.admit(rate_limit_keys(event))
+        if wait:
+            retry_after = max(1, math.ceil(wait))
+            return json_response(429, {'error': 'Too many requests', 'retry_after': retry_after},
+                                 {'Retry-After': str(retry_after), 'Access-Control-Expose-Headers': 'Retry-After'})
+    
     try:
+        pool = get_pool()
+        
         if method == 'GET':
-            params = event.get('queryStringParameters') or {}
-            venue = params.get('venue', 'PORT')
+            if params.get('action') == 'metrics':
+                metrics = {'pool': pool.stats()}
+                if limiter is not None:
+                    metrics['admission'] = limiter.stats()
+                async_db = get_async_db()
+                if async_db is not None:
+                    metrics['async'] = async_db.stats()
+                cache = get_cache()
+                if cache is not None:
+                    metrics['cache'] = cache.stats()
+                return json_response(200, metrics)
             
-            conn = get_db_connection()
-            cur = conn.cursor()
+            if params.get('action') == 'sync':
+                multi_params = event.get('multiValueQueryStringParameters') or {}
+                venues = parse_venues_param(params, multi_params) if params.get('venue') or multi_params.get('venue') else None
+                since = params.get('since')
+                limit = parse_limit_param(params.get('limit'))
+                encoding = choose_encoding(parse_choice_param(params.get('compress'), 'compress', COMPRESS_ENCODINGS),
+                                           get_header(event, 'Accept-Encoding'))
+                changes = pool.run(lambda conn: list_changes(conn, venues, since, limit), retry=True)
+                return compress_response(json_response(200, changes), encoding)
             
-            query = f'''
-                SELECT id, venue, entry_date::text as date, 
-                       forks, knives, steak_knives, spoons, dessert_spoons,
-                       ice_cooler, plates, sugar_tongs, ice_tongs, ashtrays,
-                       responsible_name, responsible_date::text,
-                       created_at::text
-                FROM t_p23128842_inventory_cutlery_tr.inventory_entries
-                WHERE venue = {escape_sql_string(venue)}
-                ORDER BY entry_date DESC
-            '''
+            if params.get('action') == 'analytics':
+                venues = parse_venues_param(params, event.get('multiValueQueryStringParameters') or {})
+                date_from, date_to, window, threshold, series = parse_analytics_params(params)
+                encoding = choose_encoding(parse_choice_param(params.get('compress'), 'compress', COMPRESS_ENCODINGS),
+                                           get_header(event, 'Accept-Encoding'))
+                analytics = pool.run(lambda conn: venue_analytics(conn, venues, date_from, date_to, window,
+                                                                  threshold, series), retry=True)
+                return compress_response(json_response(200, analytics), encoding)
             
-            cur.execute(query)
-            rows = cur.fetchall()
+            if params.get('action') == 'rollups':
+                venues = parse_venues_param(params, event.get('multiValueQueryStringParameters') or {})
+                date_from = parse_date_param(params.get('from'), 'from')
+                date_to = parse_date_param(params.get('to'), 'to')
+                rollups = pool.run(lambda conn: list_monthly_rollups(conn, venues, date_from, date_to), retry=True)
+                return json_response(200, {'venues': rollups})
             
-            entries = []
-            for row in rows:
-                entries.append({
-                    'id': row[0],
-                    'venue': row[1],
-                    'date': row[2],
-                    'forks': row[3],
-                    'knives': row[4],
-                    'steak_knives': row[5],
-                    'spoons': row[6],
-                    'dessert_spoons': row[7],
-                    'ice_cooler': row[8],
-                    'plates': row[9],
-                    'sugar_tongs': row[10],
-                    'ice_tongs': row[11],
-                    'ashtrays': row[12],
-                    'responsible_name': row[13],
-                    'responsible_date': row[14],
-                    'created_at': row[15]
-                })
+            if params.get('action') == 'aggregates':
+                venues = parse_venues_param(params, event.get('multiValueQueryStringParameters') or {})
+                date_from = parse_date_param(params.get('from'), 'from')
+                date_to = parse_date_param(params.get('to'), 'to')
+                stats = pool.run(lambda conn: list_daily_stats(conn, venues, date_from, date_to), retry=True)
+                return json_response(200, {'venues': stats})
             
-            cur.close()
-            conn.close()
+            venues = parse_venues_param(params, event.get('multiValueQueryStringParameters') or {})
+            date_from = parse_date_param(params.get('from'), 'from')
+            date_to = parse_date_param(params.get('to'), 'to')
+            cursor = decode_cursor(params.get('cursor'))
+            limit = parse_limit_param(params.get('limit'))
+            columnar = parse_choice_param(params.get('format'), 'format', RESPONSE_FORMATS, 'objects') == 'columnar'
+            encoding = choose_encoding(parse_choice_param(params.get('compress'), 'compress', COMPRESS_ENCODINGS),
+                                       get_header(event, 'Accept-Encoding'))
             
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'entries': entries}),
-                'isBase64Encoded': False
-            }
+            if (venues is None or len(venues) > 1) and cursor:
+                raise ValueError('cursor is supported only for a single venue')
+            
+            if_none_match = get_header(event, 'If-None-Match')
+            fingerprint = (venues, date_from, date_to, cursor, limit, columnar)
+            
+            def read(conn, if_none_match: Optional[str]) -> Tuple[str, Optional[Dict[str, Any]]]:
+                etag = venue_etag(conn, venues, fingerprint)
+                if etag_matches(if_none_match, etag):
+                    return etag, None
+                if venues is None or len(venues) > 1:
+                    return etag, {'venues': list_venues_entries(conn, venues, date_from, date_to, limit, columnar)}
+                entries, next_cursor = list_entries(conn, venues[0], date_from, date_to, cursor, limit, columnar)
+                return etag, {'entries': entries, 'next_cursor': next_cursor}
+            
+            cache = get_cache()
+            cache_headers = {}
+            if cache is None:
+                etag, payload = pool.run(lambda conn: read(conn, if_none_match), retry=True)
+            else:
+                def load() -> str:
+                    # В кеш — полный ответ вместе с ETag: 304 для совпавшего If-None-Match
+                    # отдаётся из кеша, без обращения к БД
+                    etag, payload = pool.run(lambda conn: read(conn, None), retry=True)
+                    with timed('serialize'):
+                        return f'{etag}\n{encode_payload(payload)}'
+                
+                cached, cache_headers['X-Cache'] = cache.get_or_load(
+                    [ALL_VENUES_SCOPE] if venues is None else venues, fingerprint, load)
+                etag, body = cached.split('\n', 1)
+                payload = None if etag_matches(if_none_match, etag) else RawJSON(body)
+            cache_headers.update({
+                'ETag': etag,
+                'Cache-Control': 'no-cache',
+                'Access-Control-Expose-Headers': 'ETag, X-Cache',
+                'Vary': 'Accept-Encoding'
+            })
+            if payload is None:
+                return {
+                    'statusCode': 304,
+                    'headers': {'Access-Control-Allow-Origin': '*', **cache_headers},
+                    'body': '',
+                    'isBase64Encoded': False
+                }
+            return compress_response(json_response(200, payload, cache_headers), encoding)
         
         elif method == 'POST':
             body_data = json.loads(event.get('body', '{}'))
             
-            conn = get_db_connection()
-            cur = conn.cursor()
-            
-            query = f'''
-                INSERT INTO t_p23128842_inventory_cutlery_tr.inventory_entries
-                (venue, entry_date, forks, knives, steak_knives, spoons, 
-                 dessert_spoons, ice_cooler, plates, sugar_tongs, ice_tongs, ashtrays,
-                 responsible_name, responsible_date)
-                VALUES (
-                    {escape_sql_string(body_data['venue'])},
-                    {escape_sql_string(body_data['date'])},
-                    {body_data['forks']},
-                    {body_data['knives']},
-                    {body_data['steakKnives']},
-                    {body_data['spoons']},
-                    {body_data['dessertSpoons']},
-                    {body_data['iceCooler']},
-                    {body_data['plates']},
-                    {body_data['sugarTongs']},
-                    {body_data['iceTongs']},
-                    {body_data.get('ashtrays', 0)},
-                    {escape_sql_string(body_data.get('responsible_name'))},
-                    {escape_sql_string(body_data.get('responsible_date'))}
-                )
-                RETURNING id, venue, entry_date::text as date, 
-                          forks, knives, steak_knives, spoons, dessert_spoons,
-                          ice_cooler, plates, sugar_tongs, ice_tongs, ashtrays,
-                          responsible_name, responsible_date::text
-            '''
+            if (event.get('queryStringParameters') or {}).get('action') == 'sync':
+                base, mutations = parse_sync_push(body_data)
+                results = pool.run(lambda conn: push_mutations(conn, base, mutations))
+                invalidate_cache(None)
+                return json_response(200, {'results': results})
             
-            cur.execute(query)
-            row = cur.fetchone()
-            new_entry = {
-                'id': row[0],
-                'venue': row[1],
-                'date': row[2],
-                'forks': row[3],
-                'knives': row[4],
-                'steak_knives': row[5],
-                'spoons': row[6],
-                'dessert_spoons': row[7],
-                'ice_cooler': row[8],
-                'plates': row[9],
-                'sugar_tongs': row[10],
-                'ice_tongs': row[11],
-                'ashtrays': row[12],
-                'responsible_name': row[13],
-                'responsible_date': row[14]
-            }
-            cur.close()
-            conn.close()
+            if not isinstance(body_data, (dict, list)):
+                return json_response(400, {'error': 'expected an entry object or an array of entries'})
+            if isinstance(body_data, list) or 'entries' in body_data:
+                rows = parse_batch_payload(body_data)
+                created = pool.run(lambda conn: create_entries(conn, rows))
+                invalidate_cache([row[0] for row in rows])
+                return json_response(201, {'entries': created})
             
-            return {
-                'statusCode': 201,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'entry': new_entry}),
-                'isBase64Encoded': False
-            }
+            values = parse_entry_payload(body_data)
+            new_entry = pool.run(lambda conn: create_entry(conn, values))
+            invalidate_cache([values[0]])
+            return json_response(201, {'entry': new_entry})
         
         elif method == 'PUT':
             body_data = json.loads(event.get('body', '{}'))
+            if not isinstance(body_data, dict):
+                return json_response(400, {'error': 'expected an entry object'})
             entry_id = body_data.get('id')
             
             if not entry_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({'error': 'ID is required'}),
-                    'isBase64Encoded': False
-                }
+                return json_response(400, {'error': 'ID is required'})
             
-            conn = get_db_connection()
-            cur = conn.cursor()
+            entry_id = parse_entry_id(entry_id)
+            values = parse_entry_payload(body_data)
             
-            query = f'''
-                UPDATE t_p23128842_inventory_cutlery_tr.inventory_entries
-                SET venue = {escape_sql_string(body_data['venue'])},
-                    entry_date = {escape_sql_string(body_data['date'])},
-                    forks = {body_data['forks']},
-                    knives = {body_data['knives']},
-                    steak_knives = {body_data['steakKnives']},
-                    spoons = {body_data['spoons']},
-                    dessert_spoons = {body_data['dessertSpoons']},
-                    ice_cooler = {body_data['iceCooler']},
-                    plates = {body_data['plates']},
-                    sugar_tongs = {body_data['sugarTongs']},
-                    ice_tongs = {body_data['iceTongs']},
-                    ashtrays = {body_data.get('ashtrays', 0)},
-                    responsible_name = {escape_sql_string(body_data.get('responsible_name'))},
-                    responsible_date = {escape_sql_string(body_data.get('responsible_date'))}
-                WHERE id = {entry_id}
-                RETURNING id, venue, entry_date::text as date, 
-                          forks, knives, steak_knives, spoons, dessert_spoons,
-                          ice_cooler, plates, sugar_tongs, ice_tongs, ashtrays,
-                          responsible_name, responsible_date::text
-            '''
+            def update(conn) -> Tuple[Optional[str], Optional[RawJSON]]:
+                # Запись могла перейти в другое заведение — его списки тоже устаревают
+                return entry_venue(conn, entry_id), update_entry(conn, entry_id, values)
             
-            cur.execute(query)
-            row = cur.fetchone()
-            updated_entry = None
-            if row:
-                updated_entry = {
-                    'id': row[0],
-                    'venue': row[1],
-                    'date': row[2],
-                    'forks': row[3],
-                    'knives': row[4],
-                    'steak_knives': row[5],
-                    'spoons': row[6],
-                    'dessert_spoons': row[7],
-                    'ice_cooler': row[8],
-                    'plates': row[9],
-                    'sugar_tongs': row[10],
-                    'ice_tongs': row[11],
-                    'ashtrays': row[12],
-                    'responsible_name': row[13],
-                    'responsible_date': row[14]
-                }
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'entry': updated_entry}),
-                'isBase64Encoded': False
-            }
+            previous_venue, updated_entry = pool.run(update)
+            invalidate_cache([venue for venue in (previous_venue, values[0]) if venue])
+            return json_response(200, {'entry': updated_entry})
         
         elif method == 'DELETE':
             params = event.get('queryStringParameters') or {}
             entry_id = params.get('id')
             
             if not entry_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({'error': 'ID is required'}),
-                    'isBase64Encoded': False
-                }
-            
-            conn = get_db_connection()
-            cur = conn.cursor()
-            
-            query = f'''
-                DELETE FROM t_p23128842_inventory_cutlery_tr.inventory_entries
-                WHERE id = {entry_id}
-            '''
-            
-            cur.execute(query)
-            cur.close()
-            conn.close()
+                return json_response(400, {'error': 'ID is required'})
             
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'success': True}),
-                'isBase64Encoded': False
-            }
+            entry_id = parse_entry_id(entry_id)
+            deleted_venue = pool.run(lambda conn: delete_entry(conn, entry_id))
+            if deleted_venue:
+                invalidate_cache([deleted_venue])
+            return json_response(200, {'success': True})
         
-        return {
-            'statusCode': 405,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Method not allowed'}),
-            'isBase64Encoded': False
-        }
+        return json_response(405, {'error': 'Method not allowed'})
     
-    except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
\ No newline at end of file
+    except ValueError as e:
+        return json_response(400, {'error': str(e)})
+    
+    except EntryConflict as e:
+        return json_response(409, {'error': str(e)})
+    
+    except PoolTimeout as e:
+        return json_response(503, {'error': str(e)}, {'Retry-After': '1', 'Access-Control-Expose-Headers': 'Retry-After'})
@@ -0,0 +1,427 @@
+'''
+Business: Отчёт по заведениям за произвольный период: строки — даты, колонки — десять предметов
+          и ответственный; CSV или XLSX собирается построчно из серверного курсора
+Args: event - dict с httpMethod, queryStringParameters (from, to, venue=PORT,Диккенс|*,
+      format=csv|xlsx, compress=gzip для CSV)
+      context - объект с атрибутами request_id, function_name
+Returns: HTTP response с файлом отчёта (XLSX — в base64)
+'''
+
+import base64
+import csv
+import gzip
+import heapq
+import json
+import os
+import re
+import traceback
+import zipfile
+from datetime import date
+from io import BytesIO, StringIO
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import escape, quoteattr
+import psycopg2
+
+from inventory_common import ArchiveStorage, RequestTimer, log_event, read_segment, request_state as _current, timed
+
+REPORT_ITERSIZE = int(os.environ.get('REPORT_ITERSIZE', '2000'))
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', '5000'))
+REPORT_FORMATS = ('csv', 'xlsx')
+# Холодный архив старых месяцев (backend/archive): отчёт за архивный период читает и его
+ARCHIVE_URL = os.environ.get('ARCHIVE_URL')
+
+COUNTER_TITLES = (
+    'Вилки', 'Ножи', 'Стейковые ножи', 'Ложки', 'Десертные ложки',
+    'Кулер для льда', 'Тарелки', 'Щипцы для сахара', 'Щипцы для льда', 'Пепельницы'
+)
+# Строка отчёта: заведение, дата, 10 счётчиков, ответственный, дата заполнения (даты — текстом)
+REPORT_TITLES = ('Дата',) + COUNTER_TITLES + ('Ответственный', 'Дата заполнения')
+# Excel в русской локали делит CSV по точке с запятой, а без BOM читает его как cp1251
+CSV_DELIMITER = ';'
+CSV_BOM = '\ufeff'
+
+# Первый вызов в контейнере — холодный старт
+_cold_start = True
+
+def get_db_connection():
+    return psycopg2.connect(os.environ['DATABASE_URL'])
+
+def archive_catalog(conn, venues: Optional[List[str]], date_from: str, date_to: str) -> List[Tuple[str, str]]:
+    """Сегменты, пересекающие период и нужные заведения, в снимке отчёта: перенос месяца
+    коммитится вместе с удалением его строк, так что записи не теряются и не двоятся"""
+    cur = conn.cursor()
+    conditions = ['last_date >= %s', 'first_date <= %s']
+    params: List[Any] = [date_from, date_to]
+    if venues is not None:
+        conditions.append('venue_ids && ARRAY(SELECT id FROM t_p23128842_inventory_cutlery_tr.venues '
+                          'WHERE name = ANY(%s))')
+        params.append(venues)
+    cur.execute(f'''
+        SELECT storage_key, sha256
+        FROM t_p23128842_inventory_cutlery_tr.archive_segments
+        WHERE {' AND '.join(conditions)}
+        ORDER BY month
+    ''', params)
+    segments = cur.fetchall()
+    cur.close()
+    if segments and not ARCHIVE_URL:
+        raise RuntimeError('Archived months exist, but ARCHIVE_URL is not configured')
+    return segments
+
+def iter_archived_rows(segments: List[Tuple[str, str]], venues: Optional[List[str]],
+                       date_from: str, date_to: str) -> Iterator[Tuple[Any, ...]]:
+    """Архивные строки в порядке (заведение, дата). Отчёт идёт по заведениям, а файл — это месяц
+    всех заведений, поэтому сегменты периода держатся в памяти сжатыми колонками до конца отчёта"""
+    storage = ArchiveStorage(ARCHIVE_URL)
+    loaded = []
+    for key, digest in segments:
+        with timed('archive'):
+            loaded.append(read_segment(storage, key, digest))
+    wanted = None if venues is None else set(venues)
+    names = sorted({name for segment in loaded for name in segment.venues if wanted is None or name in wanted})
+    for name in names:
+        for segment in loaded:
+            yield from segment.report_rows(name, date_from, date_to)
+
+def iter_hot_rows(conn, venues: Optional[List[str]], date_from: str, date_to: str) -> Iterator[Tuple[Any, ...]]:
+    """Строки Postgres через серверный курсор: в памяти не больше itersize строк. COLLATE "C"
+    даёт тот же порядок имён, что и сортировка строк в Python, — иначе слияние с архивом сломается"""
+    cur = conn.cursor(name='report_export')
+    cur.itersize = REPORT_ITERSIZE
+    conditions = ['e.entry_date BETWEEN %s AND %s']
+    params: List[Any] = [date_from, date_to]
+    if venues is not None:
+        conditions.append('v.name = ANY(%s)')
+        params.append(venues)
+    with timed('query'):
+        cur.execute(f'''
+            SELECT v.name, e.entry_date::text,
+                   e.forks, e.knives, e.steak_knives, e.spoons, e.dessert_spoons,
+                   e.ice_cooler, e.plates, e.sugar_tongs, e.ice_tongs, e.ashtrays,
+                   e.responsible_name, e.responsible_date::text
+            FROM t_p23128842_inventory_cutlery_tr.inventory_entries e
+            JOIN t_p23128842_inventory_cutlery_tr.venues v ON v.id = e.venue_id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY v.name COLLATE "C", e.entry_date
+        ''', params)
+    while True:
+        with timed('query'):
+            rows = cur.fetchmany(REPORT_ITERSIZE)
+        if not rows:
+            break
+        yield from rows
+    cur.close()
+
+def iter_report_rows(conn, venues: Optional[List[str]], date_from: str, date_to: str,
+                     stats: Optional[Dict[str, int]] = None) -> Iterator[Tuple[Any, ...]]:
+    """Строки отчёта в порядке (заведение, дата): Postgres и архив сливаются потоками. День,
+    записанный в Postgres уже после переноса месяца, важнее архивного"""
+    segments = archive_catalog(conn, venues, date_from, date_to)
+    rows: Iterator[Tuple[Any, ...]] = iter_hot_rows(conn, venues, date_from, date_to)
+    if segments:
+        # heapq.merge при равных ключах отдаёт сначала строку из первого потока — из Postgres
+        rows = heapq.merge(rows, iter_archived_rows(segments, venues, date_from, date_to),
+                           key=lambda row: (row[0], row[1]))
+    total = 0
+    previous = None
+    for row in rows:
+        if (row[0], row[1]) == previous:
+            continue
+        previous = (row[0], row[1])
+        total += 1
+        yield row
+    if stats is not None:
+        stats['rows'] = total
+        stats['segments'] = len(segments)
+
+def iter_csv_chunks(rows: Iterator[Tuple[Any, ...]]) -> Iterator[str]:
+    """CSV кусками по REPORT_ITERSIZE строк; первая колонка — заведение"""
+    buffer = StringIO()
+    writer = csv.writer(buffer, delimiter=CSV_DELIMITER, lineterminator='\r\n')
+    writer.writerow(('Заведение',) + REPORT_TITLES)
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending == REPORT_ITERSIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+def render_csv(rows: Iterator[Tuple[Any, ...]], compress: bool) -> Tuple[str, bool]:
+    """Собрать CSV; при сжатии в памяти держится только gzip-поток"""
+    chunks = iter_csv_chunks(rows)
+    if not compress:
+        return CSV_BOM + ''.join(chunks), False
+
+    buffer = BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=6) as gz:
+        gz.write(CSV_BOM.encode('utf-8'))
+        for chunk in chunks:
+            gz.write(chunk.encode('utf-8'))
+    return base64.b64encode(buffer.getvalue()).decode('ascii'), True
+
+# Минимальная книга SpreadsheetML: строки листов — inline-строки, без sharedStrings,
+# поэтому лист пишется в архив потоком и не требует второго прохода
+XLSX_CONTENT_TYPES = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>
+{sheets}
+</Types>'''
+XLSX_ROOT_RELS = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>'''
+XLSX_WORKBOOK = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets>{sheets}</sheets>
+</workbook>'''
+XLSX_WORKBOOK_RELS = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+{sheets}
+<Relationship Id="rIdStyles" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+</Relationships>'''
+# Стили: 0 — обычная ячейка, 1 — дата (встроенный формат 14), 2 — жирный заголовок
+XLSX_STYLES = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font><font><b/><sz val="11"/><name val="Calibri"/></font></fonts>
+<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>
+<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/><xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/><xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>
+<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>
+</styleSheet>'''
+XLSX_SHEET_HEAD = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                   '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                   '<sheetViews><sheetView workbookViewId="0">'
+                   '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+                   '</sheetView></sheetViews>'
+                   '<cols><col min="1" max="1" width="12" customWidth="1"/>'
+                   f'<col min="2" max="{len(COUNTER_TITLES) + 1}" width="11" customWidth="1"/>'
+                   f'<col min="{len(COUNTER_TITLES) + 2}" max="{len(COUNTER_TITLES) + 2}" width="24" customWidth="1"/>'
+                   f'<col min="{len(COUNTER_TITLES) + 3}" max="{len(COUNTER_TITLES) + 3}" width="16" customWidth="1"/></cols>'
+                   '<sheetData>')
+XLSX_SHEET_TAIL = '</sheetData></worksheet>'
+# Серийный номер даты в Excel — дни от 30.12.1899
+EXCEL_EPOCH = date(1899, 12, 30)
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_SHEET_NAME_ILLEGAL = re.compile(r'[\[\]:*?/\\]')
+
+def _text_cell(value: Optional[str], style: int = 0) -> str:
+    if not value:
+        return '<c/>'
+    attributes = f' s="{style}"' if style else ''
+    return f'<c t="inlineStr"{attributes}><is><t xml:space="preserve">{escape(_XML_ILLEGAL.sub("", value))}</t></is></c>'
+
+def _date_cell(value: Optional[str]) -> str:
+    if not value:
+        return '<c/>'
+    return f'<c s="1"><v>{(date.fromisoformat(value) - EXCEL_EPOCH).days}</v></c>'
+
+def xlsx_row(row: Tuple[Any, ...]) -> str:
+    """Строка листа заведения: дата, счётчики, ответственный, дата заполнения"""
+    counters = ''.join(f'<c><v>{value}</v></c>' for value in row[2:12])
+    return f'<row>{_date_cell(row[1])}{counters}{_text_cell(row[12])}{_date_cell(row[13])}</row>'
+
+def sheet_name(venue: str, used: set) -> str:
+    """Имя листа по правилам Excel: до 31 символа, без []:*?/\\ и уникальное без учёта регистра"""
+    base = _SHEET_NAME_ILLEGAL.sub('_', venue).strip("'")[:31] or 'Заведение'
+    name, number = base, 2
+    while name.lower() in used:
+        suffix = f' ({number})'
+        name, number = base[:31 - len(suffix)] + suffix, number + 1
+    used.add(name.lower())
+    return name
+
+def render_xlsx(rows: Iterator[Tuple[Any, ...]]) -> str:
+    """XLSX с листом на каждое заведение. Строки пишутся в сжимаемый поток zip по мере чтения
+    курсора; в памяти — только сжатый файл и буфер текущего куска строк"""
+    buffer = BytesIO()
+    sheets: List[str] = []
+    used: set = set()
+    header = '<row>' + ''.join(_text_cell(title, 2) for title in REPORT_TITLES) + '</row>'
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=6) as archive:
+        sheet = None
+        venue = None
+        pending: List[str] = []
+        for row in rows:
+            if row[0] != venue:
+                if sheet is not None:
+                    sheet.write((''.join(pending) + XLSX_SHEET_TAIL).encode('utf-8'))
+                    sheet.close()
+                    pending = []
+                venue = row[0]
+                sheets.append(sheet_name(venue, used))
+                sheet = archive.open(f'xl/worksheets/sheet{len(sheets)}.xml', 'w')
+                sheet.write((XLSX_SHEET_HEAD + header).encode('utf-8'))
+            pending.append(xlsx_row(row))
+            if len(pending) == REPORT_ITERSIZE:
+                sheet.write(''.join(pending).encode('utf-8'))
+                pending = []
+        if sheet is None:
+            # Книга без листов не открывается: пустой период — лист с одним заголовком
+            sheets.append('Отчёт')
+            sheet = archive.open('xl/worksheets/sheet1.xml', 'w')
+            sheet.write((XLSX_SHEET_HEAD + header).encode('utf-8'))
+        sheet.write((''.join(pending) + XLSX_SHEET_TAIL).encode('utf-8'))
+        sheet.close()
+
+        numbers = range(1, len(sheets) + 1)
+        archive.writestr('[Content_Types].xml', XLSX_CONTENT_TYPES.format(sheets='\n'.join(
+            f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for i in numbers)))
+        archive.writestr('_rels/.rels', XLSX_ROOT_RELS)
+        archive.writestr('xl/workbook.xml', XLSX_WORKBOOK.format(sheets=''.join(
+            f'<sheet name={quoteattr(name)} sheetId="{i}" r:id="rId{i}"/>'
+            for i, name in zip(numbers, sheets))))
+        archive.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS.format(sheets='\n'.join(
+            f'<Relationship Id="rId{i}" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+            f'Target="worksheets/sheet{i}.xml"/>' for i in numbers)))
+        archive.writestr('xl/styles.xml', XLSX_STYLES)
+    return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+def parse_venues(value: Optional[str]) -> Optional[List[str]]:
+    """venue=PORT,Диккенс; пусто или * — все заведения (None)"""
+    names: List[str] = []
+    for name in (value or '*').split(','):
+        name = name.strip()
+        if name == '*':
+            return None
+        if name and name not in names:
+            names.append(name)
+    return names or None
+
+def parse_period(params: Dict[str, Any]) -> Tuple[str, str]:
+    values = []
+    for name in ('from', 'to'):
+        value = params.get(name)
+        if not value:
+            raise ValueError(f'{name} is required')
+        try:
+            values.append(date.fromisoformat(value).isoformat())
+        except ValueError:
+            raise ValueError(f'Invalid {name}: expected YYYY-MM-DD')
+    if values[0] > values[1]:
+        raise ValueError('from must not be later than to')
+    return values[0], values[1]
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    global _cold_start
+    method: str = event.get('httpMethod', 'GET')
+    timer = RequestTimer('report', getattr(context, 'request_id', None), _cold_start, slow_ms=SLOW_REQUEST_MS)
+    _cold_start = False
+    _current.timer = timer
+    error = None
+    response: Dict[str, Any] = {'statusCode': 500}
+    try:
+        response = route(event)
+        return response
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+        log_event({'type': 'error', 'request_id': timer.request_id, 'traceback': traceback.format_exc()})
+        response = {
+            'statusCode': 500,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'Internal server error', 'request_id': timer.request_id}),
+            'isBase64Encoded': False
+        }
+        return response
+    finally:
+        _current.timer = None
+        timer.finish(method, response['statusCode'], error)
+
+def route(event: Dict[str, Any]) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+
+    params = event.get('queryStringParameters') or {}
+    fmt = params.get('format', 'csv')
+    compress = params.get('compress') == 'gzip'
+    try:
+        if fmt not in REPORT_FORMATS:
+            raise ValueError(f'Unsupported format: {fmt}')
+        date_from, date_to = parse_period(params)
+        venues = parse_venues(params.get('venue'))
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+
+    with timed('connect'):
+        conn = get_db_connection()
+    try:
+        # Каталог архива и строки Postgres — из одного снимка
+        conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+        stats: Dict[str, int] = {}
+        rows = iter_report_rows(conn, venues, date_from, date_to, stats)
+        with timed('export'):
+            if fmt == 'xlsx':
+                body, is_base64 = render_xlsx(rows), True
+            else:
+                body, is_base64 = render_csv(rows, compress)
+        conn.rollback()
+    finally:
+        conn.close()
+    _current.timer.rows = stats.get('rows', 0)
+    _current.timer.bytes = len(body)
+
+    filename = f'inventory_report_{date_from}_{date_to}.{fmt}'
+    if fmt == 'xlsx':
+        content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    elif compress:
+        filename += '.gz'
+        content_type = 'application/gzip'
+    else:
+        content_type = 'text/csv; charset=utf-8'
+
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': content_type,
+            'Access-Control-Allow-Origin': '*',
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'X-Report-Rows': str(stats.get('rows', 0)),
+            'Access-Control-Expose-Headers': 'Content-Disposition, X-Report-Rows'
+        },
+        'body': body,
+        'isBase64Encoded': is_base64
+    }
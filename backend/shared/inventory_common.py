@@ -0,0 +1,405 @@
+'''
+Общий код облачных функций backend/: логирование и тайминг вызовов, кодек строк в JSON,
+проверка токена администратора и формат холодного архива (хранилище и сегменты IVA1).
+scripts/build_bundle кладёт этот модуль в корень архива каждой функции рядом с index.py,
+локальные инструменты добавляют backend/shared в sys.path (scripts.common.load_function).
+'''
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from contextlib import contextmanager
+from datetime import date, timedelta
+from itertools import accumulate
+from json.encoder import encode_basestring, encode_basestring_ascii
+
+# Как и в inventory: typing только для аннотаций, на холодный старт не влияет
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+ARCHIVE_S3_ENDPOINT = os.environ.get('ARCHIVE_S3_ENDPOINT', 'https://storage.yandexcloud.net')
+# Общий секрет разрушающих вызовов (восстановление из бэкапа, ручной перенос в архив)
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+COUNTER_COLUMNS = (
+    'forks', 'knives', 'steak_knives', 'spoons', 'dessert_spoons',
+    'ice_cooler', 'plates', 'sugar_tongs', 'ice_tongs', 'ashtrays'
+)
+TEXT_COLUMNS = ('responsible_name', 'responsible_date', 'created_at', 'updated_at')
+
+# Строка архива: id, venue_id, venue, entry_date (date), счётчики, затем TEXT_COLUMNS
+COUNTERS_AT = 4
+TEXT_AT = COUNTERS_AT + len(COUNTER_COLUMNS)
+
+# Файл сегмента: b'IVA1', длина заголовка (uint32 LE), заголовок JSON, блоки колонок.
+# Строки отсортированы по заведению и дате; заголовок хранит диапазон строк каждого заведения
+# и смещение каждой колонки — читатель распаковывает только нужные ему колонки.
+# Колонки сжаты zlib: i32 — int32 LE, i32d — то же разностями соседних значений
+# (остатки меняются медленно и сжимаются в разы лучше), u8 — день месяца, text — JSON-массив
+ARCHIVE_MAGIC = b'IVA1'
+ARCHIVE_COLUMNS = (
+    (('id', 'i32'), ('day', 'u8'))
+    + tuple((column, 'i32d') for column in COUNTER_COLUMNS)
+    + tuple((column, 'text') for column in TEXT_COLUMNS)
+)
+
+# Таймер текущего вызова (атрибут timer) виден всем слоям функции
+request_state = threading.local()
+
+
+def log_event(payload: Dict[str, Any]) -> None:
+    """Одна JSON-строка в stdout — Cloud Logging собирает её как структурированную запись"""
+    print(json.dumps(payload, ensure_ascii=False, default=str), flush=True)
+
+
+class RequestTimer:
+    """Время фаз одного вызова handler и итоговая запись type=request в лог. Фазы из phases
+    попадают в запись и нулевыми, остальные — с первого замера; slow_ms включает флаг slow"""
+
+    def __init__(self, function_name: str, request_id: Optional[str], cold_start: bool,
+                 phases: Tuple[str, ...] = (), slow_ms: Optional[float] = None):
+        self.function_name = function_name
+        self.request_id = request_id
+        self.cold_start = cold_start
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = dict.fromkeys(phases, 0.0)
+        self.slow_ms = slow_ms
+        self.queries = 0
+        self.rows = 0
+        self.bytes = 0
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + (time.perf_counter() - started) * 1000
+
+    def server_timing(self) -> str:
+        return ', '.join(f'{name};dur={value:.1f}' for name, value in self.phases.items() if value)
+
+    def finish(self, method: str, status: int, error: Optional[str] = None, **fields: Any) -> None:
+        """fields — поля вызова, которые есть не у всех функций (например, action)"""
+        total_ms = (time.perf_counter() - self.started) * 1000
+        record = {
+            'type': 'request',
+            'function': self.function_name,
+            'request_id': self.request_id,
+            'cold_start': self.cold_start,
+            'method': method,
+            **fields,
+            'status': status,
+            'total_ms': round(total_ms, 2),
+            'queries': self.queries,
+            'rows': self.rows,
+            'bytes': self.bytes,
+        }
+        if self.slow_ms is not None:
+            record['slow'] = total_ms >= self.slow_ms
+        record.update({f'{name}_ms': round(value, 2) for name, value in self.phases.items()})
+        if error:
+            record['error'] = error
+        log_event(record)
+
+
+@contextmanager
+def timed(phase: str):
+    timer = getattr(request_state, 'timer', None)
+    if timer is None:
+        yield
+        return
+    with timer.phase(phase):
+        yield
+
+
+def is_admin(event: Dict[str, Any]) -> bool:
+    """Заголовок X-Admin-Token совпадает с ADMIN_TOKEN; пока токен не задан, вызов закрыт"""
+    if not ADMIN_TOKEN:
+        return False
+    token = next((value for key, value in (event.get('headers') or {}).items()
+                  if key.lower() == 'x-admin-token'), None)
+    return token is not None and hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8'))
+
+
+class RawJSON(str):
+    """Уже закодированный JSON-фрагмент: сериализаторы вставляют его без повторного кодирования"""
+
+
+_orjson_module = None
+
+
+def orjson_module():
+    """orjson, если он есть в окружении функции; иначе None и стандартный json"""
+    global _orjson_module
+    if _orjson_module is None:
+        try:
+            import orjson
+            _orjson_module = orjson
+        except ImportError:
+            _orjson_module = False
+    return _orjson_module or None
+
+
+class RowCodec:
+    """Строки БД -> JSON-объекты по схеме колонок без промежуточного dict на каждую строку"""
+
+    def __init__(self, schema: Tuple[Tuple[str, str], ...], ensure_ascii: bool = True,
+                 use_orjson: bool = True):
+        self.keys = tuple(key for key, _ in schema)
+        self._quote = encode_basestring_ascii if ensure_ascii else encode_basestring
+        # Даты приходят из SQL текстом (::text) и в JSON-объектах остаются строками
+        self._strings = tuple(i for i, (_, kind) in enumerate(schema) if kind in ('str', 'date'))
+        self._scalars = tuple(i for i, (_, kind) in enumerate(schema) if kind not in ('str', 'date'))
+        self._dates = tuple(i for i, (_, kind) in enumerate(schema) if kind == 'date')
+        # '{"id": %s, "venue": %s, ...}' — ключи экранируются один раз, а не на каждой строке
+        self._template = '{' + ', '.join(f'{self._quote(key)}: %s' for key in self.keys) + '}'
+        self._use_orjson = use_orjson
+
+    def encode_row(self, row: Tuple[Any, ...]) -> RawJSON:
+        values = list(row)
+        quote = self._quote
+        for i in self._strings:
+            value = values[i]
+            values[i] = 'null' if value is None else quote(value)
+        for i in self._scalars:
+            if values[i] is None:
+                values[i] = 'null'
+        return RawJSON(self._template % tuple(values))
+
+    def join_rows(self, rows: List[Tuple[Any, ...]], separator: str = ', ') -> str:
+        orjson = orjson_module() if self._use_orjson else None
+        if orjson is not None:
+            keys = self.keys
+            return separator.join([orjson.dumps(dict(zip(keys, row))).decode('utf-8') for row in rows])
+        return separator.join([self.encode_row(row) for row in rows])
+
+    def encode_rows(self, rows: List[Tuple[Any, ...]]) -> RawJSON:
+        orjson = orjson_module() if self._use_orjson else None
+        if orjson is not None:
+            keys = self.keys
+            return RawJSON(orjson.dumps([dict(zip(keys, row)) for row in rows]).decode('utf-8'))
+        return RawJSON('[' + self.join_rows(rows) + ']')
+
+    def encode_columns(self, rows: List[Tuple[Any, ...]]) -> RawJSON:
+        """Колоночный вид: ключи один раз, значения параллельными массивами,
+        даты — целым числом дней от epoch (самой ранней даты в ответе)"""
+        columns = [list(values) for values in zip(*rows)] if rows else [[] for _ in self.keys]
+        dates = {value for i in self._dates for value in columns[i] if value is not None}
+        epoch = min(dates) if dates else None
+        if epoch is not None:
+            start = date.fromisoformat(epoch)
+            offsets = {value: (date.fromisoformat(value) - start).days for value in dates}
+            for i in self._dates:
+                columns[i] = [None if value is None else offsets[value] for value in columns[i]]
+        document = {
+            'epoch': epoch,
+            'dates': [self.keys[i] for i in self._dates],
+            'count': len(rows),
+            'columns': dict(zip(self.keys, columns)),
+        }
+        orjson = orjson_module() if self._use_orjson else None
+        if orjson is not None:
+            return RawJSON(orjson.dumps(document).decode('utf-8'))
+        return RawJSON(json.dumps(document, ensure_ascii=False, separators=(',', ':')))
+
+
+class ArchiveCorrupted(Exception):
+    """Файл сегмента не совпадает с контрольной суммой из каталога или не является сегментом"""
+
+
+class ArchiveStorage:
+    """Файлы архива в каталоге или в бакете Object Storage (S3 API: boto3 и ключи
+    AWS_ACCESS_KEY_ID/AWS_SECRET_ACCESS_KEY сервисного аккаунта). Пишет и удаляет только archive"""
+
+    def __init__(self, url: str):
+        self._s3 = None
+        if url.startswith('s3://'):
+            try:
+                import boto3
+            except ImportError:
+                raise RuntimeError('boto3 is required for an s3:// ARCHIVE_URL')
+            self._bucket, _, prefix = url[len('s3://'):].partition('/')
+            self._prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+            self._s3 = boto3.client('s3', endpoint_url=ARCHIVE_S3_ENDPOINT)
+        else:
+            self._root = url.removeprefix('file://')
+
+    def read(self, key: str) -> bytes:
+        if self._s3 is not None:
+            return self._s3.get_object(Bucket=self._bucket, Key=self._prefix + key)['Body'].read()
+        with open(os.path.join(self._root, key), 'rb') as f:
+            return f.read()
+
+    def write(self, key: str, data: bytes) -> None:
+        if self._s3 is not None:
+            self._s3.put_object(Bucket=self._bucket, Key=self._prefix + key, Body=data)
+            return
+        path = os.path.join(self._root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Файл появляется под своим именем только целиком
+        with open(f'{path}.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(f'{path}.tmp', path)
+
+    def delete(self, key: str) -> None:
+        if self._s3 is not None:
+            self._s3.delete_object(Bucket=self._bucket, Key=self._prefix + key)
+            return
+        try:
+            os.remove(os.path.join(self._root, key))
+        except FileNotFoundError:
+            pass
+
+
+def _int_bytes(values: List[int]) -> bytes:
+    data = array('i', values)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data.tobytes()
+
+
+def encode_segment(month: date, rows: List[Tuple[Any, ...]]) -> bytes:
+    """Файл сегмента из строк архива, отсортированных по заведению и дате"""
+    venues: List[List[Any]] = []
+    for index, row in enumerate(rows):
+        if not venues or venues[-1][1] != row[1]:
+            venues.append([row[2], row[1], index, index])
+        venues[-1][3] = index + 1
+
+    values = {
+        'id': [row[0] for row in rows],
+        'day': [row[3].day for row in rows],
+        **{column: [row[COUNTERS_AT + i] for row in rows] for i, column in enumerate(COUNTER_COLUMNS)},
+        **{column: [row[TEXT_AT + i] for row in rows] for i, column in enumerate(TEXT_COLUMNS)},
+    }
+    blocks, layout, offset = [], [], 0
+    for name, kind in ARCHIVE_COLUMNS:
+        column = values[name]
+        if kind == 'u8':
+            raw = bytes(column)
+        elif kind == 'text':
+            raw = json.dumps(column, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        elif kind == 'i32d':
+            raw = _int_bytes(column[:1] + [b - a for a, b in zip(column, column[1:])])
+        else:
+            raw = _int_bytes(column)
+        block = zlib.compress(raw, 9)
+        layout.append([name, kind, offset, len(block)])
+        blocks.append(block)
+        offset += len(block)
+
+    header = json.dumps({'month': month.isoformat(), 'rows': len(rows), 'venues': venues, 'columns': layout},
+                        ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return ARCHIVE_MAGIC + struct.pack('<I', len(header)) + header + b''.join(blocks)
+
+
+class ArchiveSegment:
+    """Прочитанный файл сегмента; колонки распаковываются при первом обращении.
+    Методы *_rows отдают строки в форме, которая нужна своей функции"""
+
+    def __init__(self, data: bytes):
+        if data[:4] != ARCHIVE_MAGIC:
+            raise ArchiveCorrupted('Not an inventory archive segment')
+        (length,) = struct.unpack_from('<I', data, 4)
+        header = json.loads(data[8:8 + length])
+        self.month = date.fromisoformat(header['month'])
+        self.rows = header['rows']
+        # Имя заведения -> (venue_id, первая строка, строка за последней)
+        self.venues = {name: (venue_id, start, stop) for name, venue_id, start, stop in header['venues']}
+        self._layout = {name: (kind, offset, size) for name, kind, offset, size in header['columns']}
+        self._blocks = memoryview(data)[8 + length:]
+        self._decoded: Dict[str, Any] = {}
+
+    def column(self, name: str):
+        values = self._decoded.get(name)
+        if values is None:
+            kind, offset, size = self._layout[name]
+            raw = zlib.decompress(self._blocks[offset:offset + size])
+            if kind == 'u8':
+                values = array('B', raw)
+            elif kind == 'text':
+                values = json.loads(raw)
+            else:
+                values = array('i')
+                values.frombytes(raw)
+                if sys.byteorder == 'big':
+                    values.byteswap()
+                if kind == 'i32d':
+                    values = array('i', accumulate(values))
+            self._decoded[name] = values
+        return values
+
+    def _iso_dates(self) -> List[str]:
+        return [(self.month + timedelta(days=day)).isoformat() for day in range(31)]
+
+    def iter_rows(self) -> Iterator[Tuple[Any, ...]]:
+        """Строки в форме выборки из inventory_entries (см. COUNTERS_AT, TEXT_AT) — для перезаписи месяца"""
+        columns = [self.column(name) for name, _ in ARCHIVE_COLUMNS]
+        dates = [self.month + timedelta(days=day) for day in range(31)]
+        for name, (venue_id, start, stop) in self.venues.items():
+            for i in range(start, stop):
+                yield (columns[0][i], venue_id, name, dates[columns[1][i] - 1],
+                       *(column[i] for column in columns[2:]))
+
+    def export_rows(self) -> Iterator[Tuple[Any, ...]]:
+        """Строки бэкапа (ENTRY_SCHEMA backup); updated_at пуст у записей, не менявшихся с создания"""
+        ids, days = self.column('id'), self.column('day')
+        counters = [self.column(column) for column in COUNTER_COLUMNS]
+        names, responsible_dates, created, updated = (self.column(column) for column in TEXT_COLUMNS)
+        dates = self._iso_dates()
+        for venue, (_, start, stop) in self.venues.items():
+            for i in range(start, stop):
+                yield (ids[i], venue, dates[days[i] - 1], *(column[i] for column in counters),
+                       names[i], responsible_dates[i], created[i], updated[i] or created[i])
+
+    def venue_rows(self, venue: str, lower: Optional[str], upper: Optional[str]) -> List[Tuple[Any, ...]]:
+        """Записи заведения за [lower, upper] в форме строк list_entries, от новых к старым"""
+        if venue not in self.venues:
+            return []
+        _, start, stop = self.venues[venue]
+        days = self.column('day')
+        dates = self._iso_dates()
+        columns = [self.column(column) for column in COUNTER_COLUMNS]
+        ids = self.column('id')
+        names, responsible_dates, created = (self.column(column) for column in
+                                             ('responsible_name', 'responsible_date', 'created_at'))
+        rows = []
+        for i in range(stop - 1, start - 1, -1):
+            entry_date = dates[days[i] - 1]
+            if (lower and entry_date < lower) or (upper and entry_date > upper):
+                continue
+            rows.append((ids[i], venue, entry_date, *(column[i] for column in columns),
+                         names[i], responsible_dates[i], created[i]))
+        return rows
+
+    def report_rows(self, venue: str, date_from: str, date_to: str) -> Iterator[Tuple[Any, ...]]:
+        """Строки отчёта заведения за [date_from, date_to] от старых к новым"""
+        if venue not in self.venues:
+            return
+        _, start, stop = self.venues[venue]
+        days = self.column('day')
+        dates = self._iso_dates()
+        counters = [self.column(column) for column in COUNTER_COLUMNS]
+        names, responsible_dates = self.column('responsible_name'), self.column('responsible_date')
+        for i in range(start, stop):
+            entry_date = dates[days[i] - 1]
+            if date_from <= entry_date <= date_to:
+                yield (venue, entry_date, *(column[i] for column in counters), names[i], responsible_dates[i])
+
+
+def read_segment(storage: ArchiveStorage, key: str, digest: str) -> ArchiveSegment:
+    data = storage.read(key)
+    if hashlib.sha256(data).hexdigest() != digest:
+        raise ArchiveCorrupted(f'Archive segment {key} does not match its checksum')
+    return ArchiveSegment(data)
@@ -0,0 +1,46 @@
+CREATE TABLE IF NOT EXISTS t_p23128842_inventory_cutlery_tr.inventory_venue_versions (
+    venue VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO t_p23128842_inventory_cutlery_tr.inventory_venue_versions (venue)
+SELECT DISTINCT venue FROM t_p23128842_inventory_cutlery_tr.inventory_entries
+ON CONFLICT (venue) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION t_p23128842_inventory_cutlery_tr.bump_venue_versions()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO t_p23128842_inventory_cutlery_tr.inventory_venue_versions AS v (venue)
+        SELECT DISTINCT venue FROM new_rows
+        ON CONFLICT (venue) DO UPDATE SET version = v.version + 1, updated_at = CURRENT_TIMESTAMP;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO t_p23128842_inventory_cutlery_tr.inventory_venue_versions AS v (venue)
+        SELECT venue FROM new_rows UNION SELECT venue FROM old_rows
+        ON CONFLICT (venue) DO UPDATE SET version = v.version + 1, updated_at = CURRENT_TIMESTAMP;
+    ELSE
+        INSERT INTO t_p23128842_inventory_cutlery_tr.inventory_venue_versions AS v (venue)
+        SELECT DISTINCT venue FROM old_rows
+        ON CONFLICT (venue) DO UPDATE SET version = v.version + 1, updated_at = CURRENT_TIMESTAMP;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_inventory_entries_version_insert
+AFTER INSERT ON t_p23128842_inventory_cutlery_tr.inventory_entries
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p23128842_inventory_cutlery_tr.bump_venue_versions();
+
+CREATE TRIGGER trg_inventory_entries_version_update
+AFTER UPDATE ON t_p23128842_inventory_cutlery_tr.inventory_entries
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p23128842_inventory_cutlery_tr.bump_venue_versions();
+
+CREATE TRIGGER trg_inventory_entries_version_delete
+AFTER DELETE ON t_p23128842_inventory_cutlery_tr.inventory_entries
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p23128842_inventory_cutlery_tr.bump_venue_versions();
@@ -0,0 +1,123 @@
+CREATE TABLE IF NOT EXISTS t_p23128842_inventory_cutlery_tr.inventory_daily_stats (
+    venue VARCHAR(50) NOT NULL,
+    entry_date DATE NOT NULL,
+    item VARCHAR(32) NOT NULL,
+    item_count INTEGER NOT NULL,
+    delta INTEGER,
+    loss INTEGER NOT NULL DEFAULT 0,
+    loss_7d INTEGER NOT NULL DEFAULT 0,
+    loss_30d INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (venue, entry_date, item)
+);
+
+-- Пересчёт сводки заведения для дней [p_from, p_to] и всех дней, которые от них зависят:
+-- delta следующего дня с подсчётом и окна потерь 7/30 дней
+CREATE OR REPLACE FUNCTION t_p23128842_inventory_cutlery_tr.refresh_daily_stats(
+    p_venue VARCHAR, p_from DATE, p_to DATE
+)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_to DATE;
+    v_lower DATE;
+BEGIN
+    SELECT GREATEST(p_to + 29, COALESCE(min(entry_date), p_to))
+    INTO v_to
+    FROM t_p23128842_inventory_cutlery_tr.inventory_entries
+    WHERE venue = p_venue AND entry_date > p_to;
+
+    -- Окно 30 дней для p_from начинается с p_from - 29; для его delta нужен ещё предыдущий день
+    SELECT COALESCE(max(entry_date), p_from - 29)
+    INTO v_lower
+    FROM t_p23128842_inventory_cutlery_tr.inventory_entries
+    WHERE venue = p_venue AND entry_date < p_from - 29;
+
+    DELETE FROM t_p23128842_inventory_cutlery_tr.inventory_daily_stats
+    WHERE venue = p_venue AND entry_date BETWEEN p_from AND v_to;
+
+    INSERT INTO t_p23128842_inventory_cutlery_tr.inventory_daily_stats
+        (venue, entry_date, item, item_count, delta, loss, loss_7d, loss_30d)
+    WITH days AS (
+        -- Если за день несколько записей, считается последняя
+        SELECT DISTINCT ON (entry_date)
+               entry_date, forks, knives, steak_knives, spoons, dessert_spoons,
+               ice_cooler, plates, sugar_tongs, ice_tongs, ashtrays
+        FROM t_p23128842_inventory_cutlery_tr.inventory_entries
+        WHERE venue = p_venue AND entry_date BETWEEN v_lower AND v_to
+        ORDER BY entry_date, id DESC
+    ), items AS (
+        SELECT d.entry_date, i.item, i.item_count,
+               i.item_count - LAG(i.item_count) OVER (PARTITION BY i.item ORDER BY d.entry_date) AS delta
+        FROM days d
+        CROSS JOIN LATERAL (VALUES
+            ('forks', d.forks), ('knives', d.knives), ('steak_knives', d.steak_knives),
+            ('spoons', d.spoons), ('dessert_spoons', d.dessert_spoons), ('ice_cooler', d.ice_cooler),
+            ('plates', d.plates), ('sugar_tongs', d.sugar_tongs), ('ice_tongs', d.ice_tongs),
+            ('ashtrays', d.ashtrays)
+        ) AS i(item, item_count)
+    ), losses AS (
+        SELECT entry_date, item, item_count, delta, GREATEST(-COALESCE(delta, 0), 0) AS loss
+        FROM items
+    ), rolling AS (
+        SELECT entry_date, item, item_count, delta, loss,
+               SUM(loss) OVER (PARTITION BY item ORDER BY entry_date
+                               RANGE BETWEEN INTERVAL '6 days' PRECEDING AND CURRENT ROW) AS loss_7d,
+               SUM(loss) OVER (PARTITION BY item ORDER BY entry_date
+                               RANGE BETWEEN INTERVAL '29 days' PRECEDING AND CURRENT ROW) AS loss_30d
+        FROM losses
+    )
+    SELECT p_venue, entry_date, item, item_count, delta, loss, loss_7d, loss_30d
+    FROM rolling
+    WHERE entry_date BETWEEN p_from AND v_to;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION t_p23128842_inventory_cutlery_tr.refresh_daily_stats_trigger()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    r RECORD;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        FOR r IN SELECT venue, min(entry_date) AS date_from, max(entry_date) AS date_to
+                 FROM new_rows GROUP BY venue LOOP
+            PERFORM t_p23128842_inventory_cutlery_tr.refresh_daily_stats(r.venue, r.date_from, r.date_to);
+        END LOOP;
+    ELSIF TG_OP = 'UPDATE' THEN
+        FOR r IN SELECT venue, min(entry_date) AS date_from, max(entry_date) AS date_to
+                 FROM (SELECT venue, entry_date FROM new_rows
+                       UNION ALL
+                       SELECT venue, entry_date FROM old_rows) changed
+                 GROUP BY venue LOOP
+            PERFORM t_p23128842_inventory_cutlery_tr.refresh_daily_stats(r.venue, r.date_from, r.date_to);
+        END LOOP;
+    ELSE
+        FOR r IN SELECT venue, min(entry_date) AS date_from, max(entry_date) AS date_to
+                 FROM old_rows GROUP BY venue LOOP
+            PERFORM t_p23128842_inventory_cutlery_tr.refresh_daily_stats(r.venue, r.date_from, r.date_to);
+        END LOOP;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_inventory_entries_stats_insert
+AFTER INSERT ON t_p23128842_inventory_cutlery_tr.inventory_entries
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p23128842_inventory_cutlery_tr.refresh_daily_stats_trigger();
+
+CREATE TRIGGER trg_inventory_entries_stats_update
+AFTER UPDATE ON t_p23128842_inventory_cutlery_tr.inventory_entries
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p23128842_inventory_cutlery_tr.refresh_daily_stats_trigger();
+
+CREATE TRIGGER trg_inventory_entries_stats_delete
+AFTER DELETE ON t_p23128842_inventory_cutlery_tr.inventory_entries
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p23128842_inventory_cutlery_tr.refresh_daily_stats_trigger();
+
+SELECT t_p23128842_inventory_cutlery_tr.refresh_daily_stats(venue, min(entry_date), max(entry_date))
+FROM t_p23128842_inventory_cutlery_tr.inventory_entries
+GROUP BY venue;
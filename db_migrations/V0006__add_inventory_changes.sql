@@ -0,0 +1,53 @@
+CREATE TABLE IF NOT EXISTS t_p23128842_inventory_cutlery_tr.inventory_changes (
+    entry_id INTEGER PRIMARY KEY,
+    venue VARCHAR(50) NOT NULL,
+    deleted BOOLEAN NOT NULL DEFAULT FALSE,
+    xid XID8 NOT NULL DEFAULT pg_current_xact_id(),
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_inventory_changes_xid
+ON t_p23128842_inventory_cutlery_tr.inventory_changes (xid, entry_id);
+
+INSERT INTO t_p23128842_inventory_cutlery_tr.inventory_changes (entry_id, venue)
+SELECT id, venue FROM t_p23128842_inventory_cutlery_tr.inventory_entries
+ON CONFLICT (entry_id) DO NOTHING;
+
+-- Одна строка на запись: последняя операция и транзакция, в которой она случилась.
+-- Удалённые записи остаются надгробиями (deleted), чтобы их увидели клиенты синхронизации
+CREATE OR REPLACE FUNCTION t_p23128842_inventory_cutlery_tr.record_entry_changes()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO t_p23128842_inventory_cutlery_tr.inventory_changes AS c (entry_id, venue, deleted)
+        SELECT id, venue, TRUE FROM old_rows
+        ON CONFLICT (entry_id) DO UPDATE
+        SET venue = EXCLUDED.venue, deleted = TRUE,
+            xid = pg_current_xact_id(), changed_at = CURRENT_TIMESTAMP;
+    ELSE
+        INSERT INTO t_p23128842_inventory_cutlery_tr.inventory_changes AS c (entry_id, venue, deleted)
+        SELECT id, venue, FALSE FROM new_rows
+        ON CONFLICT (entry_id) DO UPDATE
+        SET venue = EXCLUDED.venue, deleted = FALSE,
+            xid = pg_current_xact_id(), changed_at = CURRENT_TIMESTAMP;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_inventory_entries_changes_insert
+AFTER INSERT ON t_p23128842_inventory_cutlery_tr.inventory_entries
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p23128842_inventory_cutlery_tr.record_entry_changes();
+
+CREATE TRIGGER trg_inventory_entries_changes_update
+AFTER UPDATE ON t_p23128842_inventory_cutlery_tr.inventory_entries
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p23128842_inventory_cutlery_tr.record_entry_changes();
+
+CREATE TRIGGER trg_inventory_entries_changes_delete
+AFTER DELETE ON t_p23128842_inventory_cutlery_tr.inventory_entries
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p23128842_inventory_cutlery_tr.record_entry_changes();
@@ -0,0 +1,43 @@
+CREATE TABLE IF NOT EXISTS t_p23128842_inventory_cutlery_tr.venues (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(50) NOT NULL UNIQUE,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO t_p23128842_inventory_cutlery_tr.venues (name)
+SELECT DISTINCT venue FROM t_p23128842_inventory_cutlery_tr.inventory_entries
+ORDER BY venue
+ON CONFLICT (name) DO NOTHING;
+
+-- id заведения по имени; новое заведение заводится при первой записи
+CREATE OR REPLACE FUNCTION t_p23128842_inventory_cutlery_tr.ensure_venue(p_name VARCHAR)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_id INTEGER;
+BEGIN
+    SELECT id INTO v_id FROM t_p23128842_inventory_cutlery_tr.venues WHERE name = p_name;
+    IF v_id IS NULL THEN
+        INSERT INTO t_p23128842_inventory_cutlery_tr.venues (name) VALUES (p_name)
+        ON CONFLICT (name) DO NOTHING
+        RETURNING id INTO v_id;
+        IF v_id IS NULL THEN
+            SELECT id INTO v_id FROM t_p23128842_inventory_cutlery_tr.venues WHERE name = p_name;
+        END IF;
+    END IF;
+    RETURN v_id;
+END;
+$$;
+
+-- Имя заведения для RETURNING после записи: VOLATILE-функция берёт новый снимок и видит
+-- заведение, которое ensure_venue завёл этим же оператором (подзапрос его бы не увидел)
+CREATE OR REPLACE FUNCTION t_p23128842_inventory_cutlery_tr.venue_name(p_id INTEGER)
+RETURNS VARCHAR
+LANGUAGE plpgsql
+VOLATILE
+AS $$
+BEGIN
+    RETURN (SELECT name FROM t_p23128842_inventory_cutlery_tr.venues WHERE id = p_id);
+END;
+$$;
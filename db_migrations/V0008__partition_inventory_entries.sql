@@ -0,0 +1,144 @@
+-- Старая таблица уступает имя секционированной; её триггеры удаляются вместе с ней в конце
+ALTER TABLE t_p23128842_inventory_cutlery_tr.inventory_entries RENAME TO inventory_entries_legacy;
+ALTER TABLE t_p23128842_inventory_cutlery_tr.inventory_entries_legacy
+    RENAME CONSTRAINT inventory_entries_pkey TO inventory_entries_legacy_pkey;
+ALTER INDEX t_p23128842_inventory_cutlery_tr.idx_venue_date RENAME TO idx_venue_date_legacy;
+ALTER SEQUENCE t_p23128842_inventory_cutlery_tr.inventory_entries_id_seq OWNED BY NONE;
+
+CREATE TABLE t_p23128842_inventory_cutlery_tr.inventory_entries (
+    id INTEGER NOT NULL DEFAULT nextval('t_p23128842_inventory_cutlery_tr.inventory_entries_id_seq'::regclass),
+    venue_id INTEGER NOT NULL REFERENCES t_p23128842_inventory_cutlery_tr.venues (id),
+    entry_date DATE NOT NULL,
+    forks INTEGER NOT NULL DEFAULT 0,
+    knives INTEGER NOT NULL DEFAULT 0,
+    steak_knives INTEGER NOT NULL DEFAULT 0,
+    spoons INTEGER NOT NULL DEFAULT 0,
+    dessert_spoons INTEGER NOT NULL DEFAULT 0,
+    ice_cooler INTEGER NOT NULL DEFAULT 0,
+    plates INTEGER NOT NULL DEFAULT 0,
+    sugar_tongs INTEGER NOT NULL DEFAULT 0,
+    ice_tongs INTEGER NOT NULL DEFAULT 0,
+    ashtrays INTEGER NOT NULL DEFAULT 0,
+    responsible_name VARCHAR(255),
+    responsible_date DATE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, entry_date),
+    -- Одна запись на заведение в день (цель для upsert); INCLUDE со всеми колонками выборки GET
+    -- делает этот же индекс покрывающим — страница читается index-only scan по свежим секциям
+    CONSTRAINT inventory_entries_venue_date_key UNIQUE (venue_id, entry_date)
+        INCLUDE (id, forks, knives, steak_knives, spoons, dessert_spoons, ice_cooler, plates,
+                 sugar_tongs, ice_tongs, ashtrays, responsible_name, responsible_date, created_at)
+) PARTITION BY RANGE (entry_date);
+
+ALTER SEQUENCE t_p23128842_inventory_cutlery_tr.inventory_entries_id_seq
+    OWNED BY t_p23128842_inventory_cutlery_tr.inventory_entries.id;
+
+-- PUT и DELETE приходят только с id: без ключа секционирования нужен индекс в каждой секции
+CREATE INDEX idx_inventory_entries_id ON t_p23128842_inventory_cutlery_tr.inventory_entries (id);
+
+CREATE TABLE t_p23128842_inventory_cutlery_tr.inventory_entries_default
+PARTITION OF t_p23128842_inventory_cutlery_tr.inventory_entries DEFAULT;
+
+-- Месячные секции inventory_entries_YYYY_MM на [p_from, p_to]; строки этих месяцев,
+-- уже попавшие в DEFAULT, переносятся в новую секцию до её подключения
+CREATE OR REPLACE FUNCTION t_p23128842_inventory_cutlery_tr.ensure_inventory_partitions(p_from DATE, p_to DATE)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_month DATE := date_trunc('month', p_from)::date;
+    v_next DATE;
+    v_name TEXT;
+    v_created INTEGER := 0;
+BEGIN
+    WHILE v_month <= p_to LOOP
+        v_next := (v_month + INTERVAL '1 month')::date;
+        v_name := 'inventory_entries_' || to_char(v_month, 'YYYY_MM');
+        IF to_regclass('t_p23128842_inventory_cutlery_tr.' || v_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE t_p23128842_inventory_cutlery_tr.%I
+                 (LIKE t_p23128842_inventory_cutlery_tr.inventory_entries INCLUDING DEFAULTS)',
+                v_name);
+            EXECUTE format(
+                'WITH moved AS (
+                     DELETE FROM t_p23128842_inventory_cutlery_tr.inventory_entries_default
+                     WHERE entry_date >= %L AND entry_date < %L
+                     RETURNING *
+                 )
+                 INSERT INTO t_p23128842_inventory_cutlery_tr.%I SELECT * FROM moved',
+                v_month, v_next, v_name);
+            EXECUTE format(
+                'ALTER TABLE t_p23128842_inventory_cutlery_tr.inventory_entries
+                 ATTACH PARTITION t_p23128842_inventory_cutlery_tr.%I FOR VALUES FROM (%L) TO (%L)',
+                v_name, v_month, v_next);
+            v_created := v_created + 1;
+        END IF;
+        v_month := v_next;
+    END LOOP;
+    RETURN v_created;
+END;
+$$;
+
+SELECT t_p23128842_inventory_cutlery_tr.ensure_inventory_partitions(
+    LEAST((SELECT min(entry_date) FROM t_p23128842_inventory_cutlery_tr.inventory_entries_legacy), CURRENT_DATE),
+    (CURRENT_DATE + INTERVAL '24 months')::date
+);
+
+-- Несколько записей за один день раньше допускались; в таблице остаётся последняя (так же
+-- её выбирала сводка inventory_daily_stats), остальные сохраняются здесь без потерь
+CREATE TABLE IF NOT EXISTS t_p23128842_inventory_cutlery_tr.inventory_entries_duplicates (
+    id INTEGER PRIMARY KEY,
+    venue VARCHAR(50) NOT NULL,
+    entry_date DATE NOT NULL,
+    forks INTEGER NOT NULL,
+    knives INTEGER NOT NULL,
+    steak_knives INTEGER NOT NULL,
+    spoons INTEGER NOT NULL,
+    dessert_spoons INTEGER NOT NULL,
+    ice_cooler INTEGER NOT NULL,
+    plates INTEGER NOT NULL,
+    sugar_tongs INTEGER NOT NULL,
+    ice_tongs INTEGER NOT NULL,
+    ashtrays INTEGER NOT NULL,
+    responsible_name VARCHAR(255),
+    responsible_date DATE,
+    created_at TIMESTAMP,
+    kept_id INTEGER NOT NULL,
+    moved_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO t_p23128842_inventory_cutlery_tr.inventory_entries_duplicates
+    (id, venue, entry_date, forks, knives, steak_knives, spoons, dessert_spoons, ice_cooler, plates,
+     sugar_tongs, ice_tongs, ashtrays, responsible_name, responsible_date, created_at, kept_id)
+SELECT id, venue, entry_date, forks, knives, steak_knives, spoons, dessert_spoons, ice_cooler, plates,
+       sugar_tongs, ice_tongs, ashtrays, responsible_name, responsible_date, created_at, kept_id
+FROM (
+    SELECT l.*,
+           first_value(id) OVER (PARTITION BY venue, entry_date ORDER BY id DESC) AS kept_id
+    FROM t_p23128842_inventory_cutlery_tr.inventory_entries_legacy l
+) ranked
+WHERE id <> kept_id;
+
+INSERT INTO t_p23128842_inventory_cutlery_tr.inventory_entries
+    (id, venue_id, entry_date, forks, knives, steak_knives, spoons, dessert_spoons, ice_cooler, plates,
+     sugar_tongs, ice_tongs, ashtrays, responsible_name, responsible_date, created_at)
+SELECT DISTINCT ON (l.venue, l.entry_date)
+       l.id, v.id, l.entry_date, l.forks, l.knives, l.steak_knives, l.spoons, l.dessert_spoons,
+       l.ice_cooler, l.plates, l.sugar_tongs, l.ice_tongs, l.ashtrays,
+       l.responsible_name, l.responsible_date, l.created_at
+FROM t_p23128842_inventory_cutlery_tr.inventory_entries_legacy l
+JOIN t_p23128842_inventory_cutlery_tr.venues v ON v.name = l.venue
+ORDER BY l.venue, l.entry_date, l.id DESC;
+
+-- Клиенты синхронизации должны забыть записи, ушедшие в inventory_entries_duplicates
+INSERT INTO t_p23128842_inventory_cutlery_tr.inventory_changes AS c (entry_id, venue, deleted)
+SELECT id, venue, TRUE FROM t_p23128842_inventory_cutlery_tr.inventory_entries_duplicates
+ON CONFLICT (entry_id) DO UPDATE
+SET deleted = TRUE, xid = pg_current_xact_id(), changed_at = CURRENT_TIMESTAMP;
+
+UPDATE t_p23128842_inventory_cutlery_tr.inventory_venue_versions
+SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+
+DROP TABLE t_p23128842_inventory_cutlery_tr.inventory_entries_legacy;
+
+ANALYZE t_p23128842_inventory_cutlery_tr.inventory_entries;
@@ -0,0 +1,195 @@
+-- В inventory_entries теперь venue_id; производные таблицы по-прежнему ведутся по имени заведения
+
+CREATE OR REPLACE FUNCTION t_p23128842_inventory_cutlery_tr.bump_venue_versions()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO t_p23128842_inventory_cutlery_tr.inventory_venue_versions AS v (venue)
+        SELECT DISTINCT n.name FROM new_rows r
+        JOIN t_p23128842_inventory_cutlery_tr.venues n ON n.id = r.venue_id
+        ON CONFLICT (venue) DO UPDATE SET version = v.version + 1, updated_at = CURRENT_TIMESTAMP;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO t_p23128842_inventory_cutlery_tr.inventory_venue_versions AS v (venue)
+        SELECT n.name FROM (SELECT venue_id FROM new_rows UNION SELECT venue_id FROM old_rows) r
+        JOIN t_p23128842_inventory_cutlery_tr.venues n ON n.id = r.venue_id
+        ON CONFLICT (venue) DO UPDATE SET version = v.version + 1, updated_at = CURRENT_TIMESTAMP;
+    ELSE
+        INSERT INTO t_p23128842_inventory_cutlery_tr.inventory_venue_versions AS v (venue)
+        SELECT DISTINCT n.name FROM old_rows r
+        JOIN t_p23128842_inventory_cutlery_tr.venues n ON n.id = r.venue_id
+        ON CONFLICT (venue) DO UPDATE SET version = v.version + 1, updated_at = CURRENT_TIMESTAMP;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION t_p23128842_inventory_cutlery_tr.record_entry_changes()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        -- При UPDATE надгробие получают только id, которых не осталось (upsert из бэкапа меняет id)
+        INSERT INTO t_p23128842_inventory_cutlery_tr.inventory_changes AS c (entry_id, venue, deleted)
+        SELECT r.id, n.name, TRUE FROM old_rows r
+        JOIN t_p23128842_inventory_cutlery_tr.venues n ON n.id = r.venue_id
+        WHERE TG_OP = 'DELETE' OR r.id NOT IN (SELECT id FROM new_rows)
+        ON CONFLICT (entry_id) DO UPDATE
+        SET venue = EXCLUDED.venue, deleted = TRUE,
+            xid = pg_current_xact_id(), changed_at = CURRENT_TIMESTAMP;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        INSERT INTO t_p23128842_inventory_cutlery_tr.inventory_changes AS c (entry_id, venue, deleted)
+        SELECT r.id, n.name, FALSE FROM new_rows r
+        JOIN t_p23128842_inventory_cutlery_tr.venues n ON n.id = r.venue_id
+        ON CONFLICT (entry_id) DO UPDATE
+        SET venue = EXCLUDED.venue, deleted = FALSE,
+            xid = pg_current_xact_id(), changed_at = CURRENT_TIMESTAMP;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION t_p23128842_inventory_cutlery_tr.refresh_daily_stats(
+    p_venue VARCHAR, p_from DATE, p_to DATE
+)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_venue_id INTEGER;
+    v_to DATE;
+    v_lower DATE;
+BEGIN
+    SELECT id INTO v_venue_id FROM t_p23128842_inventory_cutlery_tr.venues WHERE name = p_venue;
+
+    SELECT GREATEST(p_to + 29, COALESCE(min(entry_date), p_to))
+    INTO v_to
+    FROM t_p23128842_inventory_cutlery_tr.inventory_entries
+    WHERE venue_id = v_venue_id AND entry_date > p_to;
+
+    -- Окно 30 дней для p_from начинается с p_from - 29; для его delta нужен ещё предыдущий день
+    SELECT COALESCE(max(entry_date), p_from - 29)
+    INTO v_lower
+    FROM t_p23128842_inventory_cutlery_tr.inventory_entries
+    WHERE venue_id = v_venue_id AND entry_date < p_from - 29;
+
+    DELETE FROM t_p23128842_inventory_cutlery_tr.inventory_daily_stats
+    WHERE venue = p_venue AND entry_date BETWEEN p_from AND v_to;
+
+    INSERT INTO t_p23128842_inventory_cutlery_tr.inventory_daily_stats
+        (venue, entry_date, item, item_count, delta, loss, loss_7d, loss_30d)
+    WITH days AS (
+        -- (venue_id, entry_date) уникален: одна запись на день
+        SELECT entry_date, forks, knives, steak_knives, spoons, dessert_spoons,
+               ice_cooler, plates, sugar_tongs, ice_tongs, ashtrays
+        FROM t_p23128842_inventory_cutlery_tr.inventory_entries
+        WHERE venue_id = v_venue_id AND entry_date BETWEEN v_lower AND v_to
+    ), items AS (
+        SELECT d.entry_date, i.item, i.item_count,
+               i.item_count - LAG(i.item_count) OVER (PARTITION BY i.item ORDER BY d.entry_date) AS delta
+        FROM days d
+        CROSS JOIN LATERAL (VALUES
+            ('forks', d.forks), ('knives', d.knives), ('steak_knives', d.steak_knives),
+            ('spoons', d.spoons), ('dessert_spoons', d.dessert_spoons), ('ice_cooler', d.ice_cooler),
+            ('plates', d.plates), ('sugar_tongs', d.sugar_tongs), ('ice_tongs', d.ice_tongs),
+            ('ashtrays', d.ashtrays)
+        ) AS i(item, item_count)
+    ), losses AS (
+        SELECT entry_date, item, item_count, delta, GREATEST(-COALESCE(delta, 0), 0) AS loss
+        FROM items
+    ), rolling AS (
+        SELECT entry_date, item, item_count, delta, loss,
+               SUM(loss) OVER (PARTITION BY item ORDER BY entry_date
+                               RANGE BETWEEN INTERVAL '6 days' PRECEDING AND CURRENT ROW) AS loss_7d,
+               SUM(loss) OVER (PARTITION BY item ORDER BY entry_date
+                               RANGE BETWEEN INTERVAL '29 days' PRECEDING AND CURRENT ROW) AS loss_30d
+        FROM losses
+    )
+    SELECT p_venue, entry_date, item, item_count, delta, loss, loss_7d, loss_30d
+    FROM rolling
+    WHERE entry_date BETWEEN p_from AND v_to;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION t_p23128842_inventory_cutlery_tr.refresh_daily_stats_trigger()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    r RECORD;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        FOR r IN SELECT n.name AS venue, min(c.entry_date) AS date_from, max(c.entry_date) AS date_to
+                 FROM new_rows c
+                 JOIN t_p23128842_inventory_cutlery_tr.venues n ON n.id = c.venue_id
+                 GROUP BY n.name LOOP
+            PERFORM t_p23128842_inventory_cutlery_tr.refresh_daily_stats(r.venue, r.date_from, r.date_to);
+        END LOOP;
+    ELSIF TG_OP = 'UPDATE' THEN
+        FOR r IN SELECT n.name AS venue, min(c.entry_date) AS date_from, max(c.entry_date) AS date_to
+                 FROM (SELECT venue_id, entry_date FROM new_rows
+                       UNION ALL
+                       SELECT venue_id, entry_date FROM old_rows) c
+                 JOIN t_p23128842_inventory_cutlery_tr.venues n ON n.id = c.venue_id
+                 GROUP BY n.name LOOP
+            PERFORM t_p23128842_inventory_cutlery_tr.refresh_daily_stats(r.venue, r.date_from, r.date_to);
+        END LOOP;
+    ELSE
+        FOR r IN SELECT n.name AS venue, min(c.entry_date) AS date_from, max(c.entry_date) AS date_to
+                 FROM old_rows c
+                 JOIN t_p23128842_inventory_cutlery_tr.venues n ON n.id = c.venue_id
+                 GROUP BY n.name LOOP
+            PERFORM t_p23128842_inventory_cutlery_tr.refresh_daily_stats(r.venue, r.date_from, r.date_to);
+        END LOOP;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_inventory_entries_version_insert
+AFTER INSERT ON t_p23128842_inventory_cutlery_tr.inventory_entries
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p23128842_inventory_cutlery_tr.bump_venue_versions();
+
+CREATE TRIGGER trg_inventory_entries_version_update
+AFTER UPDATE ON t_p23128842_inventory_cutlery_tr.inventory_entries
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p23128842_inventory_cutlery_tr.bump_venue_versions();
+
+CREATE TRIGGER trg_inventory_entries_version_delete
+AFTER DELETE ON t_p23128842_inventory_cutlery_tr.inventory_entries
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p23128842_inventory_cutlery_tr.bump_venue_versions();
+
+CREATE TRIGGER trg_inventory_entries_stats_insert
+AFTER INSERT ON t_p23128842_inventory_cutlery_tr.inventory_entries
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p23128842_inventory_cutlery_tr.refresh_daily_stats_trigger();
+
+CREATE TRIGGER trg_inventory_entries_stats_update
+AFTER UPDATE ON t_p23128842_inventory_cutlery_tr.inventory_entries
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p23128842_inventory_cutlery_tr.refresh_daily_stats_trigger();
+
+CREATE TRIGGER trg_inventory_entries_stats_delete
+AFTER DELETE ON t_p23128842_inventory_cutlery_tr.inventory_entries
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p23128842_inventory_cutlery_tr.refresh_daily_stats_trigger();
+
+CREATE TRIGGER trg_inventory_entries_changes_insert
+AFTER INSERT ON t_p23128842_inventory_cutlery_tr.inventory_entries
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p23128842_inventory_cutlery_tr.record_entry_changes();
+
+CREATE TRIGGER trg_inventory_entries_changes_update
+AFTER UPDATE ON t_p23128842_inventory_cutlery_tr.inventory_entries
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p23128842_inventory_cutlery_tr.record_entry_changes();
+
+CREATE TRIGGER trg_inventory_entries_changes_delete
+AFTER DELETE ON t_p23128842_inventory_cutlery_tr.inventory_entries
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p23128842_inventory_cutlery_tr.record_entry_changes();
@@ -0,0 +1,38 @@
+-- Без DEFAULT при добавлении: таблица не переписывается, у старых строк updated_at пуст
+-- и читается как COALESCE(updated_at, created_at)
+ALTER TABLE t_p23128842_inventory_cutlery_tr.inventory_entries ADD COLUMN updated_at TIMESTAMP;
+ALTER TABLE t_p23128842_inventory_cutlery_tr.inventory_entries
+    ALTER COLUMN updated_at SET DEFAULT CURRENT_TIMESTAMP;
+
+-- Явно заданный updated_at (восстановление из бэкапа) сохраняется, иначе ставится текущее время
+CREATE OR REPLACE FUNCTION t_p23128842_inventory_cutlery_tr.touch_updated_at()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF NEW.updated_at IS NOT DISTINCT FROM OLD.updated_at THEN
+        NEW.updated_at := CURRENT_TIMESTAMP;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+CREATE TRIGGER trg_inventory_entries_touch_updated_at
+BEFORE UPDATE ON t_p23128842_inventory_cutlery_tr.inventory_entries
+FOR EACH ROW EXECUTE FUNCTION t_p23128842_inventory_cutlery_tr.touch_updated_at();
+
+-- Цепочка бэкапов: полный снимок и инкрементальные поверх него. horizon — xmin снимка
+-- выгрузки: всё, что закоммичено до него, в бэкап уже попало; следующий инкремент берёт
+-- изменения с xid >= horizon (строки транзакций, шедших во время выгрузки, придут повторно)
+CREATE TABLE IF NOT EXISTS t_p23128842_inventory_cutlery_tr.backup_manifests (
+    id SERIAL PRIMARY KEY,
+    kind VARCHAR(12) NOT NULL CHECK (kind IN ('full', 'incremental')),
+    parent_id INTEGER REFERENCES t_p23128842_inventory_cutlery_tr.backup_manifests (id),
+    since XID8,
+    horizon XID8 NOT NULL,
+    format VARCHAR(10) NOT NULL,
+    entries INTEGER,
+    deleted INTEGER,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CHECK ((kind = 'full') = (parent_id IS NULL))
+);
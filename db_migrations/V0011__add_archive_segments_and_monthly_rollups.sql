@@ -0,0 +1,32 @@
+-- Холодный архив: месяцы старше горизонта переносятся из inventory_entries в сжатые колоночные
+-- файлы (backend/archive). Один файл на месяц; ключ в хранилище меняется при каждой перезаписи,
+-- поэтому прочитанный файл можно держать в памяти, пока ключ в каталоге тот же
+CREATE TABLE IF NOT EXISTS t_p23128842_inventory_cutlery_tr.archive_segments (
+    month DATE PRIMARY KEY CHECK (month = date_trunc('month', month)::date),
+    storage_key VARCHAR(255) NOT NULL,
+    sha256 CHAR(64) NOT NULL,
+    entries INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    -- Заведения с записями в файле: чтение заведения без архивных записей файл не открывает
+    venue_ids INTEGER[] NOT NULL,
+    first_date DATE NOT NULL,
+    last_date DATE NOT NULL,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Итоги архивных месяцев по заведению и предмету; дневная сводка inventory_daily_stats за
+-- эти месяцы удаляется. loss — сумма уменьшений между записями внутри месяца: переход от
+-- последней записи прошлого месяца — это last_count прошлого минус first_count этого
+CREATE TABLE IF NOT EXISTS t_p23128842_inventory_cutlery_tr.inventory_monthly_rollups (
+    venue VARCHAR(50) NOT NULL,
+    month DATE NOT NULL,
+    item VARCHAR(32) NOT NULL,
+    days INTEGER NOT NULL,
+    first_count INTEGER NOT NULL,
+    last_count INTEGER NOT NULL,
+    min_count INTEGER NOT NULL,
+    max_count INTEGER NOT NULL,
+    avg_count NUMERIC(12, 2) NOT NULL,
+    loss INTEGER NOT NULL,
+    PRIMARY KEY (venue, month, item)
+);
@@ -0,0 +1,114 @@
+-- Окно пересчёта refresh_daily_stats заканчивалось на max(p_to + 29, N), где N — ближайший
+-- подсчёт после p_to. Если между p_to и N был пропуск, меняются delta и потеря дня N, а значит
+-- и окна 7/30 дней до N + 29 — они оставались устаревшими. Функция пересоздаётся с окном
+-- до max(p_to, N) + 29, сводка пересчитывается целиком.
+-- Пересчёт удаляет и заново вставляет окно ±30 дней: две параллельные записи одного заведения
+-- пересекаются по окнам, и вторая падала на первичном ключе inventory_daily_stats (её DELETE не
+-- видит ещё не закоммиченные строки первой). Теперь пересчёт заведения берёт advisory-блокировку
+-- до конца транзакции, а триггер обходит заведения по имени, чтобы блокировки брались в одном порядке
+
+CREATE OR REPLACE FUNCTION t_p23128842_inventory_cutlery_tr.refresh_daily_stats(
+    p_venue VARCHAR, p_from DATE, p_to DATE
+)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_venue_id INTEGER;
+    v_to DATE;
+    v_lower DATE;
+BEGIN
+    -- Запросы ниже выполняются уже после ожидания, и в READ COMMITTED видят строки параллельной записи
+    PERFORM pg_advisory_xact_lock(hashtext('inventory_daily_stats:' || p_venue));
+
+    SELECT id INTO v_venue_id FROM t_p23128842_inventory_cutlery_tr.venues WHERE name = p_venue;
+
+    -- От p_to зависят дни до ближайшего подсчёта N после него (delta N), а от потери дня N — окна до N + 29
+    SELECT GREATEST(p_to, COALESCE(min(entry_date), p_to)) + 29
+    INTO v_to
+    FROM t_p23128842_inventory_cutlery_tr.inventory_entries
+    WHERE venue_id = v_venue_id AND entry_date > p_to;
+
+    -- Окно 30 дней для p_from начинается с p_from - 29; для его delta нужен ещё предыдущий день
+    SELECT COALESCE(max(entry_date), p_from - 29)
+    INTO v_lower
+    FROM t_p23128842_inventory_cutlery_tr.inventory_entries
+    WHERE venue_id = v_venue_id AND entry_date < p_from - 29;
+
+    DELETE FROM t_p23128842_inventory_cutlery_tr.inventory_daily_stats
+    WHERE venue = p_venue AND entry_date BETWEEN p_from AND v_to;
+
+    INSERT INTO t_p23128842_inventory_cutlery_tr.inventory_daily_stats
+        (venue, entry_date, item, item_count, delta, loss, loss_7d, loss_30d)
+    WITH days AS (
+        -- (venue_id, entry_date) уникален: одна запись на день
+        SELECT entry_date, forks, knives, steak_knives, spoons, dessert_spoons,
+               ice_cooler, plates, sugar_tongs, ice_tongs, ashtrays
+        FROM t_p23128842_inventory_cutlery_tr.inventory_entries
+        WHERE venue_id = v_venue_id AND entry_date BETWEEN v_lower AND v_to
+    ), items AS (
+        SELECT d.entry_date, i.item, i.item_count,
+               i.item_count - LAG(i.item_count) OVER (PARTITION BY i.item ORDER BY d.entry_date) AS delta
+        FROM days d
+        CROSS JOIN LATERAL (VALUES
+            ('forks', d.forks), ('knives', d.knives), ('steak_knives', d.steak_knives),
+            ('spoons', d.spoons), ('dessert_spoons', d.dessert_spoons), ('ice_cooler', d.ice_cooler),
+            ('plates', d.plates), ('sugar_tongs', d.sugar_tongs), ('ice_tongs', d.ice_tongs),
+            ('ashtrays', d.ashtrays)
+        ) AS i(item, item_count)
+    ), losses AS (
+        SELECT entry_date, item, item_count, delta, GREATEST(-COALESCE(delta, 0), 0) AS loss
+        FROM items
+    ), rolling AS (
+        SELECT entry_date, item, item_count, delta, loss,
+               SUM(loss) OVER (PARTITION BY item ORDER BY entry_date
+                               RANGE BETWEEN INTERVAL '6 days' PRECEDING AND CURRENT ROW) AS loss_7d,
+               SUM(loss) OVER (PARTITION BY item ORDER BY entry_date
+                               RANGE BETWEEN INTERVAL '29 days' PRECEDING AND CURRENT ROW) AS loss_30d
+        FROM losses
+    )
+    SELECT p_venue, entry_date, item, item_count, delta, loss, loss_7d, loss_30d
+    FROM rolling
+    WHERE entry_date BETWEEN p_from AND v_to;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION t_p23128842_inventory_cutlery_tr.refresh_daily_stats_trigger()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    r RECORD;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        FOR r IN SELECT n.name AS venue, min(c.entry_date) AS date_from, max(c.entry_date) AS date_to
+                 FROM new_rows c
+                 JOIN t_p23128842_inventory_cutlery_tr.venues n ON n.id = c.venue_id
+                 GROUP BY n.name ORDER BY n.name LOOP
+            PERFORM t_p23128842_inventory_cutlery_tr.refresh_daily_stats(r.venue, r.date_from, r.date_to);
+        END LOOP;
+    ELSIF TG_OP = 'UPDATE' THEN
+        FOR r IN SELECT n.name AS venue, min(c.entry_date) AS date_from, max(c.entry_date) AS date_to
+                 FROM (SELECT venue_id, entry_date FROM new_rows
+                       UNION ALL
+                       SELECT venue_id, entry_date FROM old_rows) c
+                 JOIN t_p23128842_inventory_cutlery_tr.venues n ON n.id = c.venue_id
+                 GROUP BY n.name ORDER BY n.name LOOP
+            PERFORM t_p23128842_inventory_cutlery_tr.refresh_daily_stats(r.venue, r.date_from, r.date_to);
+        END LOOP;
+    ELSE
+        FOR r IN SELECT n.name AS venue, min(c.entry_date) AS date_from, max(c.entry_date) AS date_to
+                 FROM old_rows c
+                 JOIN t_p23128842_inventory_cutlery_tr.venues n ON n.id = c.venue_id
+                 GROUP BY n.name ORDER BY n.name LOOP
+            PERFORM t_p23128842_inventory_cutlery_tr.refresh_daily_stats(r.venue, r.date_from, r.date_to);
+        END LOOP;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+SELECT t_p23128842_inventory_cutlery_tr.refresh_daily_stats(v.name, min(e.entry_date), max(e.entry_date))
+FROM t_p23128842_inventory_cutlery_tr.inventory_entries e
+JOIN t_p23128842_inventory_cutlery_tr.venues v ON v.id = e.venue_id
+GROUP BY v.name;
@@ -0,0 +1,37 @@
+-- record_entry_changes из V0009 обращался к new_rows в общем для UPDATE и DELETE запросе;
+-- у триггера на DELETE такой таблицы переходов нет, и любое удаление записи падало с
+-- "relation new_rows does not exist". Запрос надгробий разделён по TG_OP
+
+CREATE OR REPLACE FUNCTION t_p23128842_inventory_cutlery_tr.record_entry_changes()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO t_p23128842_inventory_cutlery_tr.inventory_changes AS c (entry_id, venue, deleted)
+        SELECT r.id, n.name, TRUE FROM old_rows r
+        JOIN t_p23128842_inventory_cutlery_tr.venues n ON n.id = r.venue_id
+        ON CONFLICT (entry_id) DO UPDATE
+        SET venue = EXCLUDED.venue, deleted = TRUE,
+            xid = pg_current_xact_id(), changed_at = CURRENT_TIMESTAMP;
+    ELSIF TG_OP = 'UPDATE' THEN
+        -- При UPDATE надгробие получают только id, которых не осталось (upsert из бэкапа меняет id)
+        INSERT INTO t_p23128842_inventory_cutlery_tr.inventory_changes AS c (entry_id, venue, deleted)
+        SELECT r.id, n.name, TRUE FROM old_rows r
+        JOIN t_p23128842_inventory_cutlery_tr.venues n ON n.id = r.venue_id
+        WHERE r.id NOT IN (SELECT id FROM new_rows)
+        ON CONFLICT (entry_id) DO UPDATE
+        SET venue = EXCLUDED.venue, deleted = TRUE,
+            xid = pg_current_xact_id(), changed_at = CURRENT_TIMESTAMP;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        INSERT INTO t_p23128842_inventory_cutlery_tr.inventory_changes AS c (entry_id, venue, deleted)
+        SELECT r.id, n.name, FALSE FROM new_rows r
+        JOIN t_p23128842_inventory_cutlery_tr.venues n ON n.id = r.venue_id
+        ON CONFLICT (entry_id) DO UPDATE
+        SET venue = EXCLUDED.venue, deleted = FALSE,
+            xid = pg_current_xact_id(), changed_at = CURRENT_TIMESTAMP;
+    END IF;
+    RETURN NULL;
+END;
+$$;
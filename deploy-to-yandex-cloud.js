@@ -115,6 +115,7 @@ async function createZipArchive() {
     
     // Добавляем файлы
     archive.file('backend/inventory/index.py', { name: 'index.py' });
+    archive.file('backend/shared/inventory_common.py', { name: 'inventory_common.py' });
     archive.file('backend/inventory/requirements.txt', { name: 'requirements.txt' });
     
     archive.finalize();
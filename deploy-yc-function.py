@@ -1,33 +1,107 @@
 #!/usr/bin/env python3
 """
-Скрипт для развертывания Cloud Function в Yandex Cloud
-Использует Yandex Cloud API для создания/обновления функции
+Скрипт для развертывания Cloud Functions в Yandex Cloud
+Каждый каталог backend/<name> с index.py — отдельная функция <name>-api. Хеш исходников
+и настроек версии записывается в описание версии: функции без изменений пропускаются,
+поэтому повторный запуск после сбоя докатывает только то, что не успело развернуться.
+Архивы собираются и загружаются параллельно через одну HTTP-сессию с пулом соединений,
+операции опрашиваются с экспоненциально растущей паузой. URL функций пишутся в
+backend/func2url.json. YC_ZONE_INSTANCES_LIMIT задаёт функциям политику масштабирования: каждый
+экземпляр держит до DB_POOL_SIZE соединений, так что потолок экземпляров ограничивает и число
+соединений с Postgres, а лишние вызовы платформа отклоняет сама (429).
+Доступ и окружение версии задаются для каждой функции в FUNCTION_SETTINGS: публичные функции
+может вызвать кто угодно, остальные — только сервисный аккаунт (триггеры, другие функции).
+Доступ и политика масштабирования выставляются при каждом запуске, даже для функций без изменений.
+Переменные окружения берутся из окружения деплоя и входят в хеш версии.
+
+Запуск:
+  python deploy-yc-function.py                        # все функции из backend/
+  python deploy-yc-function.py inventory --vendor     # одна, с зависимостями внутри архива
+  python deploy-yc-function.py --force --jobs 8
+  python -m scripts.mock_yc_api --port 8900 &         # проверка без облака
+  YC_IAM_TOKEN=local YC_FOLDER_ID=folder DATABASE_URL=postgresql://localhost/inventory \\
+      python deploy-yc-function.py --api-base http://127.0.0.1:8900
 """
 
-import os
+import argparse
+import ast
+import base64
+import hashlib
 import json
+import os
+import sys
+import threading
 import time
-import base64
-import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
 import requests
-from io import BytesIO
-from datetime import datetime, timedelta
-import jwt
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from scripts.build_bundle import build_bundle
+from scripts.common import BACKEND_DIR, SHARED_DIR, function_names
 
 # Конфигурация
 FOLDER_ID = os.environ.get('YC_FOLDER_ID')
-SERVICE_ACCOUNT_KEY = json.loads(os.environ.get('YC_SERVICE_ACCOUNT_KEY'))
+SERVICE_ACCOUNT_KEY = json.loads(os.environ.get('YC_SERVICE_ACCOUNT_KEY') or 'null')
+# Готовый токен (yc iam create-token) вместо ключа сервисного аккаунта
+IAM_TOKEN = os.environ.get('YC_IAM_TOKEN')
+SERVICE_ACCOUNT_ID = (SERVICE_ACCOUNT_KEY or {}).get('service_account_id') or os.environ.get('YC_SERVICE_ACCOUNT_ID')
 DATABASE_URL = os.environ.get('DATABASE_URL')
+# Потолок экземпляров (и одновременных вызовов) функции в зоне; 0 — политика не задаётся
+ZONE_INSTANCES_LIMIT = int(os.environ.get('YC_ZONE_INSTANCES_LIMIT') or 0)
+
+# Хранилище холодного архива: функции, которые его читают или пишут
+ARCHIVE_ENV = ('ARCHIVE_URL', 'ARCHIVE_S3_ENDPOINT', 'AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY')
+# public — вызов без авторизации (allUsers); env — переменные сверх DATABASE_URL, передаются,
+# если заданы при деплое. Функции без записи здесь приватные и получают только DATABASE_URL
+FUNCTION_SETTINGS: Dict[str, Dict[str, Any]] = {
+    'inventory': {'public': True,
+                  'env': ARCHIVE_ENV + ('ARCHIVE_CACHE_SEGMENTS', 'CACHE_REDIS_URL', 'DB_POOL_SIZE',
+                                        'DB_POOL_MAX_WAITING', 'RATE_LIMIT_CLIENT_RPS', 'RATE_LIMIT_VENUE_RPS')},
+    # Выгрузка открыта фронтенду; восстановление (POST) требует X-Admin-Token
+    'backup': {'public': True, 'env': ARCHIVE_ENV + ('ADMIN_TOKEN', 'BACKUP_ITERSIZE')},
+    'report': {'public': True, 'env': ARCHIVE_ENV + ('REPORT_ITERSIZE',)},
+    # Перенос в архив запускает триггер-таймер от имени сервисного аккаунта
+    'archive': {'public': False, 'env': ARCHIVE_ENV + ('ADMIN_TOKEN', 'ARCHIVE_AFTER_MONTHS', 'ARCHIVE_MAX_MONTHS')},
+}
 
-FUNCTION_NAME = 'inventory-api'
-FUNCTION_DESCRIPTION = 'API для управления инвентаризацией приборов'
+FUNCTION_SUFFIX = '-api'
 RUNTIME = 'python311'
 ENTRYPOINT = 'index.handler'
 MEMORY_MB = 256
 TIMEOUT_SEC = 30
+MAX_DESCRIPTION = 256
+
+API_ENDPOINTS = {
+    'iam': 'https://iam.api.cloud.yandex.net',
+    'functions': 'https://serverless-functions.api.cloud.yandex.net',
+    'operations': 'https://operation.api.cloud.yandex.net',
+}
+FUNCTIONS_URL = 'https://functions.yandexcloud.net'
+FUNC2URL_PATH = BACKEND_DIR / 'func2url.json'
+
+DIGEST_PREFIX = 'sha256:'
+POLL_INITIAL_SEC = 0.5
+POLL_MAX_SEC = 10.0
+OPERATION_TIMEOUT_SEC = 300
 
-def get_iam_token():
+_print_lock = threading.Lock()
+
+
+def log(message: str) -> None:
+    with _print_lock:
+        print(message, flush=True)
+
+
+def get_iam_token(endpoints: Dict[str, str]) -> str:
     """Получить IAM токен используя Service Account Key"""
+    if IAM_TOKEN:
+        return IAM_TOKEN
+    import jwt
+
     now = int(time.time())
     payload = {
         'aud': 'https://iam.api.cloud.yandex.net/iam/v1/tokens',
@@ -35,7 +109,7 @@ def get_iam_token():
         'iat': now,
         'exp': now + 3600
     }
-    
+
     private_key = SERVICE_ACCOUNT_KEY['private_key']
     encoded_token = jwt.encode(
         payload,
@@ -43,232 +117,269 @@ def get_iam_token():
         algorithm='PS256',
         headers={'kid': SERVICE_ACCOUNT_KEY['id']}
     )
-    
-    response = requests.post(
-        'https://iam.api.cloud.yandex.net/iam/v1/tokens',
-        json={'jwt': encoded_token}
-    )
+
+    response = requests.post(f"{endpoints['iam']}/iam/v1/tokens", json={'jwt': encoded_token}, timeout=30)
     response.raise_for_status()
     return response.json()['iamToken']
 
-def create_zip_archive():
-    """Создать ZIP архив с кодом функции"""
-    zip_buffer = BytesIO()
-    
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        # Добавляем index.py
-        with open('backend/inventory/index.py', 'r') as f:
-            zip_file.writestr('index.py', f.read())
-        
-        # Добавляем requirements.txt
-        with open('backend/inventory/requirements.txt', 'r') as f:
-            zip_file.writestr('requirements.txt', f.read())
-    
-    zip_buffer.seek(0)
-    return zip_buffer.read()
-
-def find_existing_function(iam_token):
-    """Найти существующую функцию по имени"""
-    headers = {
-        'Authorization': f'Bearer {iam_token}',
-        'Content-Type': 'application/json'
-    }
-    
-    response = requests.get(
-        f'https://serverless-functions.api.cloud.yandex.net/functions/v1/functions',
-        headers=headers,
-        params={'folderId': FOLDER_ID}
-    )
-    
-    if response.status_code == 200:
-        functions = response.json().get('functions', [])
-        for func in functions:
-            if func['name'] == FUNCTION_NAME:
-                return func['id']
-    
-    return None
-
-def create_function(iam_token):
-    """Создать новую функцию"""
-    headers = {
-        'Authorization': f'Bearer {iam_token}',
-        'Content-Type': 'application/json'
-    }
-    
-    data = {
-        'folderId': FOLDER_ID,
-        'name': FUNCTION_NAME,
-        'description': FUNCTION_DESCRIPTION
-    }
-    
-    response = requests.post(
-        'https://serverless-functions.api.cloud.yandex.net/functions/v1/functions',
-        headers=headers,
-        json=data
-    )
-    response.raise_for_status()
-    
-    operation = response.json()
-    function_id = operation['metadata']['functionId']
-    print(f"✅ Функция создана: {function_id}")
-    return function_id
-
-def create_function_version(iam_token, function_id, zip_content):
-    """Создать новую версию функции с кодом"""
-    headers = {
-        'Authorization': f'Bearer {iam_token}'
-    }
-    
-    data = {
-        'functionId': function_id,
-        'runtime': RUNTIME,
-        'entrypoint': ENTRYPOINT,
-        'resources': {
-            'memory': MEMORY_MB * 1024 * 1024
-        },
-        'executionTimeout': f'{TIMEOUT_SEC}s',
-        'serviceAccountId': SERVICE_ACCOUNT_KEY['service_account_id'],
-        'environment': {
-            'DATABASE_URL': DATABASE_URL
-        },
-        'content': base64.b64encode(zip_content).decode('utf-8')
-    }
-    
-    response = requests.post(
-        f'https://serverless-functions.api.cloud.yandex.net/functions/v1/versions',
-        headers=headers,
-        json=data
-    )
-    response.raise_for_status()
-    
-    operation = response.json()
-    print(f"✅ Версия функции создана")
-    
-    # Ждем завершения операции
-    operation_id = operation['id']
-    return wait_for_operation(iam_token, operation_id)
-
-def wait_for_operation(iam_token, operation_id):
-    """Ожидание завершения операции"""
-    headers = {
-        'Authorization': f'Bearer {iam_token}'
-    }
-    
-    max_attempts = 60
-    for attempt in range(max_attempts):
-        response = requests.get(
-            f'https://operation.api.cloud.yandex.net/operations/{operation_id}',
-            headers=headers
-        )
-        
-        if response.status_code == 200:
-            operation = response.json()
-            
-            if operation.get('done'):
-                if 'error' in operation:
-                    raise Exception(f"Операция завершилась с ошибкой: {operation['error']}")
-                return operation.get('response', {})
-        
-        time.sleep(2)
-    
-    raise Exception("Timeout: операция не завершилась за отведенное время")
-
-def make_function_public(iam_token, function_id):
-    """Сделать функцию публично доступной"""
-    headers = {
-        'Authorization': f'Bearer {iam_token}',
-        'Content-Type': 'application/json'
-    }
-    
-    data = {
-        'functionId': function_id,
-        'invokeAction': 'ALLOW'
-    }
-    
-    response = requests.post(
-        f'https://serverless-functions.api.cloud.yandex.net/functions/v1/functions/{function_id}:setAccessBindings',
-        headers=headers,
-        json={
-            'accessBindings': [{
-                'roleId': 'functions.functionInvoker',
-                'subject': {'id': 'allUsers', 'type': 'system'}
-            }]
+
+class OperationFailed(Exception):
+    pass
+
+
+class YandexCloud:
+    """Клиент API Cloud Functions: одна сессия с пулом keep-alive соединений на все потоки"""
+
+    def __init__(self, iam_token: str, endpoints: Dict[str, str], pool_size: int):
+        self.endpoints = endpoints
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f'Bearer {iam_token}'
+        # 429 и 502–504 приходят до того, как запрос обработан, поэтому повторяются и POST
+        retry = Retry(total=4, backoff_factor=0.5, status_forcelist=(429, 502, 503, 504),
+                      allowed_methods=None, respect_retry_after_header=True)
+        adapter = HTTPAdapter(pool_connections=len(endpoints), pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def call(self, method: str, api: str, path: str, **kwargs: Any) -> Dict[str, Any]:
+        response = self.session.request(method, f'{self.endpoints[api]}{path}', timeout=60, **kwargs)
+        response.raise_for_status()
+        return response.json() if response.content else {}
+
+    def list_functions(self, folder_id: str) -> Dict[str, str]:
+        """Имя -> id всех функций каталога (со всех страниц)"""
+        functions: Dict[str, str] = {}
+        params = {'folderId': folder_id, 'pageSize': 1000}
+        while True:
+            page = self.call('GET', 'functions', '/functions/v1/functions', params=params)
+            for func in page.get('functions', []):
+                functions[func['name']] = func['id']
+            if not page.get('nextPageToken'):
+                return functions
+            params['pageToken'] = page['nextPageToken']
+
+    def wait_for_operation(self, operation: Dict[str, Any]) -> Dict[str, Any]:
+        """Ожидание завершения операции: пауза растёт от POLL_INITIAL_SEC до POLL_MAX_SEC"""
+        delay = POLL_INITIAL_SEC
+        deadline = time.monotonic() + OPERATION_TIMEOUT_SEC
+        while not operation.get('done'):
+            if time.monotonic() > deadline:
+                raise OperationFailed(f"Operation {operation['id']} did not finish in {OPERATION_TIMEOUT_SEC}s")
+            time.sleep(delay)
+            delay = min(delay * 2, POLL_MAX_SEC)
+            operation = self.call('GET', 'operations', f"/operations/{operation['id']}")
+        if 'error' in operation:
+            raise OperationFailed(f"Operation {operation['id']} failed: {operation['error']}")
+        return operation
+
+    def create_function(self, folder_id: str, name: str, description: str) -> str:
+        operation = self.call('POST', 'functions', '/functions/v1/functions',
+                              json={'folderId': folder_id, 'name': name, 'description': description})
+        function_id = operation['metadata']['functionId']
+        self.wait_for_operation(operation)
+        return function_id
+
+    def set_invokers(self, function_id: str, public: bool) -> None:
+        """Привязки заменяются целиком: функция, ставшая приватной, теряет доступ allUsers"""
+        if public:
+            subjects = [{'id': 'allUsers', 'type': 'system'}]
+        else:
+            subjects = [{'id': SERVICE_ACCOUNT_ID, 'type': 'serviceAccount'}] if SERVICE_ACCOUNT_ID else []
+        operation = self.call('POST', 'functions', f'/functions/v1/functions/{function_id}:setAccessBindings', json={
+            'accessBindings': [{'roleId': 'functions.functionInvoker', 'subject': subject} for subject in subjects]
+        })
+        self.wait_for_operation(operation)
+
+    def set_scaling_policy(self, function_id: str, instances: int) -> None:
+        """Экземпляр обслуживает один вызов за раз, поэтому лимит вызовов равен лимиту экземпляров"""
+        operation = self.call('POST', 'functions', f'/functions/v1/functions/{function_id}:setScalingPolicy', json={
+            'functionId': function_id,
+            'tag': '$latest',
+            'zoneInstancesLimit': instances,
+            'zoneRequestsLimit': instances
+        })
+        self.wait_for_operation(operation)
+
+    def latest_version(self, function_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            return self.call('GET', 'functions', '/functions/v1/versions:byTag',
+                             params={'functionId': function_id, 'tag': '$latest'})
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return None
+            raise
+
+    def create_version(self, function_id: str, zip_content: bytes, digest: str,
+                       environment: Dict[str, str]) -> Dict[str, Any]:
+        data = {
+            'functionId': function_id,
+            'runtime': RUNTIME,
+            'entrypoint': ENTRYPOINT,
+            'description': f'{DIGEST_PREFIX}{digest}',
+            'resources': {
+                'memory': MEMORY_MB * 1024 * 1024
+            },
+            'executionTimeout': f'{TIMEOUT_SEC}s',
+            'environment': environment,
+            'content': base64.b64encode(zip_content).decode('utf-8')
         }
-    )
-    
-    if response.status_code in [200, 201]:
-        print(f"✅ Функция сделана публичной")
-    else:
-        print(f"⚠️  Не удалось сделать функцию публичной: {response.text}")
+        if SERVICE_ACCOUNT_ID:
+            data['serviceAccountId'] = SERVICE_ACCOUNT_ID
+        operation = self.call('POST', 'functions', '/functions/v1/versions', json=data)
+        return self.wait_for_operation(operation).get('response', {})
+
+
+def function_description(name: str) -> str:
+    """Первая строка docstring index.py"""
+    docstring = ast.get_docstring(ast.parse((BACKEND_DIR / name / 'index.py').read_text(encoding='utf-8'))) or name
+    return docstring.splitlines()[0].removeprefix('Business:').strip()[:MAX_DESCRIPTION]
+
+
+def function_settings(name: str) -> Dict[str, Any]:
+    return FUNCTION_SETTINGS.get(name, {'public': False, 'env': ()})
+
+
+def function_environment(name: str) -> Dict[str, str]:
+    """Окружение версии: DATABASE_URL и заданные при деплое переменные из настроек функции"""
+    environment = {'DATABASE_URL': DATABASE_URL}
+    for variable in function_settings(name)['env']:
+        if os.environ.get(variable):
+            environment[variable] = os.environ[variable]
+    return environment
+
+
+def source_digest(name: str, vendor: bool) -> str:
+    """Хеш того, что попадает в версию: исходники, requirements.txt и настройки (окружение — только хешем)"""
+    digest = hashlib.sha256()
+    settings = [RUNTIME, ENTRYPOINT, MEMORY_MB, TIMEOUT_SEC, vendor, SERVICE_ACCOUNT_ID,
+                function_settings(name)['public'], sorted(function_environment(name).items())]
+    if ZONE_INSTANCES_LIMIT:
+        settings.append(ZONE_INSTANCES_LIMIT)
+    digest.update(json.dumps(settings).encode('utf-8'))
+    source_dir = BACKEND_DIR / name
+    for path in sorted(SHARED_DIR.glob('*.py')) + sorted(source_dir.glob('*.py')) + [source_dir / 'requirements.txt']:
+        if path.exists():
+            digest.update(f'\0{path.name}\0'.encode('utf-8'))
+            digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def create_zip_archive(name: str, vendor: bool = False) -> bytes:
+    """Создать ZIP архив с кодом функции; с vendor — зависимости внутри, см. scripts/build_bundle.py"""
+    return build_bundle(name, vendor=vendor, compile_pyc=vendor)
+
 
-def get_function_url(function_id):
+def get_function_url(function_id: str, base: str = FUNCTIONS_URL) -> str:
     """Получить HTTP URL функции"""
-    return f"https://functions.yandexcloud.net/{function_id}"
+    return f'{base}/{function_id}'
+
+
+def apply_access(cloud: YandexCloud, function_id: str, name: str) -> None:
+    """Доступ и лимит экземпляров — не часть версии: выставляются при каждом запуске, в том числе
+    когда версия не менялась (иначе сбой после create_version оставил бы прежний доступ навсегда)"""
+    cloud.set_invokers(function_id, function_settings(name)['public'])
+    if ZONE_INSTANCES_LIMIT:
+        cloud.set_scaling_policy(function_id, ZONE_INSTANCES_LIMIT)
+
+
+def deploy_function(cloud: YandexCloud, name: str, existing: Dict[str, str], vendor: bool,
+                    force: bool) -> Dict[str, Any]:
+    started = time.perf_counter()
+    cloud_name = f'{name}{FUNCTION_SUFFIX}'
+    digest = source_digest(name, vendor)
+    function_id = existing.get(cloud_name)
+
+    if function_id is None:
+        log(f'📝 {name}: создаю функцию {cloud_name}...')
+        function_id = cloud.create_function(FOLDER_ID, cloud_name, function_description(name))
+        status = 'created'
+    else:
+        latest = None if force else cloud.latest_version(function_id)
+        if latest and latest.get('description') == f'{DIGEST_PREFIX}{digest}':
+            apply_access(cloud, function_id, name)
+            log(f'⏭️  {name}: без изменений (версия {latest.get("id")})')
+            return {'name': name, 'status': 'unchanged', 'function_id': function_id,
+                    'seconds': round(time.perf_counter() - started, 2)}
+        status = 'updated'
+
+    zip_content = create_zip_archive(name, vendor=vendor)
+    log(f'📦 {name}: архив {len(zip_content)} байт, загружаю версию...')
+    version = cloud.create_version(function_id, zip_content, digest, function_environment(name))
+    apply_access(cloud, function_id, name)
+    log(f'✅ {name}: {status}, версия {version.get("id", "?")}')
+    return {'name': name, 'status': status, 'function_id': function_id, 'size': len(zip_content),
+            'seconds': round(time.perf_counter() - started, 2)}
+
+
+def update_func2url(path: Path, urls: Dict[str, str]) -> None:
+    mapping = json.loads(path.read_text(encoding='utf-8')) if path.exists() else {}
+    mapping.update(urls)
+    path.write_text(json.dumps(mapping, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('functions', nargs='*', help='каталоги из backend/; по умолчанию все')
+    parser.add_argument('--vendor', action='store_true', help='зависимости внутри архива')
+    parser.add_argument('--force', action='store_true', help='новая версия даже без изменений')
+    parser.add_argument('--jobs', type=int, default=4, help='функций одновременно')
+    parser.add_argument('--api-base', default=None, help='один адрес для всех API (локальный мок)')
+    parser.add_argument('--functions-url', default=None, help='префикс URL функций для func2url.json')
+    parser.add_argument('--func2url', type=Path, default=FUNC2URL_PATH)
+    args = parser.parse_args()
+
+    available = function_names()
+    names = args.functions or available
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        print(f"❌ Нет таких функций в backend/: {', '.join(unknown)}")
+        return 2
 
-def main():
-    print("🚀 Начинаю развертывание функции в Yandex Cloud...\n")
-    
     # Проверка переменных окружения
-    if not FOLDER_ID or not SERVICE_ACCOUNT_KEY or not DATABASE_URL:
+    if not FOLDER_ID or not (SERVICE_ACCOUNT_KEY or IAM_TOKEN) or not DATABASE_URL:
         print("❌ Ошибка: не заданы необходимые переменные окружения")
         print("   YC_FOLDER_ID:", "✅" if FOLDER_ID else "❌")
-        print("   YC_SERVICE_ACCOUNT_KEY:", "✅" if SERVICE_ACCOUNT_KEY else "❌")
+        print("   YC_SERVICE_ACCOUNT_KEY или YC_IAM_TOKEN:", "✅" if SERVICE_ACCOUNT_KEY or IAM_TOKEN else "❌")
         print("   DATABASE_URL:", "✅" if DATABASE_URL else "❌")
-        return
-    
-    try:
-        # Получаем IAM токен
-        print("🔑 Получаю IAM токен...")
-        iam_token = get_iam_token()
-        print("✅ IAM токен получен\n")
-        
-        # Создаем ZIP архив с кодом
-        print("📦 Создаю ZIP архив с кодом...")
-        zip_content = create_zip_archive()
-        print(f"✅ Архив создан ({len(zip_content)} байт)\n")
-        
-        # Проверяем существующую функцию
-        print("🔍 Проверяю существующие функции...")
-        function_id = find_existing_function(iam_token)
-        
-        if function_id:
-            print(f"✅ Найдена существующая функция: {function_id}\n")
-        else:
-            print("📝 Создаю новую функцию...")
-            function_id = create_function(iam_token)
-            print()
-        
-        # Создаем новую версию функции
-        print("🔄 Загружаю код функции...")
-        version = create_function_version(iam_token, function_id, zip_content)
-        print()
-        
-        # Делаем функцию публичной
-        print("🌐 Делаю функцию публично доступной...")
-        make_function_public(iam_token, function_id)
-        print()
-        
-        # Получаем URL
-        function_url = get_function_url(function_id)
-        
-        print("=" * 60)
-        print("✅ РАЗВЕРТЫВАНИЕ ЗАВЕРШЕНО!")
-        print("=" * 60)
-        print(f"\n📍 URL функции: {function_url}")
-        print(f"\n💡 Используй этот URL в своем приложении вместо старого")
-        print(f"\nПример запроса:")
-        print(f"  GET {function_url}?venue=PORT")
-        print()
-        
-        # Сохраняем URL в файл
-        with open('yc-function-url.txt', 'w') as f:
-            f.write(function_url)
-        print("📝 URL сохранен в файл: yc-function-url.txt\n")
-        
-    except Exception as e:
-        print(f"\n❌ Ошибка: {e}")
-        import traceback
-        traceback.print_exc()
+        return 2
+
+    endpoints = {api: args.api_base for api in API_ENDPOINTS} if args.api_base else dict(API_ENDPOINTS)
+    functions_url = args.functions_url or (f'{args.api_base}/functions' if args.api_base else FUNCTIONS_URL)
+    print(f"🚀 Развертывание {', '.join(names)} ({args.jobs} одновременно)\n", flush=True)
+    started = time.perf_counter()
+
+    cloud = YandexCloud(get_iam_token(endpoints), endpoints, pool_size=args.jobs)
+    existing = cloud.list_functions(FOLDER_ID)
+
+    results: List[Dict[str, Any]] = []
+    failed: Dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        futures = {executor.submit(deploy_function, cloud, name, existing, args.vendor, args.force): name
+                   for name in names}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results.append(future.result())
+            except Exception as e:
+                failed[name] = str(e)
+                log(f'❌ {name}: {e}')
+
+    if results:
+        update_func2url(args.func2url, {result['name']: get_function_url(result['function_id'], functions_url)
+                                        for result in sorted(results, key=lambda r: r['name'])})
+
+    print("\n" + "=" * 60)
+    for result in sorted(results, key=lambda r: r['name']):
+        print(f"{result['name']:<20} {result['status']:<10} {result['seconds']:>6.2f}s  "
+              f"{get_function_url(result['function_id'], functions_url)}")
+    for name, error in sorted(failed.items()):
+        print(f"{name:<20} {'failed':<10} {error}")
+    print("=" * 60)
+    print(f"⏱️  {time.perf_counter() - started:.1f}s" + (f"; URL записаны в {args.func2url}" if results else ""))
+    if failed:
+        print("💡 Повторный запуск развернёт только незавершённые функции")
+    return 1 if failed else 0
+
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
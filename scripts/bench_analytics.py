@@ -0,0 +1,161 @@
+'''
+Бенчмарк action=analytics в backend/inventory: векторный расчёт по кубу заведения × дни ×
+предметы (build_analytics) против построчного расчёта на чистом Python с той же
+семантикой. История синтетическая — случайное блуждание остатков с пропусками дней,
+редкими пустыми ashtrays и всплесками потерь. С --dsn к расчёту добавляется загрузка
+из Postgres через COPY (база пересоздаётся и заполняется scripts.common.seed_entries).
+
+Запуск:
+  python -m scripts.bench_analytics --venues 100,300 --years 1,3 --repeat 5
+  BENCH_DATABASE_URL=postgresql://localhost/bench python -m scripts.bench_analytics --venues 300 --years 3
+'''
+
+import argparse
+import json
+import math
+import os
+import time
+import tracemalloc
+from collections import deque
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from scripts.common import connect, guard_dsn, load_function, reset_schema, seed_entries, venue_names
+
+WINDOW = 7
+THRESHOLD = 3.0
+
+
+def synthetic_history(np, venues: int, days: int, seed: int = 42):
+    """Строки как у load_history: индекс заведения, день, 10 счётчиков (-1 — нет значения)"""
+    rng = np.random.default_rng(seed)
+    items = 10
+    steps = rng.integers(-3, 3, size=(venues, days, items))
+    steps[rng.random((venues, days, items)) < 0.002] -= 25
+    counts = np.maximum(200 + np.cumsum(steps, axis=1), 0)
+    present = rng.random((venues, days)) > 0.15
+    venue_index, day_index = np.nonzero(present)
+    values = counts[venue_index, day_index]
+    values[:, 9][rng.random(len(values)) < 0.05] = -1
+    return np.column_stack([venue_index, day_index, values]).astype(np.int64)
+
+
+def python_reference(history: List[List[int]], venues: int, days: int, report_from: int) -> Dict[str, Any]:
+    """Тот же расчёт циклами по рядам: дельта к предыдущей записи, скользящая сумма потерь, z-оценки"""
+    by_series: Dict[Tuple[int, int], List[Tuple[int, int]]] = {}
+    for row in history:
+        for item, value in enumerate(row[2:]):
+            if value >= 0:
+                by_series.setdefault((row[0], item), []).append((row[1], value))
+    anomalies = 0
+    for points in by_series.values():
+        points.sort()
+        losses: List[Tuple[int, int]] = []
+        rolling: deque = deque()
+        rolling_sum = 0
+        previous: Optional[int] = None
+        for day, value in points:
+            if previous is not None:
+                loss = max(previous - value, 0)
+                rolling.append((day, loss))
+                rolling_sum += loss
+                while rolling and rolling[0][0] <= day - WINDOW:
+                    rolling_sum -= rolling.popleft()[1]
+                if day >= report_from:
+                    losses.append((day, loss))
+            previous = value
+        if not losses:
+            continue
+        mean = sum(loss for _, loss in losses) / len(losses)
+        spread = math.sqrt(sum((loss - mean) ** 2 for _, loss in losses) / len(losses))
+        anomalies += sum(1 for _, loss in losses if loss > 0 and spread and (loss - mean) / spread >= THRESHOLD)
+    return {'series': len(by_series), 'anomalies': anomalies}
+
+
+def measure(run, repeat: int) -> Dict[str, float]:
+    """Время — без трассировки (tracemalloc замедляет выделения numpy), пик памяти — отдельным прогоном"""
+    run()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    timings.sort()
+    return {'best_ms': round(timings[0], 1), 'median_ms': round(timings[len(timings) // 2], 1),
+            'peak_mb': round(peak / 2 ** 20, 1)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--venues', default='100,300', help='числа заведений через запятую')
+    parser.add_argument('--years', default='1,3', help='глубина истории в годах через запятую')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--python-limit', type=int, default=2_000_000,
+                        help='построчный расчёт только до стольких ячеек заведение × день × предмет')
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_DATABASE_URL'))
+    parser.add_argument('--output', default='bench-analytics.json')
+    args = parser.parse_args()
+
+    inventory = load_function('inventory')
+    np = inventory.np_module()
+    end = date.today()
+    results: List[Dict[str, Any]] = []
+    print(f"{'venues':>6} {'years':>5} {'rows':>9} {'numpy':>12} {'peak':>8} {'python':>12}  anomalies")
+    for venue_count in (int(value) for value in args.venues.split(',')):
+        for years in (int(value) for value in args.years.split(',')):
+            date_from = (end - timedelta(days=365 * years - 1)).isoformat()
+            lower = inventory.analytics_lower_bound(date_from, WINDOW)
+            days = (end - lower).days + 1
+            history = synthetic_history(np, venue_count, days)
+            names = venue_names(venue_count)
+            report = inventory.build_analytics(names, history, lower, date_from, end.isoformat(), WINDOW, THRESHOLD)
+            anomalies = sum(len(item['anomalies']) for venue in report['venues'].values()
+                            for item in venue['items'].values())
+            step: Dict[str, Any] = {
+                'venues': venue_count, 'years': years, 'rows': len(history), 'anomalies': anomalies,
+                'numpy': measure(lambda: inventory.build_analytics(names, history, lower, date_from,
+                                                                   end.isoformat(), WINDOW, THRESHOLD), args.repeat),
+            }
+            if venue_count * days * 10 <= args.python_limit:
+                rows = history.tolist()
+                offset = (date.fromisoformat(date_from) - lower).days
+                reference = python_reference(rows, venue_count, days, offset)
+                step['python'] = measure(lambda: python_reference(rows, venue_count, days, offset), 1)
+                step['python_anomalies'] = reference['anomalies']
+            python_ms = f"{step['python']['best_ms']:>10.1f}ms" if 'python' in step else f"{'-':>12}"
+            print(f"{venue_count:>6} {years:>5} {len(history):>9} {step['numpy']['best_ms']:>10.1f}ms "
+                  f"{step['numpy']['peak_mb']:>6.1f}MB {python_ms}  {anomalies}"
+                  + (f" (python {step['python_anomalies']})" if 'python' in step else ''), flush=True)
+            results.append(step)
+
+    report_db = None
+    if args.dsn:
+        dsn = guard_dsn(args.dsn)
+        venue_count, years = max(int(v) for v in args.venues.split(',')), max(int(y) for y in args.years.split(','))
+        print(f'\nseeding {venue_count} venues x {years} years into Postgres...', flush=True)
+        conn = connect(dsn)
+        reset_schema(conn)
+        seed_entries(conn, venue_count * 365 * years, venue_names(venue_count), end)
+        conn.autocommit = True
+        date_from = (end - timedelta(days=365 * years - 1)).isoformat()
+        report_db = {
+            'venues': venue_count, 'years': years,
+            'load_and_compute': measure(lambda: inventory.venue_analytics(conn, None, date_from, end.isoformat(),
+                                                                          WINDOW, THRESHOLD), args.repeat),
+        }
+        conn.close()
+        print(f"load + compute from Postgres: {report_db['load_and_compute']['best_ms']:.1f}ms "
+              f"(peak {report_db['load_and_compute']['peak_mb']:.1f}MB)")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'window': WINDOW, 'threshold': THRESHOLD, 'steps': results, 'postgres': report_db,
+                   'created_at': time.strftime('%Y-%m-%dT%H:%M:%S')}, f, ensure_ascii=False, indent=2)
+    print(f'\nresults saved to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
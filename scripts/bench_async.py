@@ -0,0 +1,114 @@
+'''
+Последовательные и параллельные чтения нескольких заведений: обычный путь handler
+inventory (один LATERAL-запрос на psycopg2), цикл list_entries по заведению и путь
+DB_ASYNC=1 — по запросу на заведение, одновременно на asyncpg-пуле. Для сводки
+aggregates сравниваются те же LATERAL и asyncpg-варианты list_daily_stats.
+База пересоздаётся и заполняется scripts.common.seed_entries; нужен установленный asyncpg.
+
+Запуск:
+  BENCH_DATABASE_URL=postgresql://localhost/bench python -m scripts.bench_async \
+      --scale 1000000 --venues 2,8,32 --pool-size 8 --output async.json
+'''
+
+import argparse
+import json
+import os
+import random
+import time
+from datetime import date
+from typing import Any, Callable, Dict, List
+
+from scripts.common import connect, guard_dsn, load_function, percentile, reset_schema, seed_entries, venue_names
+
+
+def measure(run: Callable[[], Any], iterations: int, warmup: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    for i in range(warmup + iterations):
+        started = time.perf_counter()
+        run()
+        if i >= warmup:
+            latencies.append((time.perf_counter() - started) * 1000)
+    return {
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+    }
+
+
+def load_inventory(dsn: str, async_mode: bool, pool_size: int):
+    """Модуль читает DB_ASYNC при импорте, поэтому каждый вариант — отдельная загрузка"""
+    os.environ['DATABASE_URL'] = dsn
+    os.environ['DB_ASYNC_POOL_SIZE'] = str(pool_size)
+    if async_mode:
+        os.environ['DB_ASYNC'] = '1'
+    else:
+        os.environ.pop('DB_ASYNC', None)
+    module = load_function('inventory')
+    if async_mode and module.get_async_db() is None:
+        raise SystemExit('asyncpg is not installed: pip install asyncpg')
+    return module
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_DATABASE_URL'))
+    parser.add_argument('--scale', type=int, default=1_000_000, help='количество записей')
+    parser.add_argument('--total-venues', type=int, default=64, help='заведений в базе')
+    parser.add_argument('--venues', default='2,8,32', help='заведений в одном запросе, через запятую')
+    parser.add_argument('--limit', type=int, default=50, help='записей на заведение')
+    parser.add_argument('--pool-size', type=int, default=8, help='соединений asyncpg-пула')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--skip-seed', action='store_true', help='использовать уже заполненную базу')
+    parser.add_argument('--output', default='bench-async.json')
+    args = parser.parse_args()
+
+    dsn = guard_dsn(args.dsn)
+    all_venues = venue_names(args.total_venues)
+    if not args.skip_seed:
+        print(f'seeding {args.scale} entries, {len(all_venues)} venues...', flush=True)
+        conn = connect(dsn)
+        reset_schema(conn)
+        seed_entries(conn, args.scale, all_venues, date.today())
+        conn.close()
+
+    serial = load_inventory(dsn, False, args.pool_size)
+    concurrent = load_inventory(dsn, True, args.pool_size)
+    pool = serial.get_pool()
+    rng = random.Random(42)
+
+    def with_conn(fn: Callable[[Any], Any]) -> Callable[[], Any]:
+        return lambda: pool.run(fn)
+
+    report: Dict[str, Any] = {
+        'meta': {'scale': args.scale, 'total_venues': len(all_venues), 'limit': args.limit,
+                 'pool_size': args.pool_size, 'iterations': args.iterations,
+                 'created_at': time.strftime('%Y-%m-%dT%H:%M:%S')},
+        'steps': [],
+    }
+    print(f"\n{'venues':>6} {'path':<14} {'p50':>10} {'p95':>10} {'p99':>10}")
+    for count in (int(value) for value in args.venues.split(',')):
+        names = rng.sample(all_venues, min(count, len(all_venues)))
+        limit = args.limit
+        variants = {
+            'entries lateral': with_conn(lambda conn: serial.list_venues_entries(conn, names, limit=limit)),
+            'entries loop': with_conn(lambda conn: [serial.list_entries(conn, name, limit=limit) for name in names]),
+            'entries async': lambda: concurrent.list_venues_entries(None, names, limit=limit),
+            'stats lateral': with_conn(lambda conn: serial.list_daily_stats(conn, names, None, None)),
+            'stats async': lambda: concurrent.list_daily_stats(None, names, None, None),
+        }
+        step: Dict[str, Any] = {'venues': len(names), 'paths': {}}
+        for path, run in variants.items():
+            result = measure(run, args.iterations, args.warmup)
+            step['paths'][path] = result
+            print(f"{len(names):>6} {path:<14} {result['p50_ms']:>8.3f}ms {result['p95_ms']:>8.3f}ms "
+                  f"{result['p99_ms']:>8.3f}ms", flush=True)
+        report['steps'].append(step)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'\nresults saved to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+'''
+Бенчмарк кодирования строк записей в JSON: прежний путь (dict на строку + json.dumps)
+против RowCodec из backend/inventory и backend/backup, с orjson и без него.
+База данных не нужна — строки синтетические, той же формы, что отдаёт SELECT.
+
+Запуск:
+  python -m scripts.bench_codec --rows 100000 --repeat 5
+'''
+
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+from datetime import date, timedelta
+from typing import Any, Callable, List, Tuple
+
+from scripts.common import load_function
+
+NAMES = ('Иван Петров', 'Мария Смирнова', 'Alex "Night" Shift', None)
+VENUES = ('PORT', 'Диккенс')
+
+
+def synthetic_rows(count: int, seed: int = 42) -> List[Tuple[Any, ...]]:
+    rng = random.Random(seed)
+    start = date(2020, 1, 1)
+    rows = []
+    for n in range(count):
+        day = (start + timedelta(days=n // len(VENUES))).isoformat()
+        counters = tuple(rng.randint(0, 300) for _ in range(9)) + (rng.choice((None, rng.randint(0, 50))),)
+        rows.append((n + 1, VENUES[n % len(VENUES)], day) + counters
+                    + (rng.choice(NAMES), day, f'{day} 21:{n % 60:02d}:00.123456+03'))
+    return rows
+
+
+def best_of(fn: Callable[[], Any], repeat: int) -> Tuple[float, Any]:
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def peak_alloc_mb(fn: Callable[[], Any]) -> float:
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    inventory = load_function('inventory')
+    backup = load_function('backup')
+    rows = synthetic_rows(args.rows)
+    keys = inventory.ENTRY_CODEC.keys
+    # В бэкапе есть ещё updated_at
+    backup_rows = [row + (row[-1],) for row in rows]
+    backup_keys = backup.ENTRY_CODEC.keys
+
+    variants = [
+        ('inventory: dict + json.dumps', 'json',
+         lambda: json.dumps([dict(zip(keys, row)) for row in rows])),
+        ('inventory: RowCodec', 'json',
+         lambda: inventory.RowCodec(inventory.ENTRY_SCHEMA, use_orjson=False).encode_rows(rows)),
+        ('backup ndjson: dict + json.dumps', 'ndjson',
+         lambda: '\n'.join(json.dumps(dict(zip(backup_keys, row)), ensure_ascii=False) for row in backup_rows)),
+        ('backup ndjson: RowCodec', 'ndjson',
+         lambda: backup.RowCodec(backup.ENTRY_SCHEMA, ensure_ascii=False, use_orjson=False)
+         .join_rows(backup_rows, '\n')),
+    ]
+    if inventory._orjson() is not None:
+        variants[2:2] = [('inventory: RowCodec + orjson', 'json',
+                          lambda: inventory.RowCodec(inventory.ENTRY_SCHEMA).encode_rows(rows))]
+        variants.append(('backup ndjson: RowCodec + orjson', 'ndjson',
+                         lambda: backup.RowCodec(backup.ENTRY_SCHEMA).join_rows(backup_rows, '\n')))
+    else:
+        print('orjson не установлен — варианты с ним пропущены')
+
+    expected = {
+        'json': [dict(zip(keys, row)) for row in rows],
+        'ndjson': [dict(zip(backup_keys, row)) for row in backup_rows],
+    }
+    print(f'{args.rows} строк, лучший из {args.repeat} прогонов\n')
+    print(f'{"вариант":36} {"нс/строку":>10} {"всего, мс":>10} {"МБ ответа":>10} {"пик, МБ":>9}')
+    for label, kind, fn in variants:
+        seconds, output = best_of(fn, args.repeat)
+        decoded = json.loads(output) if kind == 'json' else [json.loads(line) for line in output.splitlines()]
+        if decoded != expected[kind]:
+            raise SystemExit(f'{label}: результат отличается от json.dumps')
+        print(f'{label:36} {seconds * 1e9 / args.rows:10.0f} {seconds * 1000:10.1f} '
+              f'{len(output.encode("utf-8")) / 1024 / 1024:10.2f} {peak_alloc_mb(fn):9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+'''
+Бенчмарк handler облачных функций на локальном Postgres
+Схема создаётся миграциями из db_migrations/, данные — синтетические через COPY.
+Каждый сценарий запускается в отдельном процессе: первый вызов — холодный старт,
+пиковая RSS меряется для сценария отдельно.
+
+Запуск:
+  BENCH_DATABASE_URL=postgresql://localhost/bench python -m scripts.bench_handlers \
+      --scales 1000,100000,1000000 --output bench-results.json
+  python -m scripts.bench_handlers --compare bench-results.json --output new.json
+'''
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from scripts.common import (
+    FunctionContext, connect, guard_dsn, load_function, make_event, peak_rss_mb,
+    percentile, reset_schema, seed_entries, venue_names,
+)
+
+ENTRY_BODY = {
+    'venue': 'PORT', 'forks': 100, 'knives': 90, 'steakKnives': 40, 'spoons': 95,
+    'dessertSpoons': 80, 'iceCooler': 3, 'plates': 120, 'sugarTongs': 5, 'iceTongs': 4,
+    'ashtrays': 10, 'responsible_name': 'Бенчмарк',
+}
+FUTURE = date(2100, 1, 1)
+
+
+def _future_day(n: int) -> str:
+    return (FUTURE + timedelta(days=n)).isoformat()
+
+
+class Scenario:
+    """Сценарий: функция, фабрика событий и необязательная подготовка состояния"""
+
+    def __init__(self, name: str, function: str, event: Callable[[int, Any], Dict[str, Any]],
+                 setup: Optional[Callable[[Any, int], Any]] = None, heavy: bool = False):
+        self.name = name
+        self.function = function
+        self.event = event
+        self.setup = setup
+        self.heavy = heavy
+
+
+def _setup_etag(handler, iterations: int) -> str:
+    response = handler(make_event('GET', {'venue': 'PORT'}), FunctionContext('inventory'))
+    return response['headers']['ETag']
+
+
+def _setup_deletable(handler, iterations: int) -> List[int]:
+    ids: List[int] = []
+    for start in range(0, iterations, 500):
+        batch = [dict(ENTRY_BODY, date=_future_day(50000 + n)) for n in range(start, min(iterations, start + 500))]
+        response = handler(make_event('POST', body={'entries': batch}), FunctionContext('inventory'))
+        ids.extend(entry['id'] for entry in json.loads(response['body'])['entries'])
+    return ids
+
+
+def _setup_updatable(handler, iterations: int) -> int:
+    response = handler(make_event('POST', body=dict(ENTRY_BODY, date=_future_day(90000))), FunctionContext('inventory'))
+    return json.loads(response['body'])['entry']['id']
+
+
+def build_scenarios() -> List[Scenario]:
+    month_ago = (date.today() - timedelta(days=30)).isoformat()
+    return [
+        Scenario('inventory GET venue (full history)', 'inventory',
+                 lambda i, s: make_event('GET', {'venue': 'PORT'})),
+        Scenario('inventory GET venue page (limit=50)', 'inventory',
+                 lambda i, s: make_event('GET', {'venue': 'PORT', 'limit': '50'})),
+        Scenario('inventory GET venue last 30 days', 'inventory',
+                 lambda i, s: make_event('GET', {'venue': 'PORT', 'from': month_ago})),
+        Scenario('inventory GET all venues (limit=30)', 'inventory',
+                 lambda i, s: make_event('GET', {'venue': '*', 'limit': '30'})),
+        Scenario('inventory GET conditional (304)', 'inventory',
+                 lambda i, etag: make_event('GET', {'venue': 'PORT'}, headers={'If-None-Match': etag}),
+                 setup=_setup_etag),
+        Scenario('inventory GET aggregates', 'inventory',
+                 lambda i, s: make_event('GET', {'action': 'aggregates', 'venue': 'PORT'})),
+        Scenario('inventory POST single', 'inventory',
+                 lambda i, s: make_event('POST', body=dict(ENTRY_BODY, date=_future_day(i)))),
+        Scenario('inventory POST batch (50)', 'inventory',
+                 lambda i, s: make_event('POST', body={'entries': [
+                     dict(ENTRY_BODY, date=_future_day(10000 + i * 50 + n)) for n in range(50)
+                 ]})),
+        Scenario('inventory PUT', 'inventory',
+                 lambda i, entry_id: make_event('PUT', body=dict(ENTRY_BODY, id=entry_id, date=_future_day(90000),
+                                                                 forks=i % 200)),
+                 setup=_setup_updatable),
+        Scenario('inventory DELETE', 'inventory',
+                 lambda i, ids: make_event('DELETE', {'id': str(ids[i])}),
+                 setup=_setup_deletable),
+        Scenario('backup export json', 'backup',
+                 lambda i, s: make_event('GET'), heavy=True),
+        Scenario('backup export ndjson+gzip', 'backup',
+                 lambda i, s: make_event('GET', {'format': 'ndjson', 'compress': 'gzip'}), heavy=True),
+    ]
+
+
+def run_scenario(job: Tuple[str, str, int, int]) -> Dict[str, Any]:
+    """Выполняется в дочернем процессе: холодный старт + замеры одного сценария"""
+    dsn, name, iterations, warmup = job
+    os.environ['DATABASE_URL'] = dsn
+    scenario = next(s for s in build_scenarios() if s.name == name)
+    
+    started = time.perf_counter()
+    module = load_function(scenario.function)
+    import_ms = (time.perf_counter() - started) * 1000
+    handler = module.handler
+    
+    state = scenario.setup(handler, iterations + warmup) if scenario.setup else None
+    
+    statuses: Dict[str, int] = {}
+    latencies: List[float] = []
+    cold_ms = None
+    for i in range(warmup + iterations):
+        event = scenario.event(i, state)
+        t0 = time.perf_counter()
+        response = handler(event, FunctionContext(scenario.function))
+        elapsed = (time.perf_counter() - t0) * 1000
+        if cold_ms is None:
+            cold_ms = elapsed + import_ms
+        if i >= warmup:
+            latencies.append(elapsed)
+            key = str(response['statusCode'])
+            statuses[key] = statuses.get(key, 0) + 1
+    
+    total_sec = sum(latencies) / 1000
+    return {
+        'iterations': iterations,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'throughput_rps': round(iterations / total_sec, 1) if total_sec else None,
+        'cold_start_ms': round(cold_ms, 3),
+        'import_ms': round(import_ms, 3),
+        'peak_rss_mb': peak_rss_mb(),
+        'status_codes': statuses,
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> int:
+    """Таблица изменений p50/p95/p99; возвращает число регрессий больше threshold процентов"""
+    regressions = 0
+    for scale, scenarios in current['results'].items():
+        base_scenarios = baseline.get('results', {}).get(scale)
+        if not base_scenarios:
+            print(f'scale {scale}: no baseline')
+            continue
+        print(f'\nscale {scale}')
+        for name, metrics in scenarios.items():
+            base = base_scenarios.get(name)
+            if not base:
+                continue
+            cells = []
+            for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'peak_rss_mb'):
+                before, after = base.get(metric), metrics.get(metric)
+                if not before or after is None:
+                    continue
+                change = (after - before) / before * 100
+                flag = ''
+                if change > threshold:
+                    flag = ' !'
+                    regressions += 1
+                cells.append(f'{metric} {before:.2f}->{after:.2f} ({change:+.1f}%){flag}')
+            print(f'  {name:<42} ' + '  '.join(cells))
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_DATABASE_URL'))
+    parser.add_argument('--scales', default='1000,100000', help='количество записей через запятую (1k–10M)')
+    parser.add_argument('--venues', type=int, default=None,
+                        help='число заведений; по умолчанию столько, чтобы у каждого было не больше 10 лет истории')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--heavy-iterations', type=int, default=3, help='итерации для экспорта бэкапа')
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--only', default=None, help='подстрока имени сценария')
+    parser.add_argument('--output', default='bench-results.json')
+    parser.add_argument('--compare', default=None, help='JSON с прошлым прогоном для сравнения')
+    parser.add_argument('--threshold', type=float, default=10.0, help='порог регрессии, %%')
+    args = parser.parse_args()
+    
+    dsn = guard_dsn(args.dsn)
+    results: Dict[str, Dict[str, Any]] = {}
+    context = multiprocessing.get_context('spawn')
+    
+    for scale in (int(value) for value in args.scales.split(',')):
+        venue_count = args.venues or max(2, -(-scale // 3650))
+        print(f'== scale {scale} entries, {venue_count} venues: seeding...', flush=True)
+        conn = connect(dsn)
+        t0 = time.perf_counter()
+        reset_schema(conn)
+        seed_entries(conn, scale, venue_names(venue_count))
+        conn.close()
+        print(f'   seeded in {time.perf_counter() - t0:.1f}s', flush=True)
+        
+        scale_results: Dict[str, Any] = {}
+        for scenario in build_scenarios():
+            if args.only and args.only not in scenario.name:
+                continue
+            iterations = args.heavy_iterations if scenario.heavy else args.iterations
+            warmup = 1 if scenario.heavy else args.warmup
+            with context.Pool(1) as pool:
+                metrics = pool.apply(run_scenario, ((dsn, scenario.name, iterations, warmup),))
+            scale_results[scenario.name] = metrics
+            print(f"   {scenario.name:<42} p50 {metrics['p50_ms']:>9.2f}ms  p95 {metrics['p95_ms']:>9.2f}ms  "
+                  f"p99 {metrics['p99_ms']:>9.2f}ms  {metrics['throughput_rps'] or 0:>8.1f} rps  "
+                  f"rss {metrics['peak_rss_mb']:>7.1f}MB  {metrics['status_codes']}", flush=True)
+        results[str(scale)] = scale_results
+    
+    report = {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'iterations': args.iterations,
+            'venues': args.venues,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'\nresults saved to {args.output}')
+    
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold)
+        if regressions:
+            print(f'\n{regressions} metric(s) regressed by more than {args.threshold}%')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
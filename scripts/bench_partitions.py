@@ -0,0 +1,214 @@
+'''
+Сравнение схемы inventory_entries до и после V0007–V0009 (справочник venues,
+месячные секции, покрывающий уникальный индекс) на одних и тех же данных.
+Для каждой схемы база пересоздаётся и заполняется scripts.common.seed_entries;
+запросы повторяют выборки handler inventory и выполняются напрямую, без HTTP-слоя.
+PUT и DELETE по id (ключа секционирования в них нет — проверяется индекс id каждой секции)
+выполняются вместе с триггерами в транзакции, которая откатывается: данные не меняются.
+В отчёт попадают p50/p95/p99 и сводка плана: узлы сканирования, число секций, буферы.
+
+Запуск:
+  BENCH_DATABASE_URL=postgresql://localhost/bench python -m scripts.bench_partitions \
+      --scale 10000000 --output partitions-10m.json
+'''
+
+import argparse
+import json
+import os
+import random
+import time
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+from scripts.common import SCHEMA, connect, guard_dsn, percentile, reset_schema, seed_entries, venue_names
+
+LEGACY_MIGRATION = 6
+PROJECTION = '''entry_date::text, forks, knives, steak_knives, spoons, dessert_spoons,
+               ice_cooler, plates, sugar_tongs, ice_tongs, ashtrays,
+               responsible_name, responsible_date::text, created_at::text'''
+# Для запросов с JOIN venues: у справочника тоже есть created_at
+JOINED_PROJECTION = '''e.entry_date::text, e.forks, e.knives, e.steak_knives, e.spoons, e.dessert_spoons,
+               e.ice_cooler, e.plates, e.sugar_tongs, e.ice_tongs, e.ashtrays,
+               e.responsible_name, e.responsible_date::text, e.created_at::text'''
+
+# Запрос -> (SQL для схемы до V0008, SQL для секционированной); параметры готовит фабрика
+QUERIES: Dict[str, Tuple[str, str]] = {
+    'venue page (limit=50)': (
+        f'''SELECT id, venue, {PROJECTION} FROM {SCHEMA}.inventory_entries
+            WHERE venue = %(venue)s ORDER BY entry_date DESC, id DESC LIMIT 51''',
+        f'''SELECT id, %(venue)s, {PROJECTION} FROM {SCHEMA}.inventory_entries
+            WHERE venue_id = (SELECT id FROM {SCHEMA}.venues WHERE name = %(venue)s)
+            ORDER BY entry_date DESC LIMIT 51''',
+    ),
+    'venue page after cursor (1 year back)': (
+        f'''SELECT id, venue, {PROJECTION} FROM {SCHEMA}.inventory_entries
+            WHERE venue = %(venue)s AND entry_date <= %(cursor)s AND (entry_date, id) < (%(cursor)s, 0)
+            ORDER BY entry_date DESC, id DESC LIMIT 51''',
+        f'''SELECT id, %(venue)s, {PROJECTION} FROM {SCHEMA}.inventory_entries
+            WHERE venue_id = (SELECT id FROM {SCHEMA}.venues WHERE name = %(venue)s)
+              AND entry_date < %(cursor)s
+            ORDER BY entry_date DESC LIMIT 51''',
+    ),
+    'venue last 30 days': (
+        f'''SELECT id, venue, {PROJECTION} FROM {SCHEMA}.inventory_entries
+            WHERE venue = %(venue)s AND entry_date >= %(month_ago)s ORDER BY entry_date DESC, id DESC''',
+        f'''SELECT id, %(venue)s, {PROJECTION} FROM {SCHEMA}.inventory_entries
+            WHERE venue_id = (SELECT id FROM {SCHEMA}.venues WHERE name = %(venue)s)
+              AND entry_date >= %(month_ago)s
+            ORDER BY entry_date DESC''',
+    ),
+    'all venues one day': (
+        f'''SELECT id, venue, {PROJECTION} FROM {SCHEMA}.inventory_entries
+            WHERE entry_date = %(day)s''',
+        f'''SELECT e.id, v.name, {JOINED_PROJECTION} FROM {SCHEMA}.inventory_entries e
+            JOIN {SCHEMA}.venues v ON v.id = e.venue_id
+            WHERE e.entry_date = %(day)s''',
+    ),
+    'entry by id': (
+        f'''SELECT id, venue, {PROJECTION} FROM {SCHEMA}.inventory_entries WHERE id = %(id)s''',
+        f'''SELECT id, {SCHEMA}.venue_name(venue_id), {PROJECTION} FROM {SCHEMA}.inventory_entries
+            WHERE id = %(id)s''',
+    ),
+}
+
+
+# Записи по id, как PUT и DELETE handler inventory; выполняются в откатываемой транзакции
+WRITES: Dict[str, Tuple[str, str]] = {
+    'PUT by id': (
+        f'''UPDATE {SCHEMA}.inventory_entries SET forks = forks + 1 WHERE id = %(id)s RETURNING id''',
+        f'''UPDATE {SCHEMA}.inventory_entries SET forks = forks + 1 WHERE id = %(id)s RETURNING id''',
+    ),
+    'DELETE by id': (
+        f'''DELETE FROM {SCHEMA}.inventory_entries WHERE id = %(id)s RETURNING venue''',
+        f'''DELETE FROM {SCHEMA}.inventory_entries WHERE id = %(id)s RETURNING {SCHEMA}.venue_name(venue_id)''',
+    ),
+}
+
+
+def params_factory(venues: Sequence[str], total: int, end: date, seed: int) -> Callable[[], Dict[str, Any]]:
+    rng = random.Random(seed)
+    days = -(-total // len(venues))
+
+    def make() -> Dict[str, Any]:
+        return {
+            'venue': rng.choice(venues),
+            'cursor': end - timedelta(days=min(365, days - 1)),
+            'month_ago': end - timedelta(days=30),
+            'day': end - timedelta(days=rng.randrange(days)),
+            'id': rng.randint(1, total),
+        }
+    return make
+
+
+def plan_summary(cur, sql: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Узлы сканирования, число затронутых секций и прочитанные буферы одного выполнения"""
+    cur.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}', params)
+    plan = cur.fetchone()[0][0]
+    scans: Dict[str, int] = {}
+    relations = set()
+
+    def walk(node: Dict[str, Any]) -> None:
+        if 'Scan' in node['Node Type']:
+            scans[node['Node Type']] = scans.get(node['Node Type'], 0) + 1
+            if 'Relation Name' in node:
+                relations.add(node['Relation Name'])
+        for child in node.get('Plans', []):
+            walk(child)
+
+    walk(plan['Plan'])
+    return {
+        'scans': scans,
+        'relations': len(relations),
+        'shared_buffers': plan['Plan'].get('Shared Hit Blocks', 0) + plan['Plan'].get('Shared Read Blocks', 0),
+        'execution_ms': round(plan['Execution Time'], 3),
+    }
+
+
+def run_layout(dsn: str, layout: int, total: int, venues: Sequence[str], end: date,
+               iterations: int, warmup: int) -> Dict[str, Any]:
+    conn = connect(dsn)
+    t0 = time.perf_counter()
+    reset_schema(conn, LEGACY_MIGRATION if layout == 0 else None)
+    seed_entries(conn, total, venues, end)
+    conn.autocommit = True
+    seeded_sec = time.perf_counter() - t0
+
+    cur = conn.cursor()
+    cur.execute(f"SELECT pg_total_relation_size('{SCHEMA}.inventory_entries'), "
+                f"(SELECT coalesce(sum(pg_total_relation_size(inhrelid)), 0)::bigint FROM pg_inherits "
+                f"WHERE inhparent = '{SCHEMA}.inventory_entries'::regclass)")
+    own_size, partitions_size = cur.fetchone()
+
+    results: Dict[str, Any] = {}
+    for index, (name, variants) in enumerate(list(QUERIES.items()) + list(WRITES.items())):
+        sql = variants[layout]
+        write = name in WRITES
+        make_params = params_factory(venues, total, end, seed=index)
+        latencies: List[float] = []
+        for i in range(warmup + iterations):
+            params = make_params()
+            if write:
+                cur.execute('BEGIN')
+            started = time.perf_counter()
+            cur.execute(sql, params)
+            cur.fetchall()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if write:
+                cur.execute('ROLLBACK')
+            if i >= warmup:
+                latencies.append(elapsed_ms)
+        if write:
+            cur.execute('BEGIN')
+        plan = plan_summary(cur, sql, make_params())
+        if write:
+            cur.execute('ROLLBACK')
+        results[name] = {
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'plan': plan,
+        }
+    cur.close()
+    conn.close()
+    return {'seeded_sec': round(seeded_sec, 1), 'table_mb': round((own_size + partitions_size) / 2 ** 20, 1),
+            'queries': results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_DATABASE_URL'))
+    parser.add_argument('--scale', type=int, default=10_000_000, help='количество записей')
+    parser.add_argument('--venues', type=int, default=None,
+                        help='число заведений; по умолчанию столько, чтобы у каждого было не больше 10 лет истории')
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--warmup', type=int, default=50)
+    parser.add_argument('--output', default='bench-partitions.json')
+    args = parser.parse_args()
+
+    dsn = guard_dsn(args.dsn)
+    venues = venue_names(args.venues or max(2, -(-args.scale // 3650)))
+    end = date.today()
+    report: Dict[str, Any] = {
+        'meta': {'scale': args.scale, 'venues': len(venues), 'iterations': args.iterations,
+                 'created_at': time.strftime('%Y-%m-%dT%H:%M:%S')},
+    }
+    for layout, label in enumerate(('legacy', 'partitioned')):
+        print(f'== {label}: seeding {args.scale} entries, {len(venues)} venues...', flush=True)
+        report[label] = run_layout(dsn, layout, args.scale, venues, end, args.iterations, args.warmup)
+        print(f"   seeded in {report[label]['seeded_sec']}s, table {report[label]['table_mb']} MB", flush=True)
+
+    print(f"\n{'query':<40} {'legacy p50/p95':>18} {'partitioned p50/p95':>22}  plan (partitioned)")
+    for name in list(QUERIES) + list(WRITES):
+        before, after = report['legacy']['queries'][name], report['partitioned']['queries'][name]
+        plan = after['plan']
+        print(f"{name:<40} {before['p50_ms']:>8.3f}/{before['p95_ms']:<8.3f}ms "
+              f"{after['p50_ms']:>10.3f}/{after['p95_ms']:<8.3f}ms  "
+              f"{plan['scans']} on {plan['relations']} relation(s), {plan['shared_buffers']} buffers")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'\nresults saved to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
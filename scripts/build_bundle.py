@@ -0,0 +1,216 @@
+'''
+Сборка ZIP облачной функции с зависимостями внутри архива и отчёт о времени импорта
+Зависимости ставятся из готовых manylinux-колёс под рантайм python311, из них
+вырезаются тесты, исходники C, заглушки типов и отладочные символы .so; модули
+заранее компилируются в .pyc (рантайм не может записать __pycache__ сам).
+requirements.txt в такой архив не кладётся — платформа ничего не доустанавливает.
+
+Запуск:
+  python -m scripts.build_bundle inventory --output dist/inventory.zip
+  python -m scripts.build_bundle inventory --report --baseline HEAD~1 --runs 7
+'''
+
+import argparse
+import compileall
+import os
+import py_compile
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from scripts.common import BACKEND_DIR, ROOT, SHARED_DIR
+
+RUNTIME_PYTHON = '3.11'
+WHEEL_PLATFORM = 'manylinux2014_x86_64'
+
+STRIP_DIRS = {'tests', 'test', '__pycache__'}
+STRIP_SUFFIXES = ('.pyi', '.pyx', '.pxd', '.c', '.h', '.cpp')
+# Из *.dist-info оставляем только метаданные и лицензии
+KEEP_DIST_INFO = re.compile(r'^(METADATA|LICEN[CS]E.*|COPYING.*|top_level\.txt)$')
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def vendor_requirements(requirements: Path, target: Path) -> None:
+    """Готовые колёса под Linux x86_64 / CPython 3.11 — сборки на машине деплоя нет"""
+    subprocess.run([
+        sys.executable, '-m', 'pip', 'install', '--quiet', '--disable-pip-version-check',
+        '--target', str(target), '--requirement', str(requirements),
+        '--only-binary=:all:', '--platform', WHEEL_PLATFORM,
+        '--implementation', 'cp', '--python-version', RUNTIME_PYTHON, '--no-compile',
+    ], check=True)
+    for name in ('bin', '.lock'):
+        shutil.rmtree(target / name, ignore_errors=True)
+
+
+def strip_tree(root: Path) -> None:
+    for path in sorted(root.rglob('*'), reverse=True):
+        if not path.exists():
+            continue
+        if path.is_dir():
+            if path.name in STRIP_DIRS:
+                shutil.rmtree(path)
+        elif path.parent.name.endswith('.dist-info'):
+            if not KEEP_DIST_INFO.match(path.name):
+                path.unlink()
+        elif path.suffix in STRIP_SUFFIXES:
+            path.unlink()
+    strip = shutil.which('strip')
+    if strip and sys.platform.startswith('linux'):
+        for library in root.rglob('*.so*'):
+            subprocess.run([strip, '--strip-unneeded', str(library)], check=False,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def precompile(root: Path) -> bool:
+    """.pyc без проверки mtime: после распаковки архива время изменения файлов не совпадёт"""
+    if f'{sys.version_info[0]}.{sys.version_info[1]}' != RUNTIME_PYTHON:
+        print(f'⚠️  Python {sys.version.split()[0]} не совпадает с рантаймом {RUNTIME_PYTHON}, '
+              '.pyc не создаются', file=sys.stderr)
+        return False
+    return compileall.compile_dir(
+        str(root), quiet=1, workers=0,
+        invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+    )
+
+
+def stage_function(function: str, target: Path, vendor: bool = True, compile_pyc: bool = True,
+                   sources: Optional[Dict[str, str]] = None) -> None:
+    """Каталог, который станет корнем архива: .py функции и общий модуль из backend/shared;
+    sources подменяет .py-файлы (для сравнения версий)"""
+    source_dir = BACKEND_DIR / function
+    target.mkdir(parents=True, exist_ok=True)
+    for path in list(SHARED_DIR.glob('*.py')) + list(source_dir.glob('*.py')):
+        shutil.copy2(path, target / path.name)
+    for name, text in (sources or {}).items():
+        (target / name).write_text(text, encoding='utf-8')
+    requirements = source_dir / 'requirements.txt'
+    if requirements.exists():
+        if vendor:
+            vendor_requirements(requirements, target)
+            strip_tree(target)
+        else:
+            shutil.copy2(requirements, target / 'requirements.txt')
+    if compile_pyc:
+        precompile(target)
+
+
+def zip_tree(root: Path) -> bytes:
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED, compresslevel=9) as archive:
+        for path in sorted(root.rglob('*')):
+            if path.is_file():
+                archive.write(path, path.relative_to(root).as_posix())
+    return buffer.getvalue()
+
+
+def build_bundle(function: str, vendor: bool = True, compile_pyc: bool = True) -> bytes:
+    with tempfile.TemporaryDirectory(prefix=f'bundle-{function}-') as tmp:
+        stage_function(function, Path(tmp), vendor=vendor, compile_pyc=compile_pyc)
+        return zip_tree(Path(tmp))
+
+
+def parse_importtime(stderr: str) -> List[Tuple[int, int, int, str]]:
+    """Строки -X importtime: (self_us, cumulative_us, depth, module)"""
+    rows = []
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            rows.append((int(match.group(1)), int(match.group(2)), len(match.group(3)) // 2,
+                         match.group(4)))
+    return rows
+
+
+def measure_imports(bundle_dir: Path, runs: int) -> Dict[str, object]:
+    """Импорт index в чистом интерпретаторе, как при холодном старте, плюс отложенный драйвер БД"""
+    code = 'import index\nif hasattr(index, "pg"): index.pg()'
+    env = {key: value for key, value in os.environ.items() if not key.startswith('PYTHON')}
+    # Рантайм не пишет __pycache__: всё, что не скомпилировано заранее, компилируется на каждом старте
+    env.update({'PYTHONPATH': str(bundle_dir), 'PYTHONDONTWRITEBYTECODE': '1'})
+    module_ms, deferred_ms, wall_ms = [], [], []
+    rows: List[Tuple[int, int, int, str]] = []
+    for _ in range(runs):
+        started = time.perf_counter_ns()
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=bundle_dir,
+                              env=env, capture_output=True, text=True)
+        wall_ms.append((time.perf_counter_ns() - started) / 1e6)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+        rows = parse_importtime(proc.stderr)
+        top = {name: cumulative for _, cumulative, depth, name in rows if depth == 0}
+        module_ms.append(top.get('index', 0) / 1000)
+        deferred_ms.append(top.get('psycopg2', 0) / 1000)
+    heaviest = sorted(((cumulative, name) for _, cumulative, depth, name in rows if depth <= 1),
+                      reverse=True)[:15]
+    return {
+        'module_ms': statistics.median(module_ms),
+        'deferred_ms': statistics.median(deferred_ms),
+        'process_ms': statistics.median(wall_ms),
+        'heaviest': [(name, cumulative / 1000) for cumulative, name in heaviest],
+    }
+
+
+def git_sources(function: str, ref: str) -> Dict[str, str]:
+    listing = subprocess.run(['git', 'ls-tree', '--name-only', ref, f'backend/{function}/', 'backend/shared/'],
+                             cwd=ROOT, capture_output=True, text=True, check=True).stdout.split()
+    sources = {}
+    for path in listing:
+        if path.endswith('.py'):
+            sources[Path(path).name] = subprocess.run(['git', 'show', f'{ref}:{path}'], cwd=ROOT,
+                                                      capture_output=True, text=True,
+                                                      check=True).stdout
+    return sources
+
+
+def print_report(label: str, result: Dict[str, object]) -> None:
+    print(f'\n{label}')
+    print(f'  импорт index:             {result["module_ms"]:8.1f} мс')
+    print(f'  отложенный импорт psycopg2: {result["deferred_ms"]:6.1f} мс')
+    print(f'  процесс целиком:          {result["process_ms"]:8.1f} мс')
+    print('  самые тяжёлые модули (cumulative):')
+    for name, ms in result['heaviest']:
+        print(f'    {ms:8.2f} мс  {name}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('function', help='каталог в backend/, например inventory')
+    parser.add_argument('--output', help='куда записать ZIP')
+    parser.add_argument('--no-vendor', action='store_true',
+                        help='как раньше: requirements.txt вместо зависимостей в архиве')
+    parser.add_argument('--no-compile', action='store_true', help='не класть .pyc в архив')
+    parser.add_argument('--report', action='store_true', help='померить время импорта собранного архива')
+    parser.add_argument('--baseline', help='git-ревизия, с версией функции из которой сравнить импорт')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    vendor, compile_pyc = not args.no_vendor, not args.no_compile
+    with tempfile.TemporaryDirectory(prefix=f'bundle-{args.function}-') as tmp:
+        current = Path(tmp) / 'current'
+        stage_function(args.function, current, vendor=vendor, compile_pyc=compile_pyc)
+        content = zip_tree(current)
+        print(f'📦 {args.function}: {len(content)} байт, '
+              f'{sum(1 for p in current.rglob("*") if p.is_file())} файлов')
+        if args.output:
+            Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+            Path(args.output).write_bytes(content)
+            print(f'📝 Архив сохранён: {args.output}')
+        if args.report or args.baseline:
+            if args.baseline:
+                baseline = Path(tmp) / 'baseline'
+                stage_function(args.function, baseline, vendor=vendor, compile_pyc=False,
+                               sources=git_sources(args.function, args.baseline))
+                print_report(f'{args.baseline} (без .pyc)', measure_imports(baseline, args.runs))
+            print_report('текущая версия', measure_imports(current, args.runs))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+'''
+Проверка инкрементального пересчёта inventory_daily_stats триггерами: после каждой правки
+записей сводка заведения сравнивается с расчётом с нуля на Python (delta к предыдущему
+подсчёту, потери, окна 7/30 дней). Сценарии — правки дня, за которым идёт пропуск перед
+следующим подсчётом: от такого дня зависят delta и потеря следующего подсчёта, а значит и
+окна до следующего подсчёта + 29 дней. Отдельно — две параллельные записи одного заведения
+с пересекающимися окнами: вторая ждёт первую и не падает на ключе сводки. Схема пересоздаётся —
+нужна отдельная локальная база.
+
+Запуск:
+  BENCH_DATABASE_URL=postgresql://localhost/bench python -m scripts.check_daily_stats
+'''
+
+import argparse
+import os
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from scripts.common import ITEM_COLUMNS, SCHEMA, connect, guard_dsn, reset_schema
+
+VENUE = 'PORT'
+START = date(2024, 1, 1)
+
+StatsRow = Tuple[int, int, int, int, int]
+
+
+def expected_stats(counts: Dict[date, int]) -> Dict[date, StatsRow]:
+    """Сводка одного предмета: (item_count, delta, loss, loss_7d, loss_30d) по дням с подсчётом"""
+    result: Dict[date, StatsRow] = {}
+    losses: List[Tuple[date, int]] = []
+    previous = None
+    for day in sorted(counts):
+        delta = None if previous is None else counts[day] - previous
+        loss = max(-(delta or 0), 0)
+        losses.append((day, loss))
+        loss_7d = sum(value for other, value in losses if other > day - timedelta(days=7))
+        loss_30d = sum(value for other, value in losses if other > day - timedelta(days=30))
+        result[day] = (counts[day], delta, loss, loss_7d, loss_30d)
+        previous = counts[day]
+    return result
+
+
+def check(cur, title: str) -> bool:
+    cur.execute(f'''
+        SELECT e.entry_date, e.forks FROM {SCHEMA}.inventory_entries e
+        JOIN {SCHEMA}.venues v ON v.id = e.venue_id
+        WHERE v.name = %s
+    ''', (VENUE,))
+    expected = expected_stats(dict(cur.fetchall()))
+    cur.execute(f'''
+        SELECT entry_date, item_count, delta, loss, loss_7d, loss_30d
+        FROM {SCHEMA}.inventory_daily_stats
+        WHERE venue = %s AND item = 'forks'
+    ''', (VENUE,))
+    actual = {row[0]: tuple(row[1:]) for row in cur.fetchall()}
+    wrong = sorted(day for day in expected.keys() | actual.keys() if expected.get(day) != actual.get(day))
+    print(f"{'ok' if not wrong else 'FAIL':<4} {title}")
+    for day in wrong[:5]:
+        print(f'     {day}: expected {expected.get(day)}, got {actual.get(day)}')
+    return not wrong
+
+
+def concurrent_write(dsn: str, first: str, second: str, args: Tuple[tuple, tuple]) -> Optional[str]:
+    """first держит открытую транзакцию, пока second из другого соединения пишет в то же заведение;
+    возвращает ошибку second, если она была"""
+    holder, writer = connect(dsn), connect(dsn)
+    writer.autocommit = True
+    errors: List[str] = []
+
+    def write() -> None:
+        try:
+            with writer.cursor() as cur:
+                cur.execute(second, args[1])
+        except Exception as e:
+            errors.append(f'{type(e).__name__}: {str(e).splitlines()[0]}')
+
+    with holder.cursor() as cur:
+        cur.execute(first, args[0])
+    thread = threading.Thread(target=write)
+    thread.start()
+    time.sleep(0.5)
+    holder.commit()
+    thread.join()
+    holder.close()
+    writer.close()
+    return errors[0] if errors else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_DATABASE_URL'))
+    args = parser.parse_args()
+
+    dsn = guard_dsn(args.dsn)
+    conn = connect(dsn)
+    reset_schema(conn)
+    conn.autocommit = True
+    table = f'{SCHEMA}.inventory_entries'
+    columns = ', '.join(('venue_id', 'entry_date') + ITEM_COLUMNS)
+    ok = True
+    with conn.cursor() as cur:
+        cur.execute(f'SELECT {SCHEMA}.ensure_venue(%s)', (VENUE,))
+        venue_id = cur.fetchone()[0]
+        cur.execute(f'SELECT {SCHEMA}.ensure_inventory_partitions(%s, %s)', (START, START + timedelta(days=120)))
+
+        def day(offset: int) -> date:
+            return START + timedelta(days=offset)
+
+        # Подсчёты в дни 0–4, пропуск 35 дней, затем ежедневно 40–80 с медленной убылью
+        offsets = list(range(5)) + list(range(40, 81))
+        rows = [(venue_id, day(offset), *([200 - offset] * len(ITEM_COLUMNS))) for offset in offsets]
+        placeholders = ', '.join(['%s'] * (2 + len(ITEM_COLUMNS)))
+        cur.executemany(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})', rows)
+        ok &= check(cur, 'initial load')
+
+        cur.execute(f'UPDATE {table} SET forks = 260 WHERE venue_id = %s AND entry_date = %s', (venue_id, day(4)))
+        ok &= check(cur, 'edit the last count before a 35-day gap')
+
+        cur.execute(f'DELETE FROM {table} WHERE venue_id = %s AND entry_date = %s', (venue_id, day(4)))
+        ok &= check(cur, 'delete the last count before the gap')
+
+        cur.execute(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})',
+                    (venue_id, day(20), *([300] * len(ITEM_COLUMNS))))
+        ok &= check(cur, 'insert a count inside the gap')
+
+        cur.execute(f'UPDATE {table} SET forks = 120 WHERE venue_id = %s AND entry_date = %s', (venue_id, day(20)))
+        ok &= check(cur, 'edit the count inside the gap')
+
+        update = f'UPDATE {table} SET forks = %s WHERE venue_id = %s AND entry_date = %s'
+        error = concurrent_write(dsn, update, update, ((150, venue_id, day(45)), (130, venue_id, day(50))))
+        if error:
+            print(f'FAIL concurrent edits of one venue: {error}')
+        ok &= not error and check(cur, 'concurrent edits of one venue')
+
+        insert = f'INSERT INTO {table} ({columns}) VALUES ({placeholders})'
+        error = concurrent_write(dsn, insert, update, ((venue_id, day(30), *([170] * len(ITEM_COLUMNS))),
+                                                       (110, venue_id, day(41))))
+        if error:
+            print(f'FAIL concurrent insert and edit of one venue: {error}')
+        ok &= not error and check(cur, 'concurrent insert and edit of one venue')
+    conn.close()
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
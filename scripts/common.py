@@ -0,0 +1,211 @@
+'''
+Общие утилиты локальных инструментов: загрузка handler облачных функций из backend/,
+накат миграций и заполнение локальной БД синтетическими данными
+'''
+
+import importlib.util
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+ROOT = Path(__file__).resolve().parent.parent
+BACKEND_DIR = ROOT / 'backend'
+# Общий модуль функций: в архиве лежит рядом с index.py, локально импортируется из этого каталога
+SHARED_DIR = BACKEND_DIR / 'shared'
+MIGRATIONS_DIR = ROOT / 'db_migrations'
+SCHEMA = 't_p23128842_inventory_cutlery_tr'
+
+ITEM_COLUMNS = (
+    'forks', 'knives', 'steak_knives', 'spoons', 'dessert_spoons',
+    'ice_cooler', 'plates', 'sugar_tongs', 'ice_tongs', 'ashtrays'
+)
+
+
+class FunctionContext:
+    """Минимальный аналог context из Yandex Cloud Functions"""
+
+    def __init__(self, function_name: str):
+        self.request_id = str(uuid.uuid4())
+        self.function_name = function_name
+        self.function_version = 'local'
+        self.memory_limit_in_mb = 256
+        self._deadline = time.monotonic() + 30
+
+    def get_remaining_time_in_millis(self) -> int:
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+def function_names() -> List[str]:
+    return sorted(path.parent.name for path in BACKEND_DIR.glob('*/index.py'))
+
+
+def load_function(name: str):
+    """Импорт backend/<name>/index.py под уникальным именем модуля (все функции называются index)"""
+    if str(SHARED_DIR) not in sys.path:
+        sys.path.insert(0, str(SHARED_DIR))
+    path = BACKEND_DIR / name / 'index.py'
+    spec = importlib.util.spec_from_file_location(f'backend_{name}_index', path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_event(method: str = 'GET', params: Optional[Dict[str, str]] = None, body: Any = None,
+               headers: Optional[Dict[str, str]] = None, is_base64: bool = False) -> Dict[str, Any]:
+    return {
+        'httpMethod': method,
+        'headers': headers or {},
+        'queryStringParameters': params or {},
+        'multiValueQueryStringParameters': {key: [value] for key, value in (params or {}).items()},
+        'body': body if body is None or isinstance(body, str) else json.dumps(body),
+        'isBase64Encoded': is_base64,
+        'requestContext': {'identity': {'sourceIp': '127.0.0.1'}},
+    }
+
+
+def connect(dsn: str):
+    import psycopg2
+    return psycopg2.connect(dsn)
+
+
+def guard_dsn(dsn: Optional[str]) -> str:
+    """Инструменты пересоздают схему — не даём случайно направить их на рабочую БД"""
+    if not dsn:
+        raise SystemExit('Set BENCH_DATABASE_URL or pass --dsn with a local Postgres')
+    if dsn == os.environ.get('DATABASE_URL') and os.environ.get('BENCH_ALLOW_DATABASE_URL') != '1':
+        raise SystemExit('Refusing to reset the schema behind DATABASE_URL (set BENCH_ALLOW_DATABASE_URL=1)')
+    return dsn
+
+
+def migration_files(upto: Optional[int] = None) -> List[Path]:
+    files = sorted(MIGRATIONS_DIR.glob('V*__*.sql'))
+    if upto is not None:
+        files = [path for path in files if int(path.name[1:5]) <= upto]
+    return files
+
+
+def reset_schema(conn, upto: Optional[int] = None) -> None:
+    """Пересоздать схему и накатить миграции по порядку"""
+    with conn.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        for path in migration_files(upto):
+            cur.execute(path.read_text(encoding='utf-8'))
+    conn.commit()
+
+
+def venue_names(count: int) -> List[str]:
+    base = ['PORT', 'Диккенс']
+    return (base + [f'Venue {n:04d}' for n in range(1, count)])[:count]
+
+
+class _CsvStream:
+    """Файлоподобный поток CSV для COPY FROM STDIN без материализации всех строк"""
+
+    def __init__(self, lines: Iterator[str]):
+        self._lines = lines
+        self._pending = ''
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._pending) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._pending += line
+        if size < 0:
+            size = len(self._pending)
+        chunk, self._pending = self._pending[:size], self._pending[size:]
+        return chunk
+
+
+def _synthetic_rows(total: int, venues: Sequence[str], end: date, seed: int,
+                    keys: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    rng = random.Random(seed)
+    per_venue = -(-total // len(venues))
+    produced = 0
+    for venue in venues:
+        key = keys[venue] if keys else venue
+        counts = [rng.randint(80, 160) for _ in ITEM_COLUMNS]
+        for day in range(per_venue):
+            if produced >= total:
+                return
+            # Медленная убыль с редкими пополнениями — похоже на реальные подсчёты
+            counts = [max(0, c - (rng.random() < 0.3)) + (40 if rng.random() < 0.01 else 0) for c in counts]
+            entry_date = end - timedelta(days=day)
+            responsible = 'Иванов' if day % 7 == 0 else ''
+            yield f'{key},{entry_date.isoformat()},{",".join(map(str, counts))},{responsible}\n'
+            produced += 1
+
+
+def _ensure_venue_keys(cur, venues: Sequence[str]) -> Dict[str, int]:
+    cur.execute(f'SELECT name, {SCHEMA}.ensure_venue(name) FROM unnest(%s::varchar[]) AS name', (list(venues),))
+    return dict(cur.fetchall())
+
+
+def seed_entries(conn, total: int, venues: Sequence[str], end: Optional[date] = None, seed: int = 42) -> None:
+    """Залить total записей через COPY; пользовательские триггеры отключаются, производные
+    таблицы пересчитываются одним проходом после загрузки. Работает и со схемой до V0008
+    (venue строкой), и с секционированной (venue_id из справочника venues)"""
+    table = f'{SCHEMA}.inventory_entries'
+    end = end or date.today()
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT to_regclass('{SCHEMA}.venues') IS NOT NULL")
+        keyed = cur.fetchone()[0]
+        keys = _ensure_venue_keys(cur, venues) if keyed else None
+        if keyed:
+            days = -(-total // len(venues))
+            cur.execute(f'SELECT {SCHEMA}.ensure_inventory_partitions(%s, %s)', (end - timedelta(days=days), end))
+        columns = ', '.join(('venue_id' if keyed else 'venue', 'entry_date') + ITEM_COLUMNS + ('responsible_name',))
+        cur.execute(f'TRUNCATE {table} RESTART IDENTITY')
+        cur.execute(f'ALTER TABLE {table} DISABLE TRIGGER USER')
+        cur.copy_expert(
+            f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)",
+            _CsvStream(_synthetic_rows(total, venues, end, seed, keys))
+        )
+        cur.execute(f'ALTER TABLE {table} ENABLE TRIGGER USER')
+        rebuild_derived(cur, keyed)
+        cur.execute(f'ANALYZE {table}')
+    conn.commit()
+
+
+def rebuild_derived(cur, keyed: bool = True) -> None:
+    """Пересчёт таблиц, которые в рабочем режиме ведут триггеры"""
+    entries = (f'(SELECT e.id, v.name AS venue, e.entry_date FROM {SCHEMA}.inventory_entries e '
+               f'JOIN {SCHEMA}.venues v ON v.id = e.venue_id)' if keyed else f'{SCHEMA}.inventory_entries')
+    cur.execute(f'''
+        INSERT INTO {SCHEMA}.inventory_venue_versions (venue)
+        SELECT DISTINCT venue FROM {entries} e
+        ON CONFLICT (venue) DO UPDATE SET version = {SCHEMA}.inventory_venue_versions.version + 1
+    ''')
+    cur.execute(f'''
+        SELECT {SCHEMA}.refresh_daily_stats(venue, min(entry_date), max(entry_date))
+        FROM {entries} e
+        GROUP BY venue
+    ''')
+    cur.execute(f'TRUNCATE {SCHEMA}.inventory_changes')
+    cur.execute(f'''
+        INSERT INTO {SCHEMA}.inventory_changes (entry_id, venue)
+        SELECT id, venue FROM {entries} e
+    ''')
+
+
+def percentile(values: Sequence[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def peak_rss_mb() -> float:
+    import resource
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты
+    return round(usage / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
@@ -0,0 +1,196 @@
+'''
+Генератор нагрузки для scripts.local_server (или любого URL с тем же API).
+Каждый виртуальный клиент держит своё keep-alive соединение и в цикле выполняет
+запросы по весам сценариев. Ступени --concurrency прогоняются по очереди: по росту
+p95 и 429/503 на какой-то ступени видно, где упираемся в пул соединений или Postgres.
+--distinct-clients даёт каждому виртуальному клиенту свой адрес в X-Forwarded-For (сервер
+запускается с --trust-forwarded), --honor-retry-after — выжидать Retry-After после 429/503,
+как ведёт себя вежливый клиент; без него клиенты ведут себя как шквал перезагрузок.
+
+Запуск:
+  python -m scripts.loadgen --base-url http://127.0.0.1:8000 --concurrency 1,4,16,64 --duration 20
+  python -m scripts.loadgen --mix read=8,aggregates=1,write=1 --output loadgen.json
+  python -m scripts.loadgen --concurrency 64 --distinct-clients --honor-retry-after
+'''
+
+import argparse
+import http.client
+import itertools
+import json
+import random
+import threading
+import time
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+from scripts.common import percentile
+
+# Записи нагрузки пишутся в далёкое будущее, чтобы не смешиваться с реальными датами
+FUTURE = date(2200, 1, 1)
+ENTRY_BODY = {
+    'forks': 100, 'knives': 90, 'steakKnives': 40, 'spoons': 95, 'dessertSpoons': 80,
+    'iceCooler': 3, 'plates': 120, 'sugarTongs': 5, 'iceTongs': 4, 'ashtrays': 10,
+    'responsible_name': 'Нагрузка',
+}
+_days = itertools.count()
+
+Request = Tuple[str, str, Optional[bytes]]
+
+
+def _query(path: str, params: Dict[str, str]) -> str:
+    return f'{path}?{urlencode(params)}'
+
+
+def scenarios(prefix: str, venues: List[str]) -> Dict[str, Callable[[random.Random], Request]]:
+    inventory = f'{prefix}/inventory'
+
+    def read(rng: random.Random) -> Request:
+        return 'GET', _query(inventory, {'venue': rng.choice(venues), 'limit': '50'}), None
+
+    def read_all(rng: random.Random) -> Request:
+        return 'GET', _query(inventory, {'venue': '*', 'limit': '30'}), None
+
+    def aggregates(rng: random.Random) -> Request:
+        return 'GET', _query(inventory, {'action': 'aggregates', 'venue': rng.choice(venues)}), None
+
+    def sync(rng: random.Random) -> Request:
+        return 'GET', _query(inventory, {'action': 'sync', 'limit': '500'}), None
+
+    def write(rng: random.Random) -> Request:
+        day = (FUTURE + timedelta(days=next(_days))).isoformat()
+        body = dict(ENTRY_BODY, venue=rng.choice(venues), date=day)
+        return 'POST', inventory, json.dumps(body).encode('utf-8')
+
+    return {'read': read, 'read_all': read_all, 'aggregates': aggregates, 'sync': sync, 'write': write}
+
+
+def parse_mix(value: str) -> List[Tuple[str, int]]:
+    mix = []
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        mix.append((name.strip(), int(weight or 1)))
+    return mix
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, int] = {}
+        self.errors = 0
+
+    def add(self, scenario: str, status: Optional[int], elapsed_ms: float) -> None:
+        with self.lock:
+            if status is None:
+                self.errors += 1
+                return
+            self.latencies.setdefault(scenario, []).append(elapsed_ms)
+            self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+
+
+def client(host: str, port: int, pick: Callable[[random.Random], Tuple[str, Request]],
+           deadline: float, recorder: Recorder, seed: int, client_ip: Optional[str] = None,
+           honor_retry_after: bool = False) -> None:
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection(host, port, timeout=60)
+    while time.monotonic() < deadline:
+        scenario, (method, path, body) = pick(rng)
+        headers = {'Content-Type': 'application/json'} if body else {}
+        if client_ip:
+            headers['X-Forwarded-For'] = client_ip
+        started = time.perf_counter()
+        retry_after = None
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+            retry_after = response.getheader('Retry-After')
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=60)
+            status = None
+        recorder.add(scenario, status, (time.perf_counter() - started) * 1000)
+        if honor_retry_after and status in (429, 503) and retry_after and retry_after.isdigit():
+            time.sleep(min(int(retry_after), max(deadline - time.monotonic(), 0)))
+    conn.close()
+
+
+def run_step(base_url: str, concurrency: int, duration: float, mix: List[Tuple[str, int]],
+             venues: List[str], distinct_clients: bool = False, honor_retry_after: bool = False) -> Dict[str, Any]:
+    url = urlsplit(base_url)
+    available = scenarios(url.path.rstrip('/'), venues)
+    unknown = [name for name, _ in mix if name not in available]
+    if unknown:
+        raise SystemExit(f"Unknown scenario(s): {', '.join(unknown)}; available: {', '.join(available)}")
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+
+    def pick(rng: random.Random) -> Tuple[str, Request]:
+        name = rng.choices(names, weights)[0]
+        return name, available[name](rng)
+
+    recorder = Recorder()
+    deadline = time.monotonic() + duration
+    threads = [threading.Thread(target=client, args=(
+                   url.hostname, url.port or 80, pick, deadline, recorder, n,
+                   f'10.{n // 65536 % 256}.{n // 256 % 256}.{n % 256}' if distinct_clients else None,
+                   honor_retry_after))
+               for n in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    all_latencies = [value for values in recorder.latencies.values() for value in values]
+    return {
+        'concurrency': concurrency,
+        'requests': len(all_latencies),
+        'throughput_rps': round(len(all_latencies) / elapsed, 1),
+        'p50_ms': round(percentile(all_latencies, 50) or 0, 2),
+        'p95_ms': round(percentile(all_latencies, 95) or 0, 2),
+        'p99_ms': round(percentile(all_latencies, 99) or 0, 2),
+        'status_codes': recorder.statuses,
+        'connection_errors': recorder.errors,
+        'scenarios': {
+            name: {'requests': len(values), 'p50_ms': round(percentile(values, 50), 2),
+                   'p95_ms': round(percentile(values, 95), 2)}
+            for name, values in recorder.latencies.items()
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--concurrency', default='1,4,16', help='ступени числа клиентов через запятую')
+    parser.add_argument('--duration', type=float, default=15.0, help='секунд на ступень')
+    parser.add_argument('--mix', default='read=6,read_all=1,aggregates=1,sync=1,write=1')
+    parser.add_argument('--venues', default='PORT,Диккенс')
+    parser.add_argument('--distinct-clients', action='store_true', help='свой X-Forwarded-For у каждого клиента')
+    parser.add_argument('--honor-retry-after', action='store_true', help='пауза Retry-After после 429/503')
+    parser.add_argument('--output', default=None, help='JSON с результатами всех ступеней')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    venues = args.venues.split(',')
+    steps = []
+    print(f"{'clients':>7} {'rps':>9} {'p50':>9} {'p95':>9} {'p99':>9}  statuses")
+    for concurrency in (int(value) for value in args.concurrency.split(',')):
+        step = run_step(args.base_url, concurrency, args.duration, mix, venues,
+                        args.distinct_clients, args.honor_retry_after)
+        steps.append(step)
+        print(f"{concurrency:>7} {step['throughput_rps']:>9.1f} {step['p50_ms']:>7.1f}ms {step['p95_ms']:>7.1f}ms "
+              f"{step['p99_ms']:>7.1f}ms  {step['status_codes']} errors={step['connection_errors']}", flush=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'base_url': args.base_url, 'mix': dict(mix), 'steps': steps}, f, ensure_ascii=False, indent=2)
+        print(f'results saved to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
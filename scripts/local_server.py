@@ -0,0 +1,177 @@
+'''
+Локальный HTTP-сервер поверх handler облачных функций: /inventory и /backup (любая
+функция из backend/ по имени каталога) вызываются с событием и context в форме
+Yandex Cloud Functions. Нужен для нагрузочных прогонов на локальном Postgres
+(см. scripts.loadgen) — без деплоя и без API Gateway.
+
+Одновременно выполняется не больше --workers вызовов, остальные ждут в очереди до
+--queue-timeout секунд и получают 429, как при исчерпании лимита экземпляров.
+--isolation instance даёт каждому воркеру свой экземпляр модуля (свой пул соединений
+и свой холодный старт) — как N контейнеров функции; shared — один тёплый контейнер,
+который обслуживает вызовы параллельно. С --trust-forwarded адрес клиента в событии берётся
+из X-Forwarded-For, как его передаёт API Gateway, — так scripts.loadgen --distinct-clients
+изображает много клиентов для лимитов запросов inventory.
+
+Запуск:
+  DATABASE_URL=postgresql://localhost/inventory python -m scripts.local_server --port 8000 --workers 8
+  curl 'http://localhost:8000/inventory?venue=PORT&limit=5'
+'''
+
+import argparse
+import base64
+import queue
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from scripts.common import FunctionContext, function_names, load_function
+
+TEXT_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+
+class Instance:
+    """Набор загруженных функций, который одновременно обслуживает один вызов"""
+
+    def __init__(self, names: List[str]):
+        self.handlers = {name: load_function(name).handler for name in names}
+
+
+class WorkerPool:
+    """Ограничение параллельных вызовов: воркер — слот с экземпляром функций"""
+
+    def __init__(self, names: List[str], workers: int, isolation: str):
+        self._idle: 'queue.Queue[Instance]' = queue.Queue()
+        shared = Instance(names) if isolation == 'shared' else None
+        for _ in range(workers):
+            self._idle.put(shared or Instance(names))
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.rejected = 0
+
+    def acquire(self, timeout: float) -> Optional[Instance]:
+        try:
+            instance = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            with self.lock:
+                self.rejected += 1
+            return None
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        return instance
+
+    def release(self, instance: Instance) -> None:
+        with self.lock:
+            self.in_flight -= 1
+        self._idle.put(instance)
+
+
+def build_event(method: str, path: str, headers: Dict[str, str], body: bytes, client_ip: str) -> Dict[str, Any]:
+    """Событие HTTP-вызова в форме, которую присылает Cloud Functions"""
+    url = urlsplit(path)
+    multi = parse_qs(url.query, keep_blank_values=True)
+    content_type = headers.get('Content-Type', '')
+    is_text = not body or (any(kind in content_type for kind in TEXT_TYPES)
+                           and 'Content-Encoding' not in headers)
+    return {
+        'httpMethod': method,
+        'url': path,
+        'path': url.path,
+        'headers': headers,
+        'queryStringParameters': {key: values[-1] for key, values in multi.items()},
+        'multiValueQueryStringParameters': multi,
+        'body': body.decode('utf-8') if is_text else base64.b64encode(body).decode('ascii'),
+        'isBase64Encoded': not is_text,
+        'requestContext': {'identity': {'sourceIp': client_ip}, 'httpMethod': method},
+    }
+
+
+def make_request_handler(pool: WorkerPool, queue_timeout: float, quiet: bool, trust_forwarded: bool = False):
+    class FunctionRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Заголовки и тело уходят отдельными send(): без TCP_NODELAY keep-alive ловит
+        # задержку Nagle + delayed ACK (~40 мс) на каждом ответе
+        disable_nagle_algorithm = True
+
+        def _dispatch(self) -> None:
+            name = urlsplit(self.path).path.strip('/').split('/')[0]
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length) if length else b''
+            started = time.perf_counter()
+
+            instance = pool.acquire(queue_timeout)
+            if instance is None:
+                self._reply(429, {'Content-Type': 'application/json', 'Retry-After': '1'},
+                            b'{"error": "Too many concurrent requests"}')
+                return
+            try:
+                handler = instance.handlers.get(name)
+                if handler is None:
+                    self._reply(404, {'Content-Type': 'application/json'}, b'{"error": "Unknown function"}')
+                    return
+                client_ip = self.client_address[0]
+                if trust_forwarded:
+                    client_ip = (self.headers.get('X-Forwarded-For') or '').split(',')[0].strip() or client_ip
+                event = build_event(self.command, self.path, dict(self.headers.items()), body, client_ip)
+                response = handler(event, FunctionContext(name))
+            finally:
+                pool.release(instance)
+
+            payload = response.get('body') or ''
+            data = base64.b64decode(payload) if response.get('isBase64Encoded') else payload.encode('utf-8')
+            self._reply(response['statusCode'], response.get('headers') or {}, data)
+            if not quiet:
+                sys.stderr.write(f'{self.command} {self.path} {response["statusCode"]} '
+                                 f'{(time.perf_counter() - started) * 1000:.1f}ms\n')
+
+        def _reply(self, status: int, headers: Dict[str, str], data: bytes) -> None:
+            self.send_response(status)
+            for key, value in headers.items():
+                if key.lower() != 'content-length':
+                    self.send_header(key, str(value))
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = do_PUT = do_DELETE = do_OPTIONS = _dispatch
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    return FunctionRequestHandler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--functions', default=','.join(function_names()))
+    parser.add_argument('--workers', type=int, default=4, help='одновременных вызовов')
+    parser.add_argument('--isolation', choices=('instance', 'shared'), default='instance')
+    parser.add_argument('--queue-timeout', type=float, default=5.0, help='ожидание свободного воркера, сек')
+    parser.add_argument('--quiet', action='store_true', help='без строки на каждый запрос')
+    parser.add_argument('--trust-forwarded', action='store_true', help='адрес клиента из X-Forwarded-For')
+    args = parser.parse_args()
+
+    names = [name for name in args.functions.split(',') if name]
+    pool = WorkerPool(names, args.workers, args.isolation)
+    request_handler = make_request_handler(pool, args.queue_timeout, args.quiet, args.trust_forwarded)
+    server = ThreadingHTTPServer((args.host, args.port), request_handler)
+    server.daemon_threads = True
+    print(f'serving {", ".join(f"/{name}" for name in names)} on http://{args.host}:{args.port} '
+          f'({args.workers} workers, {args.isolation})', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f'\nmax in flight {pool.max_in_flight}, rejected {pool.rejected}', flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+'''
+Минимальный Redis-совместимый сервер (RESP2) для локальных прогонов общего уровня кеша
+inventory без настоящего Redis: PING, HELLO, GET, SET (EX/PX/NX), MGET, INCR(BY), DEL, EXPIRE,
+FLUSHALL, DBSIZE. Данные только в памяти, истёкшие ключи удаляются при обращении.
+
+Запуск:
+  python -m scripts.mini_redis --port 6399
+  CACHE_REDIS_URL=redis://127.0.0.1:6399/0 DATABASE_URL=... python -m scripts.local_server --workers 4
+'''
+
+import argparse
+import socketserver
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class Store:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self.commands = 0
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        item = self.data.get(key)
+        if item is None:
+            return None
+        if item[1] is not None and item[1] <= time.monotonic():
+            del self.data[key]
+            return None
+        return item[0]
+
+    def execute(self, args: List[bytes], resp3: bool = False) -> bytes:
+        """Ответ на команду; resp3 — клиент переключился HELLO 3 (null кодируется иначе)"""
+        command = args[0].upper().decode('ascii', 'replace')
+        with self.lock:
+            self.commands += 1
+            if command == 'PING':
+                return b'+PONG\r\n' if len(args) == 1 else bulk(args[1], resp3)
+            if command == 'HELLO':
+                protocol = 3 if resp3 else 2
+                fields = [bulk(b'server'), bulk(b'redis'), bulk(b'version'), bulk(b'7.0.0'),
+                          bulk(b'proto'), b':%d\r\n' % protocol, bulk(b'mode'), bulk(b'standalone')]
+                header = b'%%%d\r\n' % (len(fields) // 2) if resp3 else b'*%d\r\n' % len(fields)
+                return header + b''.join(fields)
+            if command == 'GET' and len(args) == 2:
+                return bulk(self._get(args[1]), resp3)
+            if command == 'MGET' and len(args) > 1:
+                return array([self._get(key) for key in args[1:]], resp3)
+            if command == 'SET' and len(args) >= 3:
+                return self._set(args[1], args[2], [arg.upper() for arg in args[3:]], resp3)
+            if command in ('INCR', 'INCRBY') and len(args) == (2 if command == 'INCR' else 3):
+                current = self._get(args[1])
+                step = args[2] if command == 'INCRBY' else b'1'
+                if current is not None and not current.lstrip(b'-').isdigit() or not step.lstrip(b'-').isdigit():
+                    return b'-ERR value is not an integer or out of range\r\n'
+                value = int(current or 0) + int(step)
+                expires = self.data[args[1]][1] if current is not None else None
+                self.data[args[1]] = (str(value).encode('ascii'), expires)
+                return f':{value}\r\n'.encode('ascii')
+            if command == 'DEL' and len(args) > 1:
+                removed = 0
+                for key in args[1:]:
+                    if self._get(key) is not None:
+                        del self.data[key]
+                        removed += 1
+                return f':{removed}\r\n'.encode('ascii')
+            if command == 'EXPIRE' and len(args) == 3:
+                value = self._get(args[1])
+                if value is None:
+                    return b':0\r\n'
+                self.data[args[1]] = (value, time.monotonic() + int(args[2]))
+                return b':1\r\n'
+            if command == 'FLUSHALL':
+                self.data.clear()
+                return b'+OK\r\n'
+            if command == 'DBSIZE':
+                return f':{len(self.data)}\r\n'.encode('ascii')
+            if command in ('CLIENT', 'SELECT', 'READONLY'):
+                # redis-py при подключении сообщает имя библиотеки; база всегда одна
+                return b'+OK\r\n'
+        return f"-ERR unknown command '{command}'\r\n".encode('utf-8')
+
+    def _set(self, key: bytes, value: bytes, options: List[bytes], resp3: bool) -> bytes:
+        expires = None
+        if b'NX' in options and self._get(key) is not None:
+            return bulk(None, resp3)
+        for unit, scale in ((b'EX', 1.0), (b'PX', 0.001)):
+            if unit in options:
+                position = options.index(unit) + 1
+                if position >= len(options):
+                    return b'-ERR syntax error\r\n'
+                expires = time.monotonic() + int(options[position]) * scale
+        self.data[key] = (value, expires)
+        return b'+OK\r\n'
+
+
+def bulk(value: Optional[bytes], resp3: bool = False) -> bytes:
+    if value is None:
+        return b'_\r\n' if resp3 else b'$-1\r\n'
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+def array(values: List[Optional[bytes]], resp3: bool = False) -> bytes:
+    return b'*%d\r\n' % len(values) + b''.join(bulk(value, resp3) for value in values)
+
+
+def make_request_handler(store: Store):
+    class RespHandler(socketserver.StreamRequestHandler):
+        def read_command(self) -> Optional[List[bytes]]:
+            line = self.rfile.readline()
+            if not line:
+                return None
+            if not line.startswith(b'*'):
+                # inline-команда (redis-cli, telnet)
+                return line.split()
+            args = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(length + 2)[:-2])
+            return args
+
+        def handle(self) -> None:
+            resp3 = False
+            while True:
+                try:
+                    args = self.read_command()
+                except (ValueError, ConnectionError):
+                    return
+                if args is None:
+                    return
+                if args:
+                    if args[0].upper() == b'HELLO' and len(args) > 1:
+                        resp3 = args[1] == b'3'
+                    self.wfile.write(store.execute(args, resp3))
+
+    return RespHandler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6399)
+    args = parser.parse_args()
+
+    store = Store()
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    server = socketserver.ThreadingTCPServer((args.host, args.port), make_request_handler(store))
+    server.daemon_threads = True
+    print(f'mini redis on redis://{args.host}:{args.port}/0', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f'\n{store.commands} commands, {len(store.data)} keys', flush=True)
+
+
+if __name__ == '__main__':
+    main()
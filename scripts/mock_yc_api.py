@@ -0,0 +1,237 @@
+'''
+Локальный мок API Yandex Cloud Functions для проверки deploy-yc-function.py без облака.
+Один адрес обслуживает IAM, serverless-functions и operation API: функции, версии
+(архив проверяется — base64 ZIP с index.py), теги $latest, доступ и политику
+масштабирования. Операции завершаются через --operation-delay секунд; --fail-rate доля
+версий завершается ошибкой, --throttle-rate доля запросов получает 429 — так
+проверяются повторы и докат при повторном запуске. /functions/<id> возвращает последнюю версию.
+
+Запуск:
+  python -m scripts.mock_yc_api --port 8900 --operation-delay 1.5 --fail-rate 0.2
+'''
+
+import argparse
+import base64
+import io
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+RESOURCE_ID = re.compile(r'(op|d4e|d4v)\d{8}')
+
+
+class MockCloud:
+    def __init__(self, operation_delay: float, fail_rate: float, throttle_rate: float, page_size: int, seed: int):
+        self.lock = threading.Lock()
+        self.operation_delay = operation_delay
+        self.fail_rate = fail_rate
+        self.throttle_rate = throttle_rate
+        self.page_size = page_size
+        self.rng = random.Random(seed)
+        self.ids = itertools.count(1)
+        self.functions: Dict[str, Dict[str, Any]] = {}
+        self.versions: Dict[str, Dict[str, Any]] = {}
+        self.operations: Dict[str, Dict[str, Any]] = {}
+        self.requests: Dict[str, int] = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def new_id(self, prefix: str) -> str:
+        return f'{prefix}{next(self.ids):08d}'
+
+    def start_operation(self, metadata: Dict[str, Any], response: Dict[str, Any],
+                        on_done=None, fail: bool = False) -> Dict[str, Any]:
+        operation = {'id': self.new_id('op'), 'done': False, 'metadata': metadata}
+        self.operations[operation['id']] = {'operation': operation, 'ready_at': time.monotonic() + self.operation_delay,
+                                            'response': response, 'on_done': on_done, 'fail': fail}
+        return dict(operation)
+
+    def poll_operation(self, operation_id: str) -> Optional[Dict[str, Any]]:
+        state = self.operations.get(operation_id)
+        if state is None:
+            return None
+        operation = state['operation']
+        if not operation['done'] and time.monotonic() >= state['ready_at']:
+            operation['done'] = True
+            if state['fail']:
+                operation['error'] = {'code': 13, 'message': 'Function version build failed'}
+            else:
+                operation['response'] = state['response']
+                if state['on_done']:
+                    state['on_done']()
+        return dict(operation)
+
+    def handle(self, method: str, path: str, query: Dict[str, str],
+               body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        if method == 'POST' and path == '/iam/v1/tokens':
+            return 200, {'iamToken': 'mock-iam-token'}
+
+        if method == 'GET' and path == '/functions/v1/functions':
+            items = sorted((f for f in self.functions.values() if f['folderId'] == query.get('folderId')),
+                           key=lambda f: f['id'])
+            start = int(query.get('pageToken') or 0)
+            page = items[start:start + self.page_size]
+            result: Dict[str, Any] = {'functions': page}
+            if start + self.page_size < len(items):
+                result['nextPageToken'] = str(start + self.page_size)
+            return 200, result
+
+        if method == 'POST' and path == '/functions/v1/functions':
+            if any(f['name'] == body.get('name') and f['folderId'] == body.get('folderId')
+                   for f in self.functions.values()):
+                return 409, {'code': 6, 'message': f"Function {body.get('name')} already exists"}
+            function_id = self.new_id('d4e')
+            function = {'id': function_id, 'folderId': body.get('folderId'), 'name': body.get('name'),
+                        'description': body.get('description', ''), 'public': False}
+            self.functions[function_id] = function
+            return 200, self.start_operation({'functionId': function_id}, function)
+
+        if method == 'POST' and path.startswith('/functions/v1/functions/') and path.endswith(':setAccessBindings'):
+            function = self.functions.get(path.split('/')[-1].split(':')[0])
+            if function is None:
+                return 404, {'code': 5, 'message': 'Function not found'}
+            function['accessBindings'] = body.get('accessBindings') or []
+            function['public'] = any(binding.get('subject', {}).get('id') == 'allUsers'
+                                     for binding in function['accessBindings'])
+            return 200, self.start_operation({'resourceId': function['id']}, {})
+
+        if method == 'POST' and path.startswith('/functions/v1/functions/') and path.endswith(':setScalingPolicy'):
+            function = self.functions.get(path.split('/')[-1].split(':')[0])
+            if function is None:
+                return 404, {'code': 5, 'message': 'Function not found'}
+            if not isinstance(body.get('zoneInstancesLimit'), int) or body['zoneInstancesLimit'] < 1:
+                return 400, {'code': 3, 'message': 'zoneInstancesLimit must be a positive integer'}
+            function['scalingPolicy'] = {key: body.get(key) for key in ('tag', 'zoneInstancesLimit', 'zoneRequestsLimit')}
+            return 200, self.start_operation({'functionId': function['id']}, function['scalingPolicy'])
+
+        if method == 'POST' and path == '/functions/v1/versions':
+            function = self.functions.get(body.get('functionId'))
+            if function is None:
+                return 404, {'code': 5, 'message': 'Function not found'}
+            try:
+                with zipfile.ZipFile(io.BytesIO(base64.b64decode(body['content']))) as archive:
+                    files = archive.namelist()
+            except (KeyError, ValueError, zipfile.BadZipFile):
+                return 400, {'code': 3, 'message': 'content is not a base64 ZIP archive'}
+            if 'index.py' not in files:
+                return 400, {'code': 3, 'message': 'index.py is missing in the archive'}
+            version = {'id': self.new_id('d4v'), 'functionId': function['id'], 'runtime': body.get('runtime'),
+                       'entrypoint': body.get('entrypoint'), 'description': body.get('description', ''),
+                       'files': len(files), 'tags': ['$latest'],
+                       # Значения окружения могут быть секретами — мок хранит только имена
+                       'environment': sorted(body.get('environment') or {})}
+
+            def promote() -> None:
+                for other in self.versions.values():
+                    if other['functionId'] == function['id']:
+                        other['tags'] = []
+                self.versions[version['id']] = version
+
+            fail = self.rng.random() < self.fail_rate
+            return 200, self.start_operation({'functionVersionId': version['id']}, version, promote, fail)
+
+        if method == 'GET' and path == '/functions/v1/versions:byTag':
+            for version in self.versions.values():
+                if version['functionId'] == query.get('functionId') and query.get('tag') in version['tags']:
+                    return 200, version
+            return 404, {'code': 5, 'message': 'Version not found'}
+
+        if method == 'GET' and path.startswith('/operations/'):
+            operation = self.poll_operation(path.split('/')[-1])
+            return (200, operation) if operation else (404, {'code': 5, 'message': 'Operation not found'})
+
+        if method in ('GET', 'POST') and path.startswith('/functions/'):
+            for version in self.versions.values():
+                if version['functionId'] == path.split('/')[2] and '$latest' in version['tags']:
+                    return 200, {'function': path.split('/')[2], 'version': version['id']}
+            return 404, {'message': 'Function has no versions'}
+
+        return 404, {'code': 5, 'message': f'Unknown method {method} {path}'}
+
+
+def make_request_handler(cloud: MockCloud, latency: float, quiet: bool):
+    class MockRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def _dispatch(self) -> None:
+            url = urlsplit(self.path)
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length) if length else b''
+            with cloud.lock:
+                cloud.in_flight += 1
+                cloud.max_in_flight = max(cloud.max_in_flight, cloud.in_flight)
+                key = f"{self.command} {RESOURCE_ID.sub('{id}', url.path)}"
+                cloud.requests[key] = cloud.requests.get(key, 0) + 1
+                throttled = cloud.rng.random() < cloud.throttle_rate
+            try:
+                time.sleep(latency)
+                if throttled:
+                    status, payload = 429, {'code': 8, 'message': 'Too many requests'}
+                elif url.path != '/iam/v1/tokens' and not url.path.startswith('/functions/d') \
+                        and not (self.headers.get('Authorization') or '').startswith('Bearer '):
+                    status, payload = 401, {'code': 16, 'message': 'Authorization required'}
+                else:
+                    query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                    body = json.loads(raw) if raw else {}
+                    with cloud.lock:
+                        status, payload = cloud.handle(self.command, url.path, query, body)
+            finally:
+                with cloud.lock:
+                    cloud.in_flight -= 1
+            data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            if status == 429:
+                self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            if not quiet:
+                print(f'{self.command} {url.path} {status}', flush=True)
+
+        do_GET = do_POST = _dispatch
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    return MockRequestHandler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--operation-delay', type=float, default=1.0, help='секунд до завершения операции')
+    parser.add_argument('--latency', type=float, default=0.02, help='задержка каждого ответа, сек')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='доля версий, завершающихся ошибкой')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='доля запросов с ответом 429')
+    parser.add_argument('--page-size', type=int, default=100, help='функций на страницу списка')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args()
+
+    cloud = MockCloud(args.operation_delay, args.fail_rate, args.throttle_rate, args.page_size, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), make_request_handler(cloud, args.latency, args.quiet))
+    server.daemon_threads = True
+    print(f'mock Yandex Cloud API on http://{args.host}:{args.port}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f'\nmax in flight {cloud.max_in_flight}; requests:', flush=True)
+        for key, count in sorted(cloud.requests.items()):
+            print(f'  {count:>5}  {key}')
+
+
+if __name__ == '__main__':
+    main()
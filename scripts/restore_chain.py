@@ -0,0 +1,126 @@
+'''
+Восстановление из цепочки бэкапов: полный снимок и инкременты поверх него.
+Порядок берётся из манифестов в заголовках файлов (manifest.id / parent_id), а не из
+имён: инструмент строит цепочку от последнего (или --until) бэкапа назад к полному и
+проверяет, что ни одно звено не пропущено. Каждый файл отправляется в POST функции
+backup как есть — gzip и NDJSON она разбирает сама, надгробия инкремента удаляет записи.
+Восстановление требует токен администратора: --token или ADMIN_TOKEN (с --local функция
+сверяет его с тем же ADMIN_TOKEN).
+
+Запуск:
+  python -m scripts.restore_chain backups/*.ndjson.gz --url https://functions.poehali.dev/<backup>
+  DATABASE_URL=postgresql://localhost/inventory python -m scripts.restore_chain backups/* --local
+  python -m scripts.restore_chain backups/* --dry-run
+'''
+
+import argparse
+import base64
+import gzip
+import json
+import os
+import sys
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from scripts.common import FunctionContext, load_function, make_event
+
+
+def read_manifest(path: Path) -> Optional[Dict[str, Any]]:
+    """Манифест из заголовка бэкапа; у файлов версии 1.0 его нет"""
+    opener = gzip.open if path.suffix == '.gz' else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        first_line = f.readline()
+        try:
+            header = json.loads(first_line)
+        except json.JSONDecodeError:
+            # JSON-документ в несколько строк: манифест всё равно в начале, но разбираем целиком
+            f.seek(0)
+            header = json.load(f)
+    return header.get('manifest') if isinstance(header, dict) else None
+
+
+def build_chain(manifests: Dict[int, Dict[str, Any]], until: Optional[int]) -> List[int]:
+    """id манифестов от полного бэкапа до цели включительно"""
+    if not manifests:
+        raise SystemExit('No backups with a manifest were given')
+    target = until if until is not None else max(manifests)
+    if target not in manifests:
+        raise SystemExit(f'Backup {target} is not among the given files')
+    chain = [target]
+    while manifests[chain[-1]]['kind'] != 'full':
+        parent = manifests[chain[-1]]['parent_id']
+        if parent not in manifests:
+            raise SystemExit(f'Chain is broken: backup {chain[-1]} needs parent {parent}, which was not given')
+        chain.append(parent)
+    return chain[::-1]
+
+
+def post_http(url: str, data: bytes, content_type: str, token: str) -> Dict[str, Any]:
+    request = urllib.request.Request(url, data=data, method='POST',
+                                     headers={'Content-Type': content_type, 'X-Admin-Token': token})
+    with urllib.request.urlopen(request, timeout=300) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+def post_local(handler, data: bytes, content_type: str, token: str) -> Dict[str, Any]:
+    gzipped = data[:2] == b'\x1f\x8b'
+    body = base64.b64encode(data).decode('ascii') if gzipped else data.decode('utf-8')
+    event = make_event('POST', body=body, headers={'Content-Type': content_type, 'X-Admin-Token': token},
+                       is_base64=gzipped)
+    response = handler(event, FunctionContext('backup'))
+    result = json.loads(response['body'])
+    if response['statusCode'] != 200:
+        raise SystemExit(f"Restore failed with {response['statusCode']}: {result.get('error')}")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='+', type=Path, help='файлы бэкапов (.json, .ndjson, можно .gz)')
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--url', help='URL функции backup')
+    target.add_argument('--local', action='store_true', help='вызвать handler из backend/backup с DATABASE_URL')
+    parser.add_argument('--until', type=int, default=None, help='id манифеста, до которого восстанавливать')
+    parser.add_argument('--dry-run', action='store_true', help='только показать порядок')
+    parser.add_argument('--token', default=os.environ.get('ADMIN_TOKEN'), help='токен администратора функции backup')
+    args = parser.parse_args()
+
+    manifests: Dict[int, Dict[str, Any]] = {}
+    paths: Dict[int, Path] = {}
+    for path in args.files:
+        manifest = read_manifest(path)
+        if manifest is None:
+            print(f'skip {path}: no manifest (backup format 1.0)', file=sys.stderr)
+            continue
+        if manifest['id'] in paths:
+            raise SystemExit(f"Backup {manifest['id']} is given twice: {paths[manifest['id']]} and {path}")
+        manifests[manifest['id']] = manifest
+        paths[manifest['id']] = path
+
+    chain = build_chain(manifests, args.until)
+    for manifest_id in chain:
+        manifest = manifests[manifest_id]
+        print(f"{manifest['kind']:<12} #{manifest_id:<6} parent {manifest['parent_id'] or '-':<6} {paths[manifest_id]}")
+    if args.dry_run:
+        return
+    if not args.url and not args.local:
+        raise SystemExit('Pass --url, --local or --dry-run')
+    if not args.token:
+        raise SystemExit('Pass --token or set ADMIN_TOKEN: restore requires the admin token')
+
+    handler = load_function('backup').handler if args.local else None
+    for manifest_id in chain:
+        path = paths[manifest_id]
+        data = path.read_bytes()
+        content_type = 'application/x-ndjson' if '.ndjson' in path.name else 'application/json'
+        if args.local:
+            result = post_local(handler, data, content_type, args.token)
+        else:
+            result = post_http(args.url, data, content_type, args.token)
+        print(f"#{manifest_id}: {result.get('inserted', 0)} inserted, {result.get('updated', 0)} updated, "
+              f"{result.get('deleted', 0)} deleted", flush=True)
+
+
+if __name__ == '__main__':
+    main()
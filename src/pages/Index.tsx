@@ -13,6 +13,7 @@ import { EditDialog } from '@/components/inventory/EditDialog';
 import { SplashScreen } from '@/components/SplashScreen';
 import Icon from '@/components/ui/icon';
 import { storageManager, StorageMode } from '@/utils/storageManager';
+import { pullChanges, pushPendingMutations } from '@/utils/syncClient';
 
 const Index = () => {
   const [showSplash, setShowSplash] = useState(() => {
@@ -94,32 +95,23 @@ const Index = () => {
       
       if (storageMode === 'api') {
         try {
-          const portResponse = await fetch(`${API_URL}?venue=PORT`);
-          const dickensResponse = await fetch(`${API_URL}?venue=${encodeURIComponent('Диккенс')}`);
-          
-          if (portResponse.status === 402 || dickensResponse.status === 402) {
-            throw new Error('Payment Required - switching to local mode');
-          }
-          
-          if (!portResponse.ok || !dickensResponse.ok) {
-            throw new Error('API Error');
-          }
-          
-          const portData = await portResponse.json();
-          const dickensData = await dickensResponse.json();
-          
-          setPortEntries(portData.entries || []);
-          setDickensEntries(dickensData.entries || []);
+          // Локальная копия догоняет сервер по дельте изменений, а не перекачивается целиком
+          const received = await pullChanges(API_URL);
+          const portData = storageManager.getEntriesByVenue('PORT');
+          const dickensData = storageManager.getEntriesByVenue('Диккенс');
           
-          storageManager.syncFromAPI(portData.entries || [], dickensData.entries || []);
+          setPortEntries(portData);
+          setDickensEntries(dickensData);
           
           if (currentVenue === 'PORT') {
-            setEntries(portData.entries || []);
+            setEntries(portData);
           } else {
-            setEntries(dickensData.entries || []);
+            setEntries(dickensData);
           }
           
-          toast.success(`✅ Загружено ${(portData.entries || []).length + (dickensData.entries || []).length} записей`);
+          if (received > 0) {
+            toast.success(`✅ Синхронизировано изменений: ${received}`);
+          }
         } catch (apiError: any) {
           console.warn('API недоступен, переключаюсь на локальный режим');
           setStorageMode('local');
@@ -509,6 +501,19 @@ const Index = () => {
     storageManager.resetToApiMode();
     setStorageMode('api');
     toast.info('🔄 Переподключение к API...');
+    try {
+      const { applied, conflicts } = await pushPendingMutations(API_URL);
+      if (applied > 0) {
+        toast.success(`📤 Отправлено офлайн-изменений: ${applied}`);
+      }
+      if (conflicts > 0) {
+        toast.warning(`⚠️ Конфликтов: ${conflicts}`, {
+          description: 'Эти записи изменились на сервере — оставлена серверная версия',
+        });
+      }
+    } catch (error) {
+      console.error('Не удалось отправить офлайн-изменения:', error);
+    }
     await loadAllData();
   };
 
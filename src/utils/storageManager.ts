@@ -2,9 +2,50 @@ import { InventoryEntry } from '@/types/inventory';
 
 const STORAGE_KEY = 'inventory_entries';
 const MODE_KEY = 'storage_mode';
+const CURSOR_KEY = 'inventory_sync_cursor';
+const PENDING_KEY = 'inventory_pending_mutations';
 
 export type StorageMode = 'api' | 'local';
 
+export interface SyncMutation {
+  op: 'create' | 'update' | 'delete';
+  id?: number;
+  ref?: number;
+  entry?: Partial<InventoryEntry>;
+}
+
+const byDateDesc = (a: InventoryEntry, b: InventoryEntry) =>
+  b.date.localeCompare(a.date) || b.id - a.id;
+
+const readPending = (): SyncMutation[] => {
+  try {
+    const data = localStorage.getItem(PENDING_KEY);
+    return data ? JSON.parse(data) : [];
+  } catch (error) {
+    console.error('Error reading pending mutations:', error);
+    return [];
+  }
+};
+
+const writePending = (mutations: SyncMutation[]): void => {
+  localStorage.setItem(PENDING_KEY, JSON.stringify(mutations));
+};
+
+// Офлайн-правки копятся для отправки на сервер; правка ещё не отправленной записи
+// меняет её create, удаление — убирает create из очереди
+const queueMutation = (mutation: SyncMutation): void => {
+  const pending = readPending();
+  const created = pending.findIndex(item => item.op === 'create' && item.ref === mutation.id);
+  if (created !== -1 && mutation.op === 'update') {
+    pending[created] = { ...pending[created], entry: mutation.entry };
+  } else if (created !== -1 && mutation.op === 'delete') {
+    pending.splice(created, 1);
+  } else {
+    pending.push(mutation);
+  }
+  writePending(pending);
+};
+
 export const storageManager = {
   getMode: (): StorageMode => {
     return (localStorage.getItem(MODE_KEY) as StorageMode) || 'api';
@@ -30,7 +71,7 @@ export const storageManager = {
 
   getEntriesByVenue: (venue: string): InventoryEntry[] => {
     const allEntries = storageManager.getAllEntries();
-    return allEntries.filter(entry => entry.venue === venue);
+    return allEntries.filter(entry => entry.venue === venue).sort(byDateDesc);
   },
 
   saveAllEntries: (entries: InventoryEntry[]): void => {
@@ -46,6 +87,7 @@ export const storageManager = {
     };
     allEntries.push(newEntry);
     storageManager.saveAllEntries(allEntries);
+    queueMutation({ op: 'create', ref: newEntry.id, entry: newEntry });
     return newEntry;
   },
 
@@ -57,6 +99,7 @@ export const storageManager = {
     
     allEntries[index] = { ...allEntries[index], ...updatedData };
     storageManager.saveAllEntries(allEntries);
+    queueMutation({ op: 'update', id, entry: allEntries[index] });
     return allEntries[index];
   },
 
@@ -67,15 +110,42 @@ export const storageManager = {
     if (filtered.length === allEntries.length) return false;
     
     storageManager.saveAllEntries(filtered);
+    queueMutation({ op: 'delete', id });
     return true;
   },
 
   importData: (entries: InventoryEntry[]): void => {
     storageManager.saveAllEntries(entries);
+    localStorage.removeItem(CURSOR_KEY);
   },
 
   syncFromAPI: (portEntries: InventoryEntry[], dickensEntries: InventoryEntry[]): void => {
     const allEntries = [...portEntries, ...dickensEntries];
     storageManager.saveAllEntries(allEntries);
   },
+
+  getSyncCursor: (): string | null => {
+    return localStorage.getItem(CURSOR_KEY);
+  },
+
+  setSyncCursor: (cursor: string): void => {
+    localStorage.setItem(CURSOR_KEY, cursor);
+  },
+
+  getPendingMutations: (): SyncMutation[] => readPending(),
+
+  clearPendingMutations: (): void => {
+    localStorage.removeItem(PENDING_KEY);
+  },
+
+  // Применить дельту синхронизации: изменённые записи заменяются, надгробия удаляются
+  applyChanges: (changed: InventoryEntry[], deleted: { id: number }[], reset = false): void => {
+    const byId = new Map<number, InventoryEntry>();
+    if (!reset) {
+      storageManager.getAllEntries().forEach(entry => byId.set(entry.id, entry));
+    }
+    changed.forEach(entry => byId.set(entry.id, entry));
+    deleted.forEach(({ id }) => byId.delete(id));
+    storageManager.saveAllEntries(Array.from(byId.values()));
+  },
 };
\ No newline at end of file
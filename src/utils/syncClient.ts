@@ -0,0 +1,68 @@
+import { InventoryEntry } from '@/types/inventory';
+import { storageManager } from '@/utils/storageManager';
+
+interface SyncPage {
+  entries: InventoryEntry[];
+  deleted: { id: number; venue: string }[];
+  cursor: string;
+  has_more: boolean;
+}
+
+interface PushResult {
+  ref?: number;
+  op: 'create' | 'update' | 'delete';
+  id: number;
+  status: 'applied' | 'conflict';
+  reason?: 'changed' | 'deleted' | 'missing' | 'duplicate';
+}
+
+// Забрать изменения с сервера после сохранённого курсора; без курсора — полная загрузка
+export const pullChanges = async (apiUrl: string): Promise<number> => {
+  const start = storageManager.getSyncCursor();
+  let cursor = start;
+  let received = 0;
+  let hasMore = true;
+
+  while (hasMore) {
+    const params = new URLSearchParams({ action: 'sync', limit: '500', compress: 'auto' });
+    if (cursor) params.set('since', cursor);
+
+    const response = await fetch(`${apiUrl}?${params}`);
+    if (response.status === 402) {
+      throw new Error('Payment Required - switching to local mode');
+    }
+    if (!response.ok) throw new Error('API Error');
+
+    const page: SyncPage = await response.json();
+    storageManager.applyChanges(page.entries, page.deleted, !start && received === 0);
+    received += page.entries.length + page.deleted.length;
+    cursor = page.cursor;
+    hasMore = page.has_more;
+  }
+
+  if (cursor) storageManager.setSyncCursor(cursor);
+  return received;
+};
+
+// Отправить очередь офлайн-правок; при конфликте побеждает сервер — его версия придёт в pullChanges
+export const pushPendingMutations = async (apiUrl: string): Promise<{ applied: number; conflicts: number }> => {
+  const pending = storageManager.getPendingMutations();
+  if (pending.length === 0) return { applied: 0, conflicts: 0 };
+
+  const response = await fetch(`${apiUrl}?action=sync`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ base: storageManager.getSyncCursor(), mutations: pending }),
+  });
+  if (!response.ok) throw new Error('API Error');
+
+  const { results }: { results: PushResult[] } = await response.json();
+  storageManager.clearPendingMutations();
+
+  // Записи, созданные офлайн, жили под временными id — их заменят серверные при следующем pull
+  const localIds = results.filter(result => result.op === 'create' && result.ref).map(result => result.ref);
+  storageManager.applyChanges([], localIds.map(id => ({ id: id as number })));
+
+  const conflicts = results.filter(result => result.status === 'conflict').length;
+  return { applied: results.length - conflicts, conflicts };
+};